@@ -1,3 +1,58 @@
 from django.contrib import admin
 
-# Register your models here.
+from imdb_app.models import HISTOGRAM_FIELDS, Actor, Director, Movie, MovieActor, Oscar, Rating
+
+
+# list_select_related joins the FKs used by __str__ / list_display, so a list page costs
+# a fixed number of queries. raw_id_fields keeps change forms from loading whole tables
+# into <select> widgets.
+
+
+@admin.register(Movie)
+class MovieAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'release_year', 'rating_count', 'avg_rating']
+    # kept in sync with the ratings by rating_stats, the IMDb columns are written by import_imdb
+    exclude = ['rating_count', 'rating_sum', 'rating_min', 'rating_max', 'avg_rating', *HISTOGRAM_FIELDS.values(),
+               'imdb_rating', 'imdb_votes']
+
+
+@admin.register(Actor)
+class ActorAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'birth_year']
+
+
+@admin.register(Director)
+class DirectorAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name']
+
+
+@admin.register(MovieActor)
+class MovieActorAdmin(admin.ModelAdmin):
+    list_display = ['id', 'movie', 'actor', 'salary', 'main_role']
+    list_select_related = ['movie', 'actor']
+    raw_id_fields = ['movie', 'actor']
+
+
+@admin.register(Oscar)
+class OscarAdmin(admin.ModelAdmin):
+    list_display = ['id', 'year', 'nomination', 'movie', 'actor', 'director']
+    list_select_related = ['movie', 'actor', 'director']
+    raw_id_fields = ['movie', 'actor', 'director']
+
+
+@admin.register(Rating)
+class RatingAdmin(admin.ModelAdmin):
+    # read only: ratings must go through the API so the movie rating stats stay in sync
+    list_display = ['id', 'movie', 'rating', 'rating_date']
+    list_select_related = ['movie']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # only as part of deleting their movie, which takes the stats along
+        match = request.resolver_match
+        return match is None or not match.url_name.startswith(f'{self.opts.app_label}_{self.opts.model_name}_')
@@ -0,0 +1,116 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework.exceptions import ValidationError
+
+from imdb_app import fast_serializers
+from imdb_app.models import Movie, MovieActor, Oscar
+from imdb_app.renderers import OrjsonRenderer
+from imdb_app.serializers import DetailedActorSerializer, DetailedMovieSerializer, OscarSerializer
+from imdb_app.view_set import full_data, full_queryset, latest_ratings_count
+
+# Async read endpoints, meant to be served by the ASGI application (imdb_rest/asgi.py).
+# They read through Django's async ORM, so a request waiting on the database does not hold a
+# worker thread. The payloads are the ones of the matching sync endpoints.
+# movie_page is movies/<id>/full served from the event loop: the same queries (movie, cast,
+# latest ratings, Oscars) run one after the other on one connection, in one sync_to_async call.
+# Running them concurrently, each on a pool thread with a connection of its own, measured slower:
+# the connection checkouts and thread hops cost more than the overlapping queries save.
+# These views are plain Django views, not DRF ones: no content negotiation (always JSON, rendered
+# by OrjsonRenderer), no DRF authentication / permission / throttling classes. They only serve
+# public reads, so request.user is never looked at; put anything that needs them behind DRF.
+
+_renderer = OrjsonRenderer()
+
+
+def _json(data, status=200):
+    return HttpResponse(_renderer.render(data), status=status, content_type='application/json')
+
+
+def _not_found():
+    return _json({'detail': 'Not found.'}, status=404)
+
+
+def async_get(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+# querysets and payloads of the async endpoints
+
+def _movie_queryset(movie_id):
+    return fast_serializers.plan_for(DetailedMovieSerializer).values(Movie.objects.filter(id=movie_id))
+
+
+def _cast_queryset(movie_id):
+    # depth = 1 nests the actor
+    return MovieActor.objects.filter(movie_id=movie_id).select_related('actor').order_by('id')
+
+
+def _cast_data(casts):
+    return DetailedActorSerializer(casts, many=True).data
+
+
+def _oscar_queryset(movie_id):
+    oscars = Oscar.objects.filter(movie_id=movie_id).order_by('year', 'id')
+    return fast_serializers.plan_for(OscarSerializer).values(oscars)
+
+
+def _movie_data(row):
+    return fast_serializers.plan_for(DetailedMovieSerializer).serialize([row])[0]
+
+
+def _oscar_data(rows):
+    return fast_serializers.plan_for(OscarSerializer).serialize(rows)
+
+
+@async_get
+async def movie_detail(request, movie_id):
+    row = await _movie_queryset(movie_id).afirst()
+    if row is None:
+        return _not_found()
+    return _json(_movie_data(row))
+
+
+@async_get
+async def movie_cast(request, movie_id):
+    if not await Movie.objects.filter(id=movie_id).aexists():
+        return _not_found()
+    return _json(_cast_data([cast async for cast in _cast_queryset(movie_id)]))
+
+
+@async_get
+async def movie_rating_avg(request, movie_id):
+    row = await Movie.objects.filter(id=movie_id).values('rating_count', 'avg_rating').afirst()
+    if row is None:
+        return _not_found()
+    return _json({'rating__avg': row['avg_rating'] if row['rating_count'] else None})
+
+
+@async_get
+async def movie_oscars(request, movie_id):
+    if not await Movie.objects.filter(id=movie_id).aexists():
+        return _not_found()
+    return _json(_oscar_data([row async for row in _oscar_queryset(movie_id)]))
+
+
+def _full_page(movie_id, latest_ratings):
+    movie = full_queryset(latest_ratings).filter(id=movie_id).first()
+    return None if movie is None else full_data(movie)
+
+
+@async_get
+async def movie_page(request, movie_id):
+    try:
+        latest_ratings = latest_ratings_count(request.GET)
+    except ValidationError as e:
+        return _json(e.detail, status=400)
+    data = await sync_to_async(_full_page)(movie_id, latest_ratings)
+    if data is None:
+        return _not_found()
+    return _json(data)
@@ -0,0 +1,115 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import BasicAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+
+from imdb_app import hashers
+
+
+class TokenCache:
+    """
+    Bounded LRU of raw access token -> (deadline, user, validated token).
+    An entry is dropped once it is older than ttl or the token's exp claim passes,
+    whichever comes first, so a cached token never outlives its expiry.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is None:
+                return None
+            if time.time() >= entry[0]:
+                del self._entries[raw_token]
+                return None
+            self._entries.move_to_end(raw_token)
+            return entry[1], entry[2]
+
+    def set(self, raw_token, user, validated_token):
+        deadline = time.time() + self.ttl
+        if 'exp' in validated_token:
+            deadline = min(deadline, validated_token['exp'])
+        with self._lock:
+            self._entries[raw_token] = (deadline, user, validated_token)
+            self._entries.move_to_end(raw_token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache(getattr(settings, 'JWT_TOKEN_CACHE_MAX_ENTRIES', 10000),
+                         getattr(settings, 'JWT_TOKEN_CACHE_TTL', 60))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that verifies a token's signature and loads its user once, then serves
+    the same token from token_cache. With settings.JWT_STATELESS_USER the user is a TokenUser
+    built from the claims and the users table is never read.
+    """
+    # None: settings.JWT_STATELESS_USER, read on every call
+    stateless = None
+
+    def is_stateless(self):
+        if self.stateless is None:
+            return getattr(settings, 'JWT_STATELESS_USER', False)
+        return self.stateless
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        stateless = self.is_stateless()
+        cached = token_cache.get(raw_token)
+        # an entry cached before JWT_STATELESS_USER changed holds the other kind of user
+        if cached is not None and isinstance(cached[0], TokenUser) == stateless:
+            user, validated_token = cached
+        else:
+            validated_token = self.get_validated_token(raw_token)
+            user = self.get_user(validated_token)
+            token_cache.set(raw_token, user, validated_token)
+        # a User instance is shared between requests, hand out copies
+        return (user if stateless else copy.copy(user)), validated_token
+
+    def get_user(self, validated_token):
+        if self.is_stateless():
+            return JWTStatelessUserAuthentication.get_user(self, validated_token)
+        return super().get_user(validated_token)
+
+
+class LoginBasicAuthentication(BasicAuthentication):
+    """
+    Basic auth hashes the password (PBKDF2) on every request that carries it.
+    Unless settings.BASIC_AUTH_PER_REQUEST is on, it is only honoured on the routes in
+    settings.BASIC_AUTH_URL_NAMES (the login endpoint), elsewhere the credentials are ignored.
+    """
+
+    def authenticate(self, request):
+        if not getattr(settings, 'BASIC_AUTH_PER_REQUEST', True):
+            match = request.resolver_match
+            if match is None or match.url_name not in getattr(settings, 'BASIC_AUTH_URL_NAMES', ['login']):
+                return None
+        try:
+            return super().authenticate(request)
+        except hashers.PoolFull:
+            raise hashers.HashingUnavailable()
@@ -0,0 +1,91 @@
+import hashlib
+from collections import namedtuple
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from imdb_app import fast_serializers
+
+# HTTP validators (ETag / Last-Modified) for the read endpoints. They are derived from the
+# updated_at column of the rows a payload is built from, never from the rendered body, so a
+# matching If-None-Match / If-Modified-Since is answered with 304 before anything is serialized.
+
+Validators = namedtuple('Validators', ['digest', 'last_modified'])
+
+
+def _digest(state):
+    return hashlib.blake2b(repr(state).encode(), digest_size=16).hexdigest()
+
+
+def for_instance(instance):
+    return Validators(_digest([instance._meta.label, instance.pk, instance.updated_at.isoformat()]),
+                      instance.updated_at)
+
+
+def _row_state(row):
+    if isinstance(row, dict):
+        return row['id'], row['updated_at'].isoformat()
+    return row.pk, row.updated_at.isoformat()
+
+
+def for_rows(rows, *extra):
+    """
+    Lists and cast payloads (model instances or values() dicts). ETag only: removing a row
+    does not move any timestamp, so Last-Modified can't be trusted for them.
+    """
+    state = [_row_state(row) for row in rows]
+    return Validators(_digest([state, extra]), None)
+
+
+def respond(request, validators, build):
+    """
+    Answer with 304 when the client copy is current, otherwise with build().
+    Both carry the validators.
+    """
+    # the same rows render differently as JSON and in the browsable API
+    etag = quote_etag(f'{request.accepted_renderer.format}-{validators.digest}')
+    last_modified = validators.last_modified and int(validators.last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+    if response.status_code in (200, 304):
+        response.headers['ETag'] = etag
+        if last_modified:
+            response.headers['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class ConditionalMixin:
+    """
+    list / retrieve with validators, for viewsets over models with updated_at.
+    fast_list = True renders list pages from values() through fast_serializers instead of
+    instantiating the serializer per row.
+    """
+    fast_list = False
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.fast_list:
+            # the keyset cursor and the validators read these too
+            extra = ['id', 'updated_at', *getattr(self, 'ordering_fields', [])]
+            queryset = fast_serializers.plan_for(self.get_serializer_class()).values(queryset, *extra)
+        page = self.paginate_queryset(queryset)
+        # the query string selects the filters, ordering and page
+        if page is None:
+            rows = list(queryset)
+            return respond(request, for_rows(rows, request.get_full_path()),
+                           lambda: Response(self._list_data(rows)))
+        # a row past the page turns the next link on, a row on another page changes the count
+        validator_state = getattr(self.paginator, 'validator_state', None)
+        return respond(request, for_rows(page, request.get_full_path(), validator_state and validator_state()),
+                       lambda: self.get_paginated_response(self._list_data(page)))
+
+    def _list_data(self, rows):
+        if self.fast_list:
+            return fast_serializers.plan_for(self.get_serializer_class()).serialize(rows)
+        return self.get_serializer(rows, many=True).data
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return respond(request, for_instance(instance), lambda: Response(self.get_serializer(instance).data))
@@ -0,0 +1,295 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError, connections
+from psycopg2 import extensions
+
+# Process wide pool of PostgreSQL connections behind the imdb_app.pooled_postgresql backend.
+# Django still opens and closes a connection per request (CONN_MAX_AGE = 0), but connect takes
+# an idle connection from the pool and close gives it back, so a request no longer pays the
+# TCP / TLS / auth handshake. A checkout pings connections idle for more than CHECK_AFTER
+# seconds and drops the dead ones, connections older than MAX_LIFETIME are replaced, and idle
+# ones above MIN_SIZE are closed after MAX_IDLE. A connection's session state is reset with
+# DISCARD ALL when it comes back. Once MAX_SIZE connections are out a checkout
+# waits up to TIMEOUT seconds for one to come back, then fails with PoolTimeout.
+# The pool is per process: gunicorn workers x MAX_SIZE must stay below max_connections. A forked
+# child (gunicorn --preload, multiprocessing) starts without pools instead of sharing the
+# parent's sockets, see _after_fork.
+
+logger = logging.getLogger('imdb_app.db_pool')
+
+DEFAULTS = {
+    'MIN_SIZE': 2,
+    'MAX_SIZE': 20,
+    'TIMEOUT': 5.0,
+    'MAX_LIFETIME': 1800.0,
+    'MAX_IDLE': 300.0,
+    'CHECK_AFTER': 1.0,
+}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+
+    def __init__(self, connect, min_size=DEFAULTS['MIN_SIZE'], max_size=DEFAULTS['MAX_SIZE'],
+                 timeout=DEFAULTS['TIMEOUT'], max_lifetime=DEFAULTS['MAX_LIFETIME'],
+                 max_idle=DEFAULTS['MAX_IDLE'], check_after=DEFAULTS['CHECK_AFTER']):
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self._cond = threading.Condition()
+        # (connection, returned at), the most recently returned on the right
+        self._idle = deque()
+        # open connections, idle or checked out -> opened at
+        self._opened_at = {}
+        # slots taken by connections being opened
+        self._opening = 0
+        self._waiting = 0
+        self._max_waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._opened = 0
+        self._closed = 0
+        self._failed_checks = 0
+        self._acquire_seconds = 0.0
+        self._max_acquire_seconds = 0.0
+
+    def acquire(self, connect=None):
+        """A live connection, opened with connect (default: the pool's) when none is idle."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            conn, returned_at = self._checkout(deadline)
+            if conn is None:
+                conn = self._open(connect)
+            elif not self._usable(conn, returned_at):
+                with self._cond:
+                    self._failed_checks += 1
+                self._discard(conn)
+                continue
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self._checkouts += 1
+                self._acquire_seconds += elapsed
+                self._max_acquire_seconds = max(self._max_acquire_seconds, elapsed)
+            return conn
+
+    def _checkout(self, deadline):
+        # (idle connection, returned at), or (None, None) with a slot taken to open one in
+        with self._cond:
+            while True:
+                while self._idle:
+                    conn, returned_at = self._idle.pop()
+                    if not self._expired(conn):
+                        return conn, returned_at
+                    self._close(conn)
+                if len(self._opened_at) + self._opening < self.max_size:
+                    self._opening += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f'No database connection came free within {self.timeout}s, '
+                                      f'all {self.max_size} are in use')
+                self._waiting += 1
+                self._max_waiting = max(self._max_waiting, self._waiting)
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _open(self, connect):
+        # in a slot taken by _checkout / fill
+        try:
+            conn = (connect or self.connect)()
+        except BaseException:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._opened_at[conn] = time.monotonic()
+            self._opened += 1
+        return conn
+
+    def release(self, conn):
+        if conn.closed or conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN \
+                or self._expired(conn):
+            self._discard(conn)
+            return
+        try:
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            self._reset(conn)
+        except Exception:
+            self._discard(conn)
+            return
+        with self._cond:
+            if conn not in self._opened_at:
+                # opened before close(), or by another pool
+                self._close(conn)
+                return
+            now = time.monotonic()
+            self._idle.append((conn, now))
+            # the least recently used connections above MIN_SIZE that sat idle too long
+            while len(self._opened_at) > self.min_size and now - self._idle[0][1] > self.max_idle:
+                self._close(self._idle.popleft()[0])
+            self._cond.notify()
+
+    def _reset(self, conn):
+        # SET values, temp tables, advisory locks, held cursors ... must not reach the next request.
+        # Django sets the time zone again on every connect. DISCARD ALL can't run in a transaction.
+        autocommit = conn.autocommit
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('DISCARD ALL')
+        finally:
+            conn.autocommit = autocommit
+
+    def fill(self, connect=None):
+        """Open connections until MIN_SIZE are open, e.g. when a worker starts."""
+        while True:
+            with self._cond:
+                if len(self._opened_at) + self._opening >= self.min_size:
+                    return
+                self._opening += 1
+            self.release(self._open(connect))
+
+    def close(self):
+        """Close every connection, the checked out ones when they come back."""
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+            self._opened_at.clear()
+
+    def _usable(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _expired(self, conn):
+        return time.monotonic() - self._opened_at.get(conn, 0) > self.max_lifetime
+
+    def _discard(self, conn):
+        with self._cond:
+            self._close(conn)
+            self._cond.notify()
+
+    def _close(self, conn):
+        # called holding the lock
+        self._opened_at.pop(conn, None)
+        self._closed += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            checkouts = self._checkouts or 1
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': len(self._opened_at),
+                'idle': len(self._idle),
+                'in_use': len(self._opened_at) - len(self._idle),
+                'waiting': self._waiting,
+                'max_waiting': self._max_waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'opened': self._opened,
+                'closed': self._closed,
+                'failed_checks': self._failed_checks,
+                'avg_acquire_ms': round(self._acquire_seconds / checkouts * 1000, 3),
+                'max_acquire_ms': round(self._max_acquire_seconds * 1000, 3),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# pools inherited through fork(), never used
+_inherited = []
+
+
+def _after_fork():
+    # the child shares the parent's sockets, two processes talking over one would mix up their
+    # protocol streams. The inherited pools stay referenced: a garbage collected connection sends
+    # the server a Terminate, which would end the parent's session. The lock may have been held
+    # by another thread of the parent when it forked.
+    global _pools, _pools_lock
+    _inherited.extend(_pools.values())
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def pool_for(alias, conn_params, options):
+    """The pool of one database alias. Keyed by the connection parameters as well, so the test
+    runner's connections to the postgres / test databases don't share the application's pool."""
+    key = (alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            config = {**DEFAULTS, **options}
+            _pools[key] = ConnectionPool(
+                None, min_size=config['MIN_SIZE'], max_size=config['MAX_SIZE'], timeout=config['TIMEOUT'],
+                max_lifetime=config['MAX_LIFETIME'], max_idle=config['MAX_IDLE'],
+                check_after=config['CHECK_AFTER'])
+        return _pools[key]
+
+
+def close_pools(database=None):
+    """Close the pools, or only those of one database name (before it is dropped)."""
+    with _pools_lock:
+        for key in list(_pools):
+            if database is None or ('dbname', database) in key[1]:
+                _pools.pop(key).close()
+
+
+def _fill_pools():
+    for connection in connections.all():
+        if hasattr(connection, 'fill_pool'):
+            try:
+                connection.fill_pool()
+            except Exception as e:
+                logger.warning('Could not warm up the connection pool of %s: %s', connection.alias, e)
+
+
+def warm_up():
+    """Start opening MIN_SIZE connections for every pooled alias, called by the WSGI / ASGI entry
+    points. Returns the thread doing it."""
+    # in the background: the worker serves requests meanwhile (the first ones may open connections
+    # of their own) instead of waiting on a database that is slow or down. On a thread in any
+    # case, ASGI servers import the application inside their event loop where Django won't connect.
+    thread = threading.Thread(target=_fill_pools, name='db-pool-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def stats():
+    with _pools_lock:
+        pools = [(key[0], pool) for key, pool in _pools.items()]
+    return {alias: pool.stats() for alias, pool in pools}
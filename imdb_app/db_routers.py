@@ -0,0 +1,205 @@
+import contextlib
+import contextvars
+import hashlib
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+# Sends the reads of GET / HEAD / OPTIONS requests to the read replicas of DATABASE_REPLICAS,
+# everything else to the primary (default): writes, reads inside a transaction, reads of a
+# request that already wrote and reads outside a request (management commands, cron).
+# A request reads from one replica throughout, picked by weight (DATABASE_REPLICA_SELECTION =
+# 'weighted') or as the one with the fewest requests in flight per unit of weight
+# ('least-loaded').
+# Read your writes: once a request wrote, the client's reads stay on the primary for
+# READ_YOUR_WRITES_SECONDS, so it never reads a replica that hasn't replayed its write yet.
+# The client is recognized by a cookie and, for API clients that don't keep cookies, by its
+# Authorization header, kept in the cache PIN_CACHE_ALIAS, which every worker must share.
+# A replica that refuses the first connection of a request is left out for
+# DATABASE_REPLICA_RETRY_SECONDS, its reads go to another replica or to the primary meanwhile.
+# Payloads built for the shared response cache read from the primary (primary_reads): a replica
+# behind the write that invalidated them would have its stale rows cached for everyone.
+# ReplicaRoutingMiddleware sets up the per request state the router reads.
+
+PRIMARY = DEFAULT_DB_ALIAS
+# alias -> weight, aliases missing from DATABASES are ignored
+REPLICAS = {alias: weight for alias, weight in getattr(settings, 'DATABASE_REPLICAS', {}).items()
+            if alias in settings.DATABASES}
+SELECTION = getattr(settings, 'DATABASE_REPLICA_SELECTION', 'weighted')
+PIN_SECONDS = getattr(settings, 'READ_YOUR_WRITES_SECONDS', 5)
+PIN_COOKIE = 'primary_until'
+PIN_CACHE_ALIAS = getattr(settings, 'READ_YOUR_WRITES_CACHE', 'db-routing')
+RETRY_SECONDS = getattr(settings, 'DATABASE_REPLICA_RETRY_SECONDS', 10)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_lock = threading.Lock()
+_in_flight = {alias: 0 for alias in REPLICAS}
+_reads = {}
+_pinned_requests = 0
+# alias -> time.monotonic() until which it is left out
+_unhealthy = {}
+_fallbacks = 0
+
+
+class RoutingState:
+    """How the reads of one request are routed"""
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+        self.replica = None
+
+    def read_alias(self):
+        if not self.use_replicas or self.wrote:
+            return PRIMARY
+        if self.replica is None:
+            self.replica = _pick_replica()
+            if self.replica is None:
+                # every replica is down, read from the primary for the rest of the request
+                self.use_replicas = False
+                return PRIMARY
+        return self.replica
+
+    def finish(self):
+        if self.replica is not None:
+            with _lock:
+                _in_flight[self.replica] -= 1
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+_primary_reads = contextvars.ContextVar('db_routing_primary_reads', default=False)
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Send the reads inside the block to the primary"""
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def _pick_replica():
+    """A healthy replica connected to, None when there is none"""
+    global _fallbacks
+    while True:
+        with _lock:
+            now = time.monotonic()
+            aliases = [alias for alias in REPLICAS if _unhealthy.get(alias, 0) <= now]
+            if not aliases:
+                _fallbacks += 1
+                return None
+            if SELECTION == 'least-loaded':
+                random.shuffle(aliases)
+                alias = min(aliases, key=lambda candidate: _in_flight[candidate] / REPLICAS[candidate])
+            else:
+                alias = random.choices(aliases, weights=[REPLICAS[candidate] for candidate in aliases])[0]
+            _in_flight[alias] += 1
+        if _connects(alias):
+            return alias
+        with _lock:
+            _in_flight[alias] -= 1
+            _unhealthy[alias] = time.monotonic() + RETRY_SECONDS
+
+
+def _connects(alias):
+    try:
+        connections[alias].ensure_connection()
+    except OperationalError:
+        return False
+    except SynchronousOnlyOperation:
+        # routed from async code, the query itself connects from its sync thread
+        pass
+    return True
+
+
+def _pin_cache():
+    return caches[PIN_CACHE_ALIAS]
+
+
+def _client_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if authorization:
+        return 'db-routing-pin:' + hashlib.sha256(authorization.encode()).hexdigest()
+    return None
+
+
+def _pinned(request):
+    try:
+        if float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    key = _client_key(request)
+    return key is not None and _pin_cache().get(key) is not None
+
+
+def start(request):
+    """Routing state of a request, pass the token to finish()"""
+    global _pinned_requests
+    use_replicas = bool(REPLICAS) and request.method in SAFE_METHODS
+    if use_replicas and _pinned(request):
+        use_replicas = False
+        with _lock:
+            _pinned_requests += 1
+    return _state.set(RoutingState(use_replicas))
+
+
+def finish(token, request, response):
+    state = _state.get()
+    _state.reset(token)
+    state.finish()
+    if state.wrote and REPLICAS and response is not None:
+        until = time.time() + PIN_SECONDS
+        response.set_cookie(PIN_COOKIE, f'{until:.3f}', max_age=PIN_SECONDS, httponly=True, samesite='Lax')
+        key = _client_key(request)
+        if key is not None:
+            _pin_cache().set(key, until, PIN_SECONDS)
+    return response
+
+
+def stats():
+    with _lock:
+        return {
+            'selection': SELECTION,
+            'replicas': dict(REPLICAS),
+            'in_flight': dict(_in_flight),
+            'reads': dict(_reads),
+            'pinned_requests': _pinned_requests,
+            'unhealthy': sorted(alias for alias, until in _unhealthy.items() if until > time.monotonic()),
+            'fallbacks': _fallbacks,
+        }
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or _primary_reads.get() or connections[PRIMARY].in_atomic_block:
+            alias = PRIMARY
+        else:
+            alias = state.read_alias()
+        with _lock:
+            _reads[alias] = _reads.get(alias, 0) + 1
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas follow the primary through replication
+        return db not in REPLICAS
@@ -0,0 +1,67 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from imdb_app.models import Movie, MovieActor, Rating
+
+
+# Streaming export of whole tables. Rows are read with .iterator(), which on PostgreSQL
+# runs a server-side cursor and fetches chunk_size rows at a time, so memory stays flat
+# no matter how large the table is. Rows always come out in id order so a consumer can
+# resume with after_id=<last id it saw>.
+
+EXPORTS = {
+    'ratings': (Rating, ['id', 'movie_id', 'rating', 'rating_date']),
+    'movies': (Movie, ['id', 'name', 'description', 'duration_in_min', 'release_year', 'pic_url',
+                       'rating_count', 'avg_rating']),
+    'movie_actors': (MovieActor, ['id', 'movie_id', 'actor_id', 'salary', 'main_role']),
+}
+
+FORMATS = ['ndjson', 'csv']
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def export_rows(name, from_date=None, to_date=None, after_id=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    model, fields = EXPORTS[name]
+    queryset = model.objects.order_by('id')
+    if model is Rating:
+        # same date filters as get_all_ratings
+        if from_date:
+            queryset = queryset.filter(rating_date__gte=from_date)
+        if to_date:
+            queryset = queryset.filter(rating_date__lte=to_date)
+    if after_id is not None:
+        queryset = queryset.filter(id__gt=after_id)
+    # the rows are read while the response streams, after ReplicaRoutingMiddleware is done with
+    # the request: route them now, so a safe request still reads from its replica
+    queryset = queryset.using(queryset.db)
+    return fields, queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    # csv.writer needs a file object, this one just hands the line back
+    def write(self, value):
+        return value
+
+
+def render_ndjson(fields, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def render_csv(fields, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render(output_format, fields, rows):
+    if output_format == 'csv':
+        return render_csv(fields, rows)
+    return render_ndjson(fields, rows)
@@ -0,0 +1,88 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# Read-only fast path for listings: rows come straight from queryset.values() and are turned
+# into the same dicts the ModelSerializer would produce, using a field plan compiled once per
+# serializer class. Only flat serializers are supported (model columns and primary key
+# relations), anything else is rejected when the plan is built.
+
+# to_representation of these returns the database value unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.IntegerField,
+    serializers.FloatField,
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.URLField,
+)
+
+_plans = {}
+
+
+class RowPlan:
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        # (output name, values() column)
+        self.columns = []
+        # (output name, field) for the fields that are not passthrough
+        self.converted = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            self.columns.append((name, self._column(name, field)))
+            if type(field) not in PASSTHROUGH_FIELDS and not isinstance(field, serializers.PrimaryKeyRelatedField):
+                self.converted.append((name, field))
+
+    def _column(self, name, field):
+        unsupported = (
+            isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField,
+                               serializers.ManyRelatedField))
+            or '.' in field.source or field.source == '*'
+            or (isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is not None)
+        )
+        if unsupported:
+            raise ImproperlyConfigured(f'{self.serializer_class.__name__}.{name} can not be read from values()')
+        # values('movie') already gives the related primary key
+        return field.source
+
+    def values(self, queryset, *extra):
+        """queryset.values() with the plan's columns, plus extra ones (ordering, validators)"""
+        return queryset.values(*dict.fromkeys([column for _, column in self.columns] + list(extra)))
+
+    def _converter(self, field):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if type(field) is not serializers.DateTimeField or output_format is None \
+                or output_format.lower() != ISO_8601:
+            return field.to_representation
+        # DateTimeField resolves the current timezone per value, do it once per page
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            if timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+
+    def serialize(self, rows):
+        columns = self.columns
+        converters = [(name, self._converter(field)) for name, field in self.converted]
+        data = [{name: row[column] for name, column in columns} for row in rows]
+        if converters:
+            for item in data:
+                for name, convert in converters:
+                    value = item[name]
+                    if value is not None:
+                        item[name] = convert(value)
+        return data
+
+
+def plan_for(serializer_class):
+    plan = _plans.get(serializer_class)
+    if plan is None:
+        plan = _plans[serializer_class] = RowPlan(serializer_class)
+    return plan
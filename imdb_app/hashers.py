@@ -0,0 +1,101 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Password hashing (signup, set_password) and verification (login, Basic auth) run PBKDF2,
+# which is slow on purpose. PooledPBKDF2PasswordHasher hands that work to a small thread
+# pool (hashlib releases the GIL while hashing) so a burst of sign-ups can use at most
+# PASSWORD_HASH_WORKERS cores, and refuses with PoolFull once PASSWORD_HASH_QUEUE_LIMIT callers
+# are already waiting. The pool never touches the database.
+# PoolFull is a plain exception, the hasher also runs outside DRF (admin login, authenticate()).
+# The sign-up and login views and LoginBasicAuthentication turn it into HashingUnavailable (503).
+
+
+class PoolFull(Exception):
+    pass
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ups and logins in progress, try again shortly.'
+    default_code = 'hashing_unavailable'
+
+
+class HashingPool:
+
+    def __init__(self, workers, queue_limit):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._max_queued = 0
+        self._rejected = 0
+        self._count = 0
+        self._hash_seconds = 0.0
+        self._max_hash_seconds = 0.0
+        self._wait_seconds = 0.0
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PoolFull()
+        with self._lock:
+            self._pending += 1
+            self._max_queued = max(self._max_queued, self._pending - self._running)
+        try:
+            return self._executor.submit(self._timed, time.monotonic(), fn, args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+
+    def _timed(self, submitted_at, fn, args):
+        started = time.monotonic()
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                self._count += 1
+                self._hash_seconds += elapsed
+                self._max_hash_seconds = max(self._max_hash_seconds, elapsed)
+                self._wait_seconds += started - submitted_at
+
+    def stats(self):
+        with self._lock:
+            count = self._count or 1
+            return {
+                'workers': self.workers,
+                'queue_limit': self.queue_limit,
+                'running': self._running,
+                'queued': self._pending - self._running,
+                'max_queued': self._max_queued,
+                'rejected': self._rejected,
+                'hashes': self._count,
+                'avg_hash_ms': round(self._hash_seconds / count * 1000, 2),
+                'max_hash_ms': round(self._max_hash_seconds * 1000, 2),
+                'avg_queue_wait_ms': round(self._wait_seconds / count * 1000, 2),
+            }
+
+
+pool = HashingPool(getattr(settings, 'PASSWORD_HASH_WORKERS', 2), getattr(settings, 'PASSWORD_HASH_QUEUE_LIMIT', 16))
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """Same algorithm and hash format as pbkdf2_sha256, computed on the hashing pool."""
+
+    def encode(self, password, salt, iterations=None):
+        # verify() and harden_runtime() go through encode() as well
+        return pool.run(super().encode, password, salt, iterations)
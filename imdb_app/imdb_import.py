@@ -0,0 +1,316 @@
+import csv
+import gzip
+import io
+import sys
+from itertools import islice
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from imdb_app import response_cache
+from imdb_app.models import Actor, Movie, MovieActor
+
+
+# Loader for the public IMDb TSV dumps (https://datasets.imdbws.com/).
+# Files are streamed (gzip or plain), mapped to our columns in batches and then either
+# COPYed into unindexed temp staging tables and merged with one INSERT ... ON CONFLICT
+# per table (PostgreSQL), or upserted with bulk_create on other backends.
+# For a full load (defer_indexes) the secondary indexes of the target table are dropped before
+# the merge and rebuilt after it, in the same transaction: one sorted build per index instead of
+# a btree / GIN insert per row. The table is locked for writes and reads by the index scans
+# until the commit, so this is for initial loads, not for refreshing a live database.
+# Everything is keyed on Movie.imdb_id / Actor.imdb_id so the import can be re-run.
+
+FILES = {
+    'titles': 'title.basics',
+    'names': 'name.basics',
+    'principals': 'title.principals',
+    'ratings': 'title.ratings',
+}
+NULL = '\\N'
+DEFAULT_BATCH_SIZE = 50000
+DEFAULT_TITLE_TYPES = ('movie', 'tvMovie')
+CAST_CATEGORIES = ('actor', 'actress')
+# principals are ordered by billing, the first few are treated as main roles
+MAIN_ROLE_MAX_ORDERING = 3
+
+# csv refuses fields over 128KB by default, some IMDb rows get close
+csv.field_size_limit(sys.maxsize)
+
+
+def find_file(directory, name):
+    for suffix in ('.tsv.gz', '.tsv'):
+        path = Path(directory) / (name + suffix)
+        if path.exists():
+            return path
+    return None
+
+
+def read_tsv(path):
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE)
+        next(reader, None)  # header
+        yield from reader
+
+
+def _int(value):
+    return None if value == NULL else int(value)
+
+
+def map_titles(rows, title_types=DEFAULT_TITLE_TYPES):
+    # tconst titleType primaryTitle originalTitle isAdult startYear endYear runtimeMinutes genres
+    for row in rows:
+        if row[1] not in title_types or row[5] == NULL:
+            continue
+        genres = '' if row[8] == NULL else row[8].replace(',', ', ')
+        duration = 0 if row[7] == NULL else float(row[7])
+        yield row[0], row[2][:256], genres, duration, int(row[5])
+
+
+def map_names(rows):
+    # nconst primaryName birthYear deathYear primaryProfession knownForTitles
+    for row in rows:
+        # Actor.birth_year is mandatory
+        if row[2] == NULL:
+            continue
+        yield row[0], row[1][:256], int(row[2])
+
+
+def map_principals(rows):
+    # tconst ordering nconst category job characters
+    for row in rows:
+        if row[3] not in CAST_CATEGORIES:
+            continue
+        yield row[0], row[2], int(row[1]) <= MAIN_ROLE_MAX_ORDERING
+
+
+def map_ratings(rows):
+    # tconst averageRating numVotes
+    for row in rows:
+        yield row[0], float(row[1]), int(row[2])
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _copy_value(value):
+    if value is None:
+        return NULL
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class CopyLoader:
+    """PostgreSQL: COPY into temp staging tables, index them once loaded, merge set-based."""
+
+    STAGES = {
+        'titles': ('stage_titles', 'imdb_id varchar(16), name varchar(256), description text, '
+                                   'duration double precision, year integer'),
+        'names': ('stage_names', 'imdb_id varchar(16), name varchar(256), birth_year integer'),
+        'principals': ('stage_principals', 'tconst varchar(16), nconst varchar(16), main_role boolean'),
+        'ratings': ('stage_ratings', 'tconst varchar(16), average double precision, votes integer'),
+    }
+
+    MERGES = {
+        'titles': """
+            INSERT INTO movies (imdb_id, name, description, duration, year,
+                                rating_count, rating_sum, avg_rating, updated_at,
+                                votes_1, votes_2, votes_3, votes_4, votes_5,
+                                votes_6, votes_7, votes_8, votes_9, votes_10)
+            SELECT DISTINCT ON (imdb_id) imdb_id, name, description, duration, year, 0, 0, 0, now(),
+                   0, 0, 0, 0, 0, 0, 0, 0, 0, 0
+            FROM stage_titles
+            ORDER BY imdb_id
+            ON CONFLICT (imdb_id) DO UPDATE SET
+                name = EXCLUDED.name, description = EXCLUDED.description,
+                duration = EXCLUDED.duration, year = EXCLUDED.year, updated_at = EXCLUDED.updated_at
+        """,
+        'names': """
+            INSERT INTO actors (imdb_id, name, birth_year, updated_at)
+            SELECT DISTINCT ON (imdb_id) imdb_id, name, birth_year, now()
+            FROM stage_names
+            ORDER BY imdb_id
+            ON CONFLICT (imdb_id) DO UPDATE SET
+                name = EXCLUDED.name, birth_year = EXCLUDED.birth_year, updated_at = EXCLUDED.updated_at
+        """,
+        'principals': """
+            INSERT INTO movie_actors (movie_id, actor_id, salary, main_role, updated_at)
+            SELECT DISTINCT ON (m.id, a.id) m.id, a.id, 0, s.main_role, now()
+            FROM stage_principals s
+            JOIN movies m ON m.imdb_id = s.tconst
+            JOIN actors a ON a.imdb_id = s.nconst
+            WHERE NOT EXISTS (
+                SELECT 1 FROM movie_actors ma WHERE ma.movie_id = m.id AND ma.actor_id = a.id
+            )
+            ORDER BY m.id, a.id, s.main_role DESC
+        """,
+        # IMDb only publishes the aggregate, it goes to columns of its own: the rating stats and
+        # the histogram count the ratings made here
+        'ratings': """
+            UPDATE movies m SET
+                imdb_rating = s.average,
+                imdb_votes = s.votes,
+                updated_at = now()
+            FROM stage_ratings s
+            WHERE m.imdb_id = s.tconst
+        """,
+    }
+
+    # table each merge writes to
+    TARGETS = {
+        'titles': 'movies',
+        'names': 'actors',
+        'principals': 'movie_actors',
+        'ratings': 'movies',
+    }
+
+    STAGE_INDEXES = {
+        'titles': 'imdb_id',
+        'names': 'imdb_id',
+        'principals': 'tconst, nconst',
+        'ratings': 'tconst',
+    }
+
+    def __init__(self, defer_indexes=False):
+        self.defer_indexes = defer_indexes
+
+    def load(self, kind, rows, batch_size, progress):
+        table, columns = self.STAGES[kind]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMP TABLE {table} ({columns}) ON COMMIT DROP')
+            loaded = 0
+            for batch in batches(rows, batch_size):
+                self._copy(cursor, table, batch)
+                loaded += len(batch)
+                progress(kind, loaded)
+            # index the staging table only after the bulk load
+            cursor.execute(f'CREATE INDEX ON {table} ({self.STAGE_INDEXES[kind]})')
+            cursor.execute(f'ANALYZE {table}')
+            deferred = self._drop_indexes(cursor, self.TARGETS[kind]) if self.defer_indexes else []
+            cursor.execute(self.MERGES[kind])
+            written = cursor.rowcount
+            if deferred:
+                # run the deferred foreign key checks now, CREATE INDEX refuses pending trigger events
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            for definition in deferred:
+                cursor.execute(definition)
+            if deferred:
+                # a full load changes the table wholesale, the next merge's plan needs fresh statistics
+                cursor.execute(f'ANALYZE {self.TARGETS[kind]}')
+            # ON COMMIT DROP only fires at the outermost commit, free the name for a nested import
+            cursor.execute(f'DROP TABLE {table}')
+            return loaded, written
+
+    def _drop_indexes(self, cursor, table):
+        # the primary key and the unique indexes stay, ON CONFLICT (imdb_id) and the joins need them
+        cursor.execute('SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i '
+                       'JOIN pg_class c ON c.oid = i.indexrelid '
+                       'WHERE i.indrelid = %s::regclass AND NOT i.indisunique', [table])
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+        return [definition for _, definition in indexes]
+
+    def _copy(self, cursor, table, batch):
+        buffer = io.StringIO()
+        for row in batch:
+            buffer.write('\t'.join(_copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        sql = f'COPY {table} FROM STDIN'
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+class BulkLoader:
+    """Any other backend: batched bulk_create upserts keyed on imdb_id."""
+
+    def load(self, kind, rows, batch_size, progress):
+        loaded = written = 0
+        for batch in batches(rows, batch_size):
+            with transaction.atomic():
+                written += getattr(self, f'load_{kind}')(batch)
+            loaded += len(batch)
+            progress(kind, loaded)
+        return loaded, written
+
+    def load_titles(self, batch):
+        movies = {imdb_id: Movie(imdb_id=imdb_id, name=name, description=description,
+                                 duration_in_min=duration, release_year=year)
+                  for imdb_id, name, description, duration, year in batch}
+        Movie.objects.bulk_create(movies.values(), update_conflicts=True, unique_fields=['imdb_id'],
+                                  update_fields=['name', 'description', 'duration_in_min', 'release_year',
+                                                 'updated_at'])
+        return len(movies)
+
+    def load_names(self, batch):
+        actors = {imdb_id: Actor(imdb_id=imdb_id, name=name, birth_year=birth_year)
+                  for imdb_id, name, birth_year in batch}
+        Actor.objects.bulk_create(actors.values(), update_conflicts=True, unique_fields=['imdb_id'],
+                                  update_fields=['name', 'birth_year', 'updated_at'])
+        return len(actors)
+
+    def load_principals(self, batch):
+        movie_ids = dict(Movie.objects.filter(imdb_id__in={row[0] for row in batch})
+                         .values_list('imdb_id', 'id'))
+        actor_ids = dict(Actor.objects.filter(imdb_id__in={row[1] for row in batch})
+                         .values_list('imdb_id', 'id'))
+        existing = set(MovieActor.objects.filter(movie_id__in=movie_ids.values())
+                       .values_list('movie_id', 'actor_id'))
+        casts = {}
+        for tconst, nconst, main_role in batch:
+            key = movie_ids.get(tconst), actor_ids.get(nconst)
+            if None in key or key in existing:
+                continue
+            if key not in casts or main_role:
+                casts[key] = MovieActor(movie_id=key[0], actor_id=key[1], salary=0, main_role=main_role)
+        MovieActor.objects.bulk_create(casts.values())
+        return len(casts)
+
+    def load_ratings(self, batch):
+        by_imdb_id = {tconst: (average, votes) for tconst, average, votes in batch}
+        movies = list(Movie.objects.filter(imdb_id__in=by_imdb_id).only('imdb_id'))
+        now = timezone.now()
+        for movie in movies:
+            movie.imdb_rating, movie.imdb_votes = by_imdb_id[movie.imdb_id]
+            movie.updated_at = now
+        Movie.objects.bulk_update(movies, ['imdb_rating', 'imdb_votes', 'updated_at'])
+        return len(movies)
+
+
+MAPPERS = {
+    'titles': map_titles,
+    'names': map_names,
+    'principals': map_principals,
+    'ratings': map_ratings,
+}
+
+
+def get_loader(defer_indexes=False):
+    # the bulk_create fallback keeps the indexes, it is not meant for full loads
+    return CopyLoader(defer_indexes) if connection.vendor == 'postgresql' else BulkLoader()
+
+
+def import_file(kind, path, batch_size=DEFAULT_BATCH_SIZE, progress=None, title_types=DEFAULT_TITLE_TYPES,
+                defer_indexes=False):
+    """
+    Load one dump file. kind is one of FILES. Returns (rows loaded, rows written).
+    defer_indexes rebuilds the secondary indexes of the target table after the merge (PostgreSQL).
+    """
+    rows = read_tsv(path)
+    mapped = map_titles(rows, title_types) if kind == 'titles' else MAPPERS[kind](rows)
+    result = get_loader(defer_indexes).load(kind, mapped, batch_size, progress or (lambda kind, count: None))
+    response_cache.invalidate('all')
+    return result
@@ -0,0 +1,196 @@
+import json
+import re
+from collections import namedtuple
+
+from django.apps import apps
+from django.db import connection, migrations, models, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+# Replays the SELECTs of the query log (imdb_app.query_log) with EXPLAIN (ANALYZE, BUFFERS)
+# and looks for sequential scans, sorts and index scans that throw most of their rows away in a
+# Filter, over large tables. A candidate index is built from the filter (equality columns first,
+# then one range column) followed by the columns the plan sorts that table by, skipped when an
+# existing index already starts with those columns. OR filters are left alone: they are served
+# by a BitmapOr over one index per branch, not by a composite.
+# With trial=True each candidate is created inside a transaction that is rolled back, and the
+# statement is explained again to measure the gain. CREATE INDEX locks the table against
+# writes while it builds: run this against a staging copy, not production.
+
+Statement = namedtuple('Statement', ['sql', 'params', 'calls', 'routes'])
+Advice = namedtuple('Advice', ['table', 'columns', 'reason', 'statement', 'before_ms', 'after_ms',
+                               'before_cost', 'after_cost'])
+
+# "(release_year >= 1990)", "(movie_id = 5)", "(name = ANY ('{a,b}'::text[]))"
+_COMPARISON = re.compile(r'\(+"?(\w+)"?(?:\)?::[\w ]+)? (=|<>|<|>|<=|>=|~~) (ANY )?')
+_EQUALITY = {'=', '~~'}
+_SCANS = {'Seq Scan', 'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'}
+# an index scan is reported when its filter discards at least this many rows, and most of them
+_MIN_REMOVED = 100
+
+
+def captured_statements(entries):
+    """Distinct SELECTs of the query log, most frequent first."""
+    statements = {}
+    for entry in entries:
+        for statement in entry['statements']:
+            sql = statement['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            seen = statements.setdefault(sql, Statement(sql, statement['params'], [0], set()))
+            seen.calls[0] += 1
+            seen.routes.add(f"{entry['method']} {entry['route']}")
+    return sorted((Statement(s.sql, s.params, s.calls[0], sorted(s.routes)) for s in statements.values()),
+                  key=lambda s: -s.calls)
+
+
+def explain(cursor, statement):
+    cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + statement.sql, statement.params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def _nodes(plan, sort_keys=()):
+    # (node, sort keys of the closest Sort above it)
+    yield plan, sort_keys
+    if plan['Node Type'] in ('Sort', 'Incremental Sort'):
+        sort_keys = plan.get('Sort Key', [])
+    elif plan['Node Type'] in _SCANS:
+        # the children of a scan are its subplans, the order above doesn't apply to them
+        sort_keys = ()
+    for child in plan.get('Plans', []):
+        yield from _nodes(child, sort_keys)
+
+
+def _table_rows(cursor, table):
+    cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)', [table])
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _index_columns(cursor, table, index_name):
+    info = connection.introspection.get_constraints(cursor, table).get(index_name)
+    return info['columns'] if info else []
+
+
+def _sort_columns(sort_keys, table, alias, columns):
+    result = []
+    for key in sort_keys:
+        name = key.split()[0].strip('()"')
+        owner, _, column = name.rpartition('.')
+        if owner and owner.strip('"') not in (table, alias):
+            break
+        column = column.strip('"')
+        if column not in columns:
+            break
+        result.append(column)
+    return result
+
+
+def _candidate(node, sort_keys, columns):
+    condition = node.get('Filter', '')
+    if ' OR ' in condition:
+        return []
+    equality, ranges = [], []
+    for column, operator, _ in _COMPARISON.findall(condition):
+        if column not in columns:
+            continue
+        target = equality if operator in _EQUALITY else ranges
+        if column not in equality and column not in ranges:
+            target.append(column)
+    candidate = equality + ranges[:1]
+    for column in _sort_columns(sort_keys, node['Relation Name'], node.get('Alias'), columns):
+        if column not in candidate:
+            candidate.append(column)
+    return candidate
+
+
+def _covered(cursor, table, candidate):
+    constraints = connection.introspection.get_constraints(cursor, table)
+    return any(info['index'] and info['columns'][:len(candidate)] == candidate
+               for info in constraints.values())
+
+
+def advise(statements, min_rows=10000, trial=True):
+    advice = {}
+    with connection.cursor() as cursor:
+        for statement in statements:
+            with transaction.atomic():
+                plan = explain(cursor, statement)
+                transaction.set_rollback(True)
+            for node, sort_keys in _nodes(plan['Plan']):
+                if node['Node Type'] not in _SCANS:
+                    continue
+                loops = node.get('Actual Loops', 1)
+                kept = node.get('Actual Rows', 0) * loops
+                removed = node.get('Rows Removed by Filter', 0) * loops
+                # an index scan is only worth replacing when its filter discards most of what it reads
+                if node['Node Type'] != 'Seq Scan' and removed < max(_MIN_REMOVED, 10 * kept):
+                    continue
+                table = node['Relation Name']
+                rows = _table_rows(cursor, table)
+                if rows < min_rows:
+                    continue
+                columns = [info.name for info in connection.introspection.get_table_description(cursor, table)]
+                # without a Sort above, an ordered index scan is what keeps the rows in order
+                if not sort_keys and node.get('Index Name'):
+                    sort_keys = _index_columns(cursor, table, node['Index Name'])
+                candidate = _candidate(node, sort_keys, columns)
+                if not candidate or (table, tuple(candidate)) in advice or _covered(cursor, table, candidate):
+                    continue
+                reason = f"{node['Node Type']} on {table} ({kept:.0f} rows kept, {removed:.0f} removed by filter)"
+                if sort_keys:
+                    reason += f", sorted by {', '.join(sort_keys)}"
+                after = plan
+                if trial:
+                    with transaction.atomic():
+                        cursor.execute(f'CREATE INDEX advisor_trial ON {connection.ops.quote_name(table)} '
+                                       f'({", ".join(connection.ops.quote_name(c) for c in candidate)})')
+                        after = explain(cursor, statement)
+                        transaction.set_rollback(True)
+                advice[table, tuple(candidate)] = Advice(
+                    table, candidate, reason, statement, plan['Execution Time'], after['Execution Time'],
+                    plan['Plan']['Total Cost'], after['Plan']['Total Cost'])
+    return list(advice.values())
+
+
+def _model_for(table):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def index_for(advice):
+    """(model, models.Index) for an Advice, None for tables no model of the project owns."""
+    model = _model_for(advice.table)
+    if model is None:
+        return None
+    by_column = {field.column: field.name for field in model._meta.concrete_fields}
+    fields = [by_column[column] for column in advice.columns]
+    # Django caps index names at 30 characters
+    name = f"{advice.table}_{'_'.join(advice.columns)}"[:27].rstrip('_') + '_ix'
+    return model, models.Index(fields=fields, name=name)
+
+
+def migration_source(advices, app_label='imdb_app'):
+    operations = []
+    header = []
+    for advice in advices:
+        found = index_for(advice)
+        if found is None or found[0]._meta.app_label != app_label:
+            continue
+        model, index = found
+        operations.append(migrations.AddIndex(model_name=model._meta.model_name, index=index))
+        header.append(f'# {index.name}: {advice.reason}; {advice.before_ms:.1f} ms -> {advice.after_ms:.1f} ms, '
+                      f'cost {advice.before_cost:.0f} -> {advice.after_cost:.0f} '
+                      f'({advice.statement.calls} calls: {", ".join(advice.statement.routes)})')
+    if not operations:
+        return None
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    migration = migrations.Migration('advised_indexes', app_label)
+    migration.dependencies = list(loader.graph.leaf_nodes(app_label))
+    migration.operations = operations
+    return '\n'.join(header) + '\n' + MigrationWriter(migration).as_string()
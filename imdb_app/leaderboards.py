@@ -0,0 +1,70 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from imdb_app.models import Actor, LeaderboardEntry, Movie
+
+# "Top N" lists, materialized into leaderboard_entries so a read is one index range scan on
+# (board, rank) instead of an aggregate over ratings / oscar / movie_actors.
+# Every board is a queryset of (subject_id, name, score) rows, best first. refresh() replaces a
+# board's rows with one INSERT ... SELECT in a transaction: readers keep getting the previous
+# rows until it commits, so refreshing never blocks the endpoint. Run refresh_leaderboards
+# periodically (cron), the lists are as fresh as the last run.
+
+Leaderboard = namedtuple('Leaderboard', ['title', 'rows'])
+
+BOARD_SIZE = getattr(settings, 'LEADERBOARD_SIZE', 100)
+# top-movies only ranks movies with at least this many ratings
+MIN_VOTES = getattr(settings, 'LEADERBOARD_MIN_VOTES', 50)
+
+
+def top_movies():
+    # Bayesian average (v * R + m * C) / (v + m), from the denormalized rating columns:
+    # v * R is rating_sum, C the mean rating over all movies, m = MIN_VOTES
+    totals = Movie.objects.aggregate(total=Sum('rating_sum'), count=Sum('rating_count'))
+    mean = totals['total'] / totals['count'] if totals['count'] else 0.0
+    prior = Value(MIN_VOTES * mean, output_field=FloatField())
+    return Movie.objects.filter(rating_count__gte=max(MIN_VOTES, 1)).values('name').annotate(
+        subject_id=F('id'),
+        score=(Cast('rating_sum', FloatField()) + prior) / (F('rating_count') + MIN_VOTES),
+    )
+
+
+def most_awarded_actors():
+    return Actor.objects.values('name').annotate(subject_id=F('id'), score=Count('oscar')).filter(score__gt=0)
+
+
+def highest_paid_actors():
+    return Actor.objects.values('name').annotate(
+        subject_id=F('id'), score=Sum('movieactor__salary')).filter(score__gt=0)
+
+
+LEADERBOARDS = {
+    'top-movies': Leaderboard('Top rated movies (weighted by number of ratings)', top_movies),
+    'most-awarded-actors': Leaderboard('Actors with the most Oscars', most_awarded_actors),
+    'highest-paid-actors': Leaderboard('Actors by total salary over all their movies', highest_paid_actors),
+}
+
+
+def refresh(name, size=BOARD_SIZE):
+    """Recompute one board. Returns the number of rows stored."""
+    rows = LEADERBOARDS[name].rows().order_by('-score', 'subject_id')[:size]
+    sql, params = rows.query.sql_with_params()
+    with transaction.atomic(), connection.cursor() as cursor:
+        # concurrent refreshes of one board queue up instead of clashing on (board, rank)
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'leaderboard:{name}'])
+        LeaderboardEntry.objects.filter(board=name).delete()
+        cursor.execute(
+            f'INSERT INTO {LeaderboardEntry._meta.db_table} (board, rank, subject_id, name, score, refreshed_at) '
+            f'SELECT %s, row_number() OVER (ORDER BY score DESC, subject_id), subject_id, name, score, %s '
+            f'FROM ({sql}) AS board_rows',
+            [name, timezone.now(), *params])
+        return cursor.rowcount
+
+
+def entries(name, limit=BOARD_SIZE):
+    return LeaderboardEntry.objects.filter(board=name).order_by('rank')[:limit]
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from imdb_app import index_advisor, query_log
+
+
+class Command(BaseCommand):
+    help = ('Replay the SELECTs of the query log with EXPLAIN (ANALYZE, BUFFERS), report sequential scans and '
+            'sorts over large tables and write a migration with the indexes that would avoid them')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help=f'query log to replay (default {query_log.QUERY_LOG_PATH})')
+        parser.add_argument('--min-rows', type=int, default=10000, help='ignore scans of smaller tables')
+        parser.add_argument('--no-trial', action='store_true',
+                            help="don't build each index in a rolled back transaction to measure it")
+        parser.add_argument('--output', help='write the proposed migration here instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            statements = index_advisor.captured_statements(query_log.read(options['log']))
+        except FileNotFoundError as error:
+            raise CommandError(f'No query log at {error.filename}, enable QueryLogMiddleware first')
+        self.stdout.write(f'Replaying {len(statements)} distinct SELECTs')
+        advices = index_advisor.advise(statements, min_rows=options['min_rows'], trial=not options['no_trial'])
+        for advice in advices:
+            self.stdout.write(
+                f'{advice.table}({", ".join(advice.columns)}): {advice.reason}\n'
+                f'    {advice.before_ms:.1f} ms -> {advice.after_ms:.1f} ms, '
+                f'cost {advice.before_cost:.0f} -> {advice.after_cost:.0f}, '
+                f'{advice.statement.calls} calls from {", ".join(advice.statement.routes)}')
+        source = index_advisor.migration_source(advices)
+        if source is None:
+            self.stdout.write(self.style.SUCCESS('No missing indexes found'))
+        elif options['output']:
+            with open(options['output'], 'w') as migration:
+                migration.write(source)
+            self.stdout.write(self.style.SUCCESS(f'Proposed migration written to {options["output"]}'))
+        else:
+            self.stdout.write(source)
@@ -0,0 +1,56 @@
+import base64
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from imdb_app.authentication import CachedJWTAuthentication, token_cache
+from imdb_app.query_budget import QueryCounter
+
+USERNAME = 'benchmark-auth'
+PASSWORD = 'Benchmark-pass-1'
+
+
+class Command(BaseCommand):
+    help = 'Per-request cost of Basic, JWT and cached JWT authentication (runs in a rolled back transaction)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=2000)
+        parser.add_argument('--basic-repeat', type=int, default=5, help='Basic auth hashes the password every call')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create_user(USERNAME, password=PASSWORD)
+            factory = APIRequestFactory()
+            basic = 'Basic ' + base64.b64encode(f'{USERNAME}:{PASSWORD}'.encode()).decode()
+            bearer = f'Bearer {AccessToken.for_user(user)}'
+
+            stateless = CachedJWTAuthentication()
+            stateless.stateless = True
+            stateful = CachedJWTAuthentication()
+            stateful.stateless = False
+            cases = [
+                ('basic', BasicAuthentication(), basic, options['basic_repeat']),
+                ('jwt', JWTAuthentication(), bearer, options['repeat']),
+                ('jwt cached', stateful, bearer, options['repeat']),
+                ('jwt cached stateless', stateless, bearer, options['repeat']),
+            ]
+            for label, authenticator, header, repeat in cases:
+                request = Request(factory.get('/movies/', HTTP_AUTHORIZATION=header))
+                token_cache.clear()
+                authenticator.authenticate(request)  # warm up, fills the token cache
+                with QueryCounter() as counter:
+                    start = time.perf_counter()
+                    for _ in range(repeat):
+                        authenticator.authenticate(request)
+                    elapsed = (time.perf_counter() - start) / repeat
+                self.stdout.write(f'{label:22} {elapsed * 1e6:>12,.1f} us/request   '
+                                  f'{counter.queries / repeat:.2f} queries/request')
+            token_cache.clear()
+            transaction.set_rollback(True)
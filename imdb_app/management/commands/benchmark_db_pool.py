@@ -0,0 +1,66 @@
+import random
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.urls import reverse
+
+from imdb_app import db_pool
+from imdb_app.management.commands.loadtest_movie_page import Command as LoadTest
+from imdb_app.models import MovieActor
+
+# Requests/s of a plain read endpoint and of the movie page (four queries per page) under
+# the WSGI and ASGI handlers, with the connection pool and with POOL switched off, which
+# connects and disconnects per request like the stock backend. Needs the pooled ENGINE.
+# Over a unix socket without a password the handshake is cheap: run against the real host
+# (TCP, scram auth, TLS) for the numbers that matter.
+
+SCENARIOS = {
+    'ratings': lambda movie_id: [reverse('movie-ratings', kwargs={'movie_id': movie_id})],
+    'movie page': lambda movie_id: [reverse('movie-page', kwargs={'movie_id': movie_id})],
+}
+
+
+class Command(BaseCommand):
+    help = 'Requests/s and p99 with and without the database connection pool, under the WSGI and ASGI handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        # GET reads may go to a replica alias (imdb_app.db_routers), switch the pool of every alias
+        pool_options = {alias: db_settings['POOL'] for alias, db_settings in connections.settings.items()
+                        if db_settings.get('POOL') is not None}
+        if not pool_options or not hasattr(connections[next(iter(pool_options))], 'fill_pool'):
+            raise CommandError("Set ENGINE 'imdb_app.pooled_postgresql' and a POOL for the databases")
+        movie_ids = list(MovieActor.objects.order_by().values_list('movie_id', flat=True).distinct()[:1000])
+        if not movie_ids:
+            raise CommandError('No movies with a cast, load populate_db.sql or run import_imdb first')
+        close_old_connections()
+        requests = [random.choice(movie_ids) for _ in range(options['requests'])]
+        load_test = LoadTest()
+        try:
+            for label, paths in SCENARIOS.items():
+                for server, run in [('wsgi', load_test.run_wsgi), ('asgi', load_test.run_asgi)]:
+                    for pooled in [False, True]:
+                        for alias, pool in pool_options.items():
+                            # the wrappers of every thread share this settings dict
+                            connections.settings[alias]['POOL'] = pool if pooled else None
+                        db_pool.close_pools()
+                        elapsed, latencies, errors = run([paths(movie_id) for movie_id in requests],
+                                                         options['concurrency'])
+                        line = (f'{label:10} {server}  {"pool" if pooled else "no pool":7}  '
+                                f'{len(requests) / elapsed:>8.1f} req/s   '
+                                f'p50 {statistics.median(latencies):>7.1f} ms   '
+                                f'p99 {statistics.quantiles(latencies, n=100)[-1]:>7.1f} ms   errors {errors}')
+                        if pooled:
+                            for alias, stats in db_pool.stats().items():
+                                line += (f'\n    {alias}: opened {stats["opened"]} for {stats["checkouts"]} checkouts, '
+                                         f'avg acquire {stats["avg_acquire_ms"]} ms, '
+                                         f'max waiting {stats["max_waiting"]}')
+                        self.stdout.write(line)
+        finally:
+            for alias, pool in pool_options.items():
+                connections.settings[alias]['POOL'] = pool
+            db_pool.close_pools()
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from imdb_app import fast_serializers
+from imdb_app.management.commands.benchmark_serializers import movie_attrs, rating_attrs
+from imdb_app.models import Movie, Rating
+from imdb_app.renderers import MsgPackRenderer, OrjsonRenderer, orjson
+from imdb_app.serializers import MovieSerializer, RatingsSerializer
+
+# payloads shaped like a page of get_all_ratings / MovieViewSet.list
+PAGES = {
+    'ratings': (Rating, RatingsSerializer, rating_attrs),
+    'movies': (Movie, MovieSerializer, movie_attrs),
+}
+
+
+class Command(BaseCommand):
+    help = 'Payload size and encode time of the stdlib JSON, orjson and msgpack renderers on list pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='rows per page')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        candidates = [('json (stdlib)', JSONRenderer())]
+        if orjson is not None:
+            candidates.append(('json (orjson)', OrjsonRenderer()))
+        else:
+            self.stdout.write('orjson is not installed, OrjsonRenderer falls back to stdlib')
+        if MsgPackRenderer.available:
+            candidates.append(('msgpack', MsgPackRenderer()))
+        else:
+            self.stdout.write('msgpack is not installed, application/msgpack is not offered')
+
+        for name, (model, serializer_class, make_attrs) in PAGES.items():
+            values = [{field.name: row.get(field.attname) for field in model._meta.concrete_fields}
+                      for row in map(make_attrs, range(options['rows']))]
+            page = {
+                'next': f'http://testserver/{name}?cursor=WyIyMDI0LTAxLTAxIiwgMTAwMF0%3D',
+                'results': fast_serializers.plan_for(serializer_class).serialize(values),
+            }
+            baseline = None
+            for label, renderer in candidates:
+                body = renderer.render(page, renderer.media_type, {})
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    renderer.render(page, renderer.media_type, {})
+                elapsed = (time.perf_counter() - start) / options['repeat']
+                baseline = baseline or elapsed
+                self.stdout.write(f'{name:8} {label:14} {len(body):>10,} bytes {elapsed * 1000:>9.2f} ms/page   '
+                                  f'x{baseline / elapsed:.1f}')
@@ -0,0 +1,70 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from imdb_app import fast_serializers
+from imdb_app.models import Actor, Movie, Rating
+from imdb_app.serializers import ActorSerializer, MovieSerializer, RatingsSerializer
+
+
+def movie_attrs(i):
+    return {'id': i, 'name': f'Movie {i}', 'description': 'd', 'release_year': 1950 + i % 70,
+            'duration_in_min': 90.0 + i % 60, 'pic_url': None if i % 3 else f'https://img.example.com/{i}.jpg',
+            'updated_at': timezone.now()}
+
+
+def actor_attrs(i):
+    return {'id': i, 'name': f'Actor {i}', 'birth_year': 1940 + i % 60, 'imdb_id': f'nm{i:07d}',
+            'updated_at': timezone.now()}
+
+
+def rating_attrs(i):
+    return {'id': i, 'movie_id': i % 100, 'rating': 1 + i % 10,
+            'rating_date': datetime.date(2020, 1, 1) + datetime.timedelta(days=i % 1000)}
+
+
+CASES = {
+    'movies': (Movie, MovieSerializer, movie_attrs),
+    'actors': (Actor, ActorSerializer, actor_attrs),
+    'ratings': (Rating, RatingsSerializer, rating_attrs),
+}
+
+
+class Command(BaseCommand):
+    help = 'Rows/sec of the ModelSerializer listings against the values() row plans, on in-memory rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('cases', nargs='*', help=f'any of {", ".join(CASES)} (default all)')
+        parser.add_argument('--rows', type=int, default=1000, help='rows per page')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        for name in options['cases'] or CASES:
+            if name not in CASES:
+                raise CommandError(f'Unknown case {name}')
+            model, serializer_class, make_attrs = CASES[name]
+            attrs = [make_attrs(i) for i in range(options['rows'])]
+            instances = [model(**row) for row in attrs]
+            # the dicts queryset.values() returns: field names, related fields as plain ids
+            values = [{field.name: row.get(field.attname) for field in model._meta.concrete_fields}
+                      for row in attrs]
+            plan = fast_serializers.plan_for(serializer_class)
+
+            expected = renderer.render(serializer_class(instances, many=True).data)
+            if renderer.render(plan.serialize(values)) != expected:
+                raise CommandError(f'{name}: row plan output differs from {serializer_class.__name__}')
+
+            serializer_rate = self.rate(lambda: serializer_class(instances, many=True).data, options)
+            plan_rate = self.rate(lambda: plan.serialize(values), options)
+            self.stdout.write(f'{name:8} {serializer_class.__name__:18} {serializer_rate:>12,.0f} rows/s   '
+                              f'row plan {plan_rate:>12,.0f} rows/s   x{plan_rate / serializer_rate:.1f}')
+
+    def rate(self, serialize, options):
+        start = time.perf_counter()
+        for _ in range(options['repeat']):
+            serialize()
+        return options['rows'] * options['repeat'] / (time.perf_counter() - start)
@@ -0,0 +1,80 @@
+import itertools
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from imdb_app import hashers
+
+USER_PREFIX = 'storm-'
+# hashing inline in the request thread, as before the pool
+INLINE_HASHERS = ['django.contrib.auth.hashers.PBKDF2PasswordHasher']
+
+
+class Command(BaseCommand):
+    help = 'Catalogue read latency with and without a concurrent sign-up storm, hashing inline vs on the pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5, help='length of each phase')
+        parser.add_argument('--signup-threads', type=int, default=8)
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.counter = itertools.count()
+        try:
+            for label, hasher_settings in [('inline', {'PASSWORD_HASHERS': INLINE_HASHERS}), ('pool', {})]:
+                with override_settings(**hasher_settings):
+                    quiet = self.phase(options, signup_threads=0)
+                    storm = self.phase(options, signup_threads=options['signup_threads'])
+                self.stdout.write(
+                    f'{label:7} reads p50/p95 quiet {quiet["p50"]:6.1f}/{quiet["p95"]:6.1f} ms   '
+                    f'storm {storm["p50"]:6.1f}/{storm["p95"]:6.1f} ms   '
+                    f'sign-ups {storm["signups"]} ok / {storm["rejected"]} 503')
+            self.stdout.write(f'pool stats: {hashers.pool.stats()}')
+        finally:
+            User.objects.filter(username__startswith=USER_PREFIX).delete()
+
+    def phase(self, options, signup_threads):
+        stop = threading.Event()
+        latencies, statuses = [], []
+
+        def read():
+            client = APIClient(HTTP_HOST='localhost')
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    client.get(reverse('movie-list'), {'page_size': options['page_size']})
+                    latencies.append((time.perf_counter() - start) * 1000)
+            finally:
+                connection.close()
+
+        def sign_up():
+            client = APIClient(HTTP_HOST='localhost')
+            try:
+                while not stop.is_set():
+                    email = f'{USER_PREFIX}{next(self.counter)}@example.com'
+                    response = client.post(reverse('signup'), {'email': email, 'password': 'Storm-pass-1'},
+                                           format='json')
+                    statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=read)] + [threading.Thread(target=sign_up) for _ in range(signup_threads)]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return {
+            'p50': statistics.median(latencies),
+            'p95': statistics.quantiles(latencies, n=20)[-1],
+            'signups': sum(1 for code in statuses if code < 300),
+            'rejected': statuses.count(503),
+        }
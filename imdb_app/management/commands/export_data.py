@@ -0,0 +1,47 @@
+import argparse
+import sys
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from imdb_app import export
+
+
+def date_argument(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        # well formed but not a calendar date
+        parsed = None
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f'{value!r} is not a YYYY-MM-DD date')
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Stream ratings, movies or movie_actors rows as NDJSON or CSV with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(export.EXPORTS))
+        parser.add_argument('--output-format', choices=export.FORMATS, default='ndjson')
+        parser.add_argument('--from-date', type=date_argument, help='ratings only, YYYY-MM-DD')
+        parser.add_argument('--to-date', type=date_argument, help='ratings only, YYYY-MM-DD')
+        parser.add_argument('--after-id', type=int, help='resume after this id')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--file', help='write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        fields, rows = export.export_rows(
+            options['table'],
+            from_date=options['from_date'],
+            to_date=options['to_date'],
+            after_id=options['after_id'],
+            chunk_size=options['chunk_size'],
+        )
+        out = open(options['file'], 'w', newline='') if options['file'] else sys.stdout
+        try:
+            for line in export.render(options['output_format'], fields, rows):
+                out.write(line)
+        finally:
+            if out is not sys.stdout:
+                out.close()
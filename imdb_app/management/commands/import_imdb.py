@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from imdb_app import imdb_import
+
+
+class Command(BaseCommand):
+    help = 'Import (upsert) the IMDb TSV dumps title.basics, name.basics, title.principals and title.ratings ' \
+           '(.tsv.gz or .tsv) from a directory. title.ratings fills Movie.imdb_rating / imdb_votes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--only', nargs='+', choices=list(imdb_import.FILES),
+                            help='only import these files')
+        parser.add_argument('--batch-size', type=int, default=imdb_import.DEFAULT_BATCH_SIZE)
+        parser.add_argument('--title-types', nargs='+', default=list(imdb_import.DEFAULT_TITLE_TYPES),
+                            help='titleType values of title.basics to import as movies')
+        parser.add_argument('--defer-indexes', action='store_true',
+                            help='full load: drop the secondary indexes of each target table and rebuild them '
+                                 'after the merge (PostgreSQL, locks the table until then)')
+
+    def handle(self, *args, **options):
+        # FILES order, whatever order --only names them in
+        kinds = [kind for kind in imdb_import.FILES if not options['only'] or kind in options['only']]
+        paths = {}
+        for kind in kinds:
+            paths[kind] = imdb_import.find_file(options['directory'], imdb_import.FILES[kind])
+            if paths[kind] is None:
+                raise CommandError(f"{imdb_import.FILES[kind]}.tsv(.gz) not found in {options['directory']}")
+
+        # FILES is ordered so titles and names exist before principals reference them
+        for kind in kinds:
+            started = time.monotonic()
+
+            def progress(kind, count):
+                rate = count / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f'{kind}: {count} rows read ({rate:.0f} rows/s)')
+
+            loaded, written = imdb_import.import_file(kind, paths[kind], batch_size=options['batch_size'],
+                                                      progress=progress, title_types=tuple(options['title_types']),
+                                                      defer_indexes=options['defer_indexes'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{kind}: {loaded} rows read, {written} rows written in {time.monotonic() - started:.1f}s'))
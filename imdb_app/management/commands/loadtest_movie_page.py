@@ -0,0 +1,123 @@
+import asyncio
+import io
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections
+from django.urls import reverse
+
+from imdb_app.models import MovieActor
+
+# Drives the WSGI and ASGI application objects in process (no sockets), as a threaded WSGI
+# server and an ASGI event loop would: the same --concurrency requests in flight either way.
+# For numbers through real servers point a load generator at gunicorn and uvicorn instead.
+
+ROUND_TRIPS = ['async-movie-detail', 'async-movie-cast', 'async-movie-rating-avg', 'async-movie-oscars']
+
+
+def wsgi_get(application, path):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': True,
+        'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_get(application, path):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost')], 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    received = False
+    statuses = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # the client never disconnects, Django cancels this once the response is out
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await application(scope, receive, send)
+    return statuses[0]
+
+
+class Command(BaseCommand):
+    help = 'Throughput and p99 of the movie page (one request vs four round trips) under the WSGI and ASGI handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=500, help='pages fetched per scenario')
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        movie_ids = list(MovieActor.objects.order_by().values_list('movie_id', flat=True).distinct()[:1000])
+        if not movie_ids:
+            raise CommandError('No movies with a cast, load populate_db.sql or run import_imdb first')
+        close_old_connections()
+        pages = [random.choice(movie_ids) for _ in range(options['pages'])]
+        scenarios = {
+            'page': lambda movie_id: [reverse('movie-page', kwargs={'movie_id': movie_id})],
+            '4 round trips': lambda movie_id: [reverse(name, kwargs={'movie_id': movie_id}) for name in ROUND_TRIPS],
+        }
+        for label, paths in scenarios.items():
+            for server, run in [('wsgi', self.run_wsgi), ('asgi', self.run_asgi)]:
+                elapsed, latencies, errors = run([paths(movie_id) for movie_id in pages], options['concurrency'])
+                self.stdout.write(
+                    f'{label:14} {server}  {len(pages) / elapsed:>8.1f} pages/s   '
+                    f'p50 {statistics.median(latencies):>7.1f} ms   '
+                    f'p99 {statistics.quantiles(latencies, n=100)[-1]:>7.1f} ms   errors {errors}')
+
+    def run_wsgi(self, pages, concurrency):
+        application = get_wsgi_application()
+
+        def fetch(paths):
+            start = time.perf_counter()
+            ok = all(wsgi_get(application, path) == 200 for path in paths)
+            return (time.perf_counter() - start) * 1000, ok
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(fetch, pages))
+        return time.perf_counter() - start, [latency for latency, _ in results], sum(1 for _, ok in results if not ok)
+
+    def run_asgi(self, pages, concurrency):
+        application = get_asgi_application()
+
+        async def main():
+            slots = asyncio.Semaphore(concurrency)
+
+            async def fetch(paths):
+                async with slots:
+                    start = time.perf_counter()
+                    ok = True
+                    for path in paths:
+                        ok = await asgi_get(application, path) == 200 and ok
+                    return (time.perf_counter() - start) * 1000, ok
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*[fetch(paths) for paths in pages])
+            return time.perf_counter() - start, results
+
+        elapsed, results = asyncio.run(main())
+        return elapsed, [latency for latency, _ in results], sum(1 for _, ok in results if not ok)
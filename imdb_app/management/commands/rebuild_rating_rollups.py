@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from imdb_app import rating_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per movie and day rating rollups (rating_daily) from the ratings table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('movie_ids', nargs='*', type=int, help='only rebuild these movies')
+
+    def handle(self, *args, **options):
+        movie_ids = options['movie_ids'] or None
+        rows = rating_rollups.rebuild(movie_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} movie/day rating rollups'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from imdb_app import rating_stats
+
+
+class Command(BaseCommand):
+    help = ('Recompute the denormalized rating count/sum/min/max/avg and votes_<n> histogram columns of movies '
+            'from the ratings table')
+
+    def add_arguments(self, parser):
+        parser.add_argument('movie_ids', nargs='*', type=int, help='only rebuild these movies')
+
+    def handle(self, *args, **options):
+        movie_ids = options['movie_ids'] or None
+        updated = rating_stats.rebuild(movie_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating stats for {updated} movies'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from imdb_app import leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized leaderboards (all of them by default), meant to run periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f'any of {", ".join(leaderboards.LEADERBOARDS)}')
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(leaderboards.LEADERBOARDS)
+        unknown = [name for name in names if name not in leaderboards.LEADERBOARDS]
+        if unknown:
+            raise CommandError(f'Unknown leaderboards: {", ".join(unknown)}')
+        for name in names:
+            start = time.perf_counter()
+            stored = leaderboards.refresh(name)
+            self.stdout.write(self.style.SUCCESS(
+                f'Refreshed {name}: {stored} rows in {(time.perf_counter() - start) * 1000:.0f} ms'))
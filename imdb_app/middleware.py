@@ -0,0 +1,93 @@
+import logging
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from imdb_app import db_routers, query_log
+from imdb_app.query_budget import QueryCounter, get_budget
+
+logger = logging.getLogger('imdb_app.query_budget')
+
+
+class QueryBudgetMiddleware:
+    """
+    Opt-in (staging): counts the SQL of every request and logs the ones that go over
+    the budget declared for their route in imdb_app.query_budget.QUERY_BUDGETS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is None:
+            return response
+        budget = get_budget(match.url_name, request.method)
+        if budget is None:
+            logger.warning('No query budget declared for %s %s (%s)', request.method, match.url_name, request.path)
+        elif counter.over_budget(budget):
+            logger.warning('%s %s ran %d queries / %d rows, budget is %d queries / %s rows',
+                           request.method, request.path, counter.queries, counter.rows,
+                           budget.queries, budget.rows)
+        return response
+
+
+class QueryLogMiddleware:
+    """
+    Opt-in (staging): records the SQL of a QUERY_LOG_SAMPLE_RATE share of the requests into
+    the query log (imdb_app.query_log) that `manage.py advise_indexes` replays.
+    Statements a streaming response runs after the view returned are not recorded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= query_log.QUERY_LOG_SAMPLE_RATE:
+            return self.get_response(request)
+        with query_log.QueryRecorder() as recorder:
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is not None and recorder.statements:
+            query_log.append(match.url_name, request.method, recorder.statements)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets imdb_app.db_routers.ReplicaRouter send the reads of safe requests to the replicas, and
+    pins the clients that wrote to the primary for READ_YOUR_WRITES_SECONDS.
+    First in MIDDLEWARE, so the session and auth reads / writes are routed too.
+    Sync and async capable: under ASGI the chain stays async and the async views keep
+    running without a thread per request. The routing state is a contextvar, which the
+    sync_to_async calls of the ORM inherit.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = db_routers.start(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            db_routers.finish(token, request, None)
+            raise
+        return db_routers.finish(token, request, response)
+
+    async def __acall__(self, request):
+        token = db_routers.start(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            db_routers.finish(token, request, None)
+            raise
+        return db_routers.finish(token, request, response)
@@ -0,0 +1,95 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:54
+
+import django.core.validators
+import django.db.models.deletion
+import imdb_app.models
+from django.db import migrations, models
+from django.db.models import Count, FloatField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Movie = apps.get_model('imdb_app', 'Movie')
+    Rating = apps.get_model('imdb_app', 'Rating')
+    ratings = Rating.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+
+    def stat(aggregate):
+        return Subquery(ratings.annotate(value=aggregate).values('value'))
+
+    Movie.objects.update(
+        rating_count=Coalesce(stat(Count('id')), 0),
+        rating_sum=Coalesce(stat(Sum('rating')), 0),
+        rating_min=stat(Min('rating')),
+        rating_max=stat(Max('rating')),
+        avg_rating=Coalesce(stat(Cast(Sum('rating'), FloatField()) / Count('id')), Value(0.0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Director',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_column='name', max_length=256)),
+            ],
+            options={
+                'db_table': 'directors',
+            },
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='avg_rating',
+            field=models.FloatField(db_column='avg_rating', db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_count',
+            field=models.IntegerField(db_column='rating_count', default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_max',
+            field=models.SmallIntegerField(db_column='rating_max', null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_min',
+            field=models.SmallIntegerField(db_column='rating_min', null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_sum',
+            field=models.BigIntegerField(db_column='rating_sum', default=0),
+        ),
+        migrations.AlterField(
+            model_name='actor',
+            name='birth_year',
+            field=models.IntegerField(db_column='birth_year', validators=[imdb_app.models.validate_birth_date]),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='release_year',
+            field=models.IntegerField(db_column='year', validators=[django.core.validators.MinValueValidator(1800), imdb_app.models.validate_year_before_now]),
+        ),
+        migrations.CreateModel(
+            name='Oscar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(db_column='year', validators=[django.core.validators.MinValueValidator(1800), imdb_app.models.validate_year_before_now])),
+                ('nomination', models.CharField(db_column='nomination', max_length=256)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='imdb_app.actor')),
+                ('director', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='imdb_app.director')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='imdb_app.movie')),
+            ],
+            options={
+                'db_table': 'oscar',
+            },
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
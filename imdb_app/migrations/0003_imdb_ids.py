@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0002_movie_rating_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actor',
+            name='imdb_id',
+            field=models.CharField(blank=True, db_column='imdb_id', max_length=16, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_id',
+            field=models.CharField(blank=True, db_column='imdb_id', max_length=16, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:57
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0003_imdb_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rating',
+            name='rating_date',
+            field=models.DateField(db_column='rating_date', default=datetime.date.today),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:58
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# keeps search_vector current for every write path (save, bulk_create, COPY imports)
+CREATE_TRIGGER = """
+CREATE FUNCTION movies_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER movies_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON movies
+    FOR EACH ROW EXECUTE FUNCTION movies_search_vector_update();
+
+UPDATE movies SET name = name;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS movies_search_vector_trigger ON movies;
+DROP FUNCTION IF EXISTS movies_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0004_rating_date_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(db_column='search_vector', editable=False, null=True),
+        ),
+        # backfill before building the index
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name='movie',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='movies_search_vector_gin'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0006_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_column='updated_at'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_column='updated_at'),
+        ),
+        migrations.AddField(
+            model_name='movieactor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_column='updated_at'),
+        ),
+        migrations.AddField(
+            model_name='oscar',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_column='updated_at'),
+        ),
+    ]
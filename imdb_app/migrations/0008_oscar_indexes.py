@@ -0,0 +1,46 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0007_updated_at'),
+    ]
+
+    operations = [
+        # the composites go in before the single column FK indexes they replace are dropped
+        migrations.AddIndex(
+            model_name='oscar',
+            index=models.Index(fields=['year', 'nomination'], name='oscar_year_nomination'),
+        ),
+        migrations.AddIndex(
+            model_name='oscar',
+            index=models.Index(fields=['movie', 'year'], name='oscar_movie_year'),
+        ),
+        migrations.AddIndex(
+            model_name='oscar',
+            index=models.Index(fields=['actor', 'year'], name='oscar_actor_year'),
+        ),
+        migrations.AddIndex(
+            model_name='oscar',
+            index=models.Index(fields=['director', 'year'], name='oscar_director_year'),
+        ),
+        migrations.AlterField(
+            model_name='oscar',
+            name='actor',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='imdb_app.actor'),
+        ),
+        migrations.AlterField(
+            model_name='oscar',
+            name='director',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='imdb_app.director'),
+        ),
+        migrations.AlterField(
+            model_name='oscar',
+            name='movie',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='imdb_app.movie'),
+        ),
+    ]
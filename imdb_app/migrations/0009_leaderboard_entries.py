@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0008_oscar_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(db_column='board', max_length=64)),
+                ('rank', models.IntegerField(db_column='rank')),
+                ('subject_id', models.BigIntegerField(db_column='subject_id', db_index=False)),
+                ('name', models.CharField(db_column='name', max_length=256)),
+                ('score', models.FloatField(db_column='score')),
+                ('refreshed_at', models.DateTimeField(db_column='refreshed_at')),
+            ],
+            options={
+                'db_table': 'leaderboard_entries',
+                'constraints': [models.UniqueConstraint(fields=('board', 'rank'), name='leaderboard_board_rank')],
+            },
+        ),
+    ]
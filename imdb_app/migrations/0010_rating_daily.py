@@ -0,0 +1,35 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# the ratings recorded so far
+BACKFILL = """
+INSERT INTO rating_daily (movie_id, day, rating_count, rating_sum)
+SELECT movie_id, rating_date, count(*), sum(rating) FROM ratings GROUP BY movie_id, rating_date;
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0009_leaderboard_entries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_column='day')),
+                ('rating_count', models.IntegerField(db_column='rating_count')),
+                ('rating_sum', models.BigIntegerField(db_column='rating_sum')),
+                ('movie', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='imdb_app.movie')),
+            ],
+            options={
+                'db_table': 'rating_daily',
+                'constraints': [models.UniqueConstraint(fields=('movie', 'day'), name='rating_daily_movie_day')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
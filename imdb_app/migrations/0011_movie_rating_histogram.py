@@ -0,0 +1,77 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_histogram(apps, schema_editor):
+    Movie = apps.get_model('imdb_app', 'Movie')
+    Rating = apps.get_model('imdb_app', 'Rating')
+    ratings = Rating.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+
+    def votes(rating):
+        return Coalesce(Subquery(ratings.annotate(value=Count('id', filter=Q(rating=rating))).values('value')), 0)
+
+    Movie.objects.update(**{f'votes_{rating}': votes(rating) for rating in range(1, 11)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0010_rating_daily'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='votes_1',
+            field=models.IntegerField(db_column='votes_1', default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='votes_10',
+            field=models.IntegerField(db_column='votes_10', default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='votes_2',
+            field=models.IntegerField(db_column='votes_2', default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='votes_3',
+            field=models.IntegerField(db_column='votes_3', default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='votes_4',
+            field=models.IntegerField(db_column='votes_4', default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='votes_5',
+            field=models.IntegerField(db_column='votes_5', default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='votes_6',
+            field=models.IntegerField(db_column='votes_6', default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='votes_7',
+            field=models.IntegerField(db_column='votes_7', default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='votes_8',
+            field=models.IntegerField(db_column='votes_8', default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='votes_9',
+            field=models.IntegerField(db_column='votes_9', default=0),
+        ),
+        migrations.RunPython(backfill_rating_histogram, migrations.RunPython.noop),
+    ]
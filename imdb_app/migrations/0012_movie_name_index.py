@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0011_movie_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movie',
+            name='name',
+            field=models.CharField(db_column='name', db_index=True, max_length=256),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0012_movie_name_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['release_year', 'id'], name='movies_year_id_ix'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['duration_in_min', 'id'], name='movies_duration_id_ix'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['rating_date', 'id'], name='ratings_rating_date_id_ix'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-18 08:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imdb_app', '0013_advised_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_rating',
+            field=models.FloatField(blank=True, db_column='imdb_rating', null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_votes',
+            field=models.IntegerField(blank=True, db_column='imdb_votes', null=True),
+        ),
+    ]
@@ -1,8 +1,11 @@
 import datetime
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models.functions import Collate, Upper
 
 # Create your models here.
 
@@ -13,15 +16,24 @@ def validate_birth_date(val):
 
 
 class Actor(models.Model):
-    name = models.CharField(max_length=256, db_column='name', null=False, blank=False)
+    name = models.CharField(max_length=256, db_column='name', null=False, blank=False, db_index=True)
     birth_year = models.IntegerField(db_column='birth_year', null=False,
                                      validators=[validate_birth_date])
+    # nconst of rows loaded by import_imdb
+    imdb_id = models.CharField(max_length=16, db_column='imdb_id', null=True, blank=True, unique=True)
+    updated_at = models.DateTimeField(db_column='updated_at', auto_now=True)
 
     def __str__(self):
         return self.name
 
     class Meta:
         db_table = 'actors'
+        indexes = [
+            # the %> fuzzy match of autocomplete
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='actors_name_trgm'),
+            # the prefix match of autocomplete, read in order: LIKE 'PREFIX%' ... ORDER BY ... LIMIT
+            models.Index(Collate(Upper('name'), 'C'), name='actors_name_prefix'),
+        ]
 
 
 def validate_year_before_now(val):
@@ -30,28 +42,92 @@ def validate_year_before_now(val):
 
 
 class Movie(models.Model):
-    name = models.CharField(max_length=256, db_column='name', null=False)
+    # indexed for the name uniqueness checks of the create paths
+    name = models.CharField(max_length=256, db_column='name', null=False, db_index=True)
     description = models.TextField(db_column='description', null=False)
     duration_in_min = models.FloatField(db_column='duration', null=False)
     release_year = models.IntegerField(db_column='year', null=False,
                                        validators=[MinValueValidator(1800), validate_year_before_now])
     pic_url = models.URLField(max_length=512, db_column='pic_url', null=True)
+    # tconst of rows loaded by import_imdb
+    imdb_id = models.CharField(max_length=16, db_column='imdb_id', null=True, blank=True, unique=True)
+    # averageRating / numVotes of title.ratings, kept apart from the ratings made here
+    imdb_rating = models.FloatField(db_column='imdb_rating', null=True, blank=True)
+    imdb_votes = models.IntegerField(db_column='imdb_votes', null=True, blank=True)
+
+    # denormalized rating state, maintained by imdb_app.rating_stats
+    rating_count = models.IntegerField(db_column='rating_count', null=False, default=0)
+    rating_sum = models.BigIntegerField(db_column='rating_sum', null=False, default=0)
+    rating_min = models.SmallIntegerField(db_column='rating_min', null=True)
+    rating_max = models.SmallIntegerField(db_column='rating_max', null=True)
+    avg_rating = models.FloatField(db_column='avg_rating', null=False, default=0, db_index=True)
+    # number of ratings of each value 1..10, see HISTOGRAM_FIELDS
+    votes_1 = models.IntegerField(db_column='votes_1', null=False, default=0)
+    votes_2 = models.IntegerField(db_column='votes_2', null=False, default=0)
+    votes_3 = models.IntegerField(db_column='votes_3', null=False, default=0)
+    votes_4 = models.IntegerField(db_column='votes_4', null=False, default=0)
+    votes_5 = models.IntegerField(db_column='votes_5', null=False, default=0)
+    votes_6 = models.IntegerField(db_column='votes_6', null=False, default=0)
+    votes_7 = models.IntegerField(db_column='votes_7', null=False, default=0)
+    votes_8 = models.IntegerField(db_column='votes_8', null=False, default=0)
+    votes_9 = models.IntegerField(db_column='votes_9', null=False, default=0)
+    votes_10 = models.IntegerField(db_column='votes_10', null=False, default=0)
+    # name (weight A) + description (weight B), filled by a database trigger on insert/update
+    search_vector = SearchVectorField(db_column='search_vector', null=True, editable=False)
+    # ETag / Last-Modified source, queryset.update() callers have to set it themselves
+    updated_at = models.DateTimeField(db_column='updated_at', auto_now=True)
 
     actors = models.ManyToManyField(Actor, through='MovieActor')
 
     class Meta:
         db_table = 'movies'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='movies_search_vector_gin'),
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='movies_name_trgm'),
+            models.Index(Collate(Upper('name'), 'C'), name='movies_name_prefix'),
+            # ?release_year= / ?duration_from=&duration_to= pages in id order and ?ordering=release_year
+            # (found by manage.py advise_indexes)
+            models.Index(fields=['release_year', 'id'], name='movies_year_id_ix'),
+            models.Index(fields=['duration_in_min', 'id'], name='movies_duration_id_ix'),
+        ]
+
+
+# text search configuration used by the search_vector trigger and the search queries
+SEARCH_CONFIG = 'english'
+
+# rating value -> Movie column counting it
+HISTOGRAM_FIELDS = {rating: f'votes_{rating}' for rating in range(1, 11)}
 
 
 class Rating(models.Model):
     movie = models.ForeignKey('Movie', on_delete=models.CASCADE, )
     rating = models.SmallIntegerField(db_column='rating', null=False, validators=[MinValueValidator(1),
                                                                                   MaxValueValidator(10)])
-    rating_date = models.DateField(db_column='rating_date', null=False, auto_now_add=True)
+    # a default instead of auto_now_add so bulk submissions can carry their own date
+    rating_date = models.DateField(db_column='rating_date', null=False, default=datetime.date.today)
 
     # created_by = models.ForeignKey(User)
     class Meta:
         db_table = 'ratings'
+        indexes = [
+            # ?from_date=&to_date= pages of /ratings (found by manage.py advise_indexes)
+            models.Index(fields=['rating_date', 'id'], name='ratings_rating_date_id_ix'),
+        ]
+
+
+class RatingDaily(models.Model):
+    # per movie and day rollup of ratings, maintained by imdb_app.rating_rollups
+    movie = models.ForeignKey('Movie', on_delete=models.CASCADE, db_index=False)
+    day = models.DateField(db_column='day')
+    rating_count = models.IntegerField(db_column='rating_count')
+    rating_sum = models.BigIntegerField(db_column='rating_sum')
+
+    class Meta:
+        db_table = 'rating_daily'
+        constraints = [
+            # the upsert target, and the (movie, day range) index time series are read from
+            models.UniqueConstraint(fields=['movie', 'day'], name='rating_daily_movie_day'),
+        ]
 
 
 class MovieActor(models.Model):
@@ -59,6 +135,7 @@ class MovieActor(models.Model):
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
     salary = models.IntegerField()
     main_role = models.BooleanField(null=False, blank=False)
+    updated_at = models.DateTimeField(db_column='updated_at', auto_now=True)
 
     def __str__(self):
         return f"{self.actor.name} in movie {self.movie.name}"
@@ -81,12 +158,40 @@ class Oscar(models.Model):
     year = models.IntegerField(db_column='year', null=False,
                                        validators=[MinValueValidator(1800), validate_year_before_now])
     nomination = models.CharField(max_length=256, db_column='nomination', null=False)
-    movie = models.ForeignKey('Movie', on_delete=models.CASCADE)
-    actor = models.ForeignKey('Actor', on_delete=models.CASCADE, null=True, blank=True)
-    director = models.ForeignKey('Director', on_delete=models.CASCADE, null=True, blank=True)
+    # the FK columns are indexed by the (fk, year) composites below
+    movie = models.ForeignKey('Movie', on_delete=models.CASCADE, db_index=False)
+    actor = models.ForeignKey('Actor', on_delete=models.CASCADE, null=True, blank=True, db_index=False)
+    director = models.ForeignKey('Director', on_delete=models.CASCADE, null=True, blank=True, db_index=False)
+    updated_at = models.DateTimeField(db_column='updated_at', auto_now=True)
 
     def __str__(self):
         return f"{self.nomination} in movie {self.movie}"
 
     class Meta:
         db_table = 'oscar'
+        indexes = [
+            # year ranges, optionally narrowed to a nomination, and the wins per year
+            models.Index(fields=['year', 'nomination'], name='oscar_year_nomination'),
+            # one movie's / actor's / director's history in year order (the keyset ordering)
+            models.Index(fields=['movie', 'year'], name='oscar_movie_year'),
+            models.Index(fields=['actor', 'year'], name='oscar_actor_year'),
+            models.Index(fields=['director', 'year'], name='oscar_director_year'),
+        ]
+
+
+class LeaderboardEntry(models.Model):
+    # materialized rows of the boards in imdb_app.leaderboards, replaced by leaderboards.refresh()
+    board = models.CharField(max_length=64, db_column='board')
+    rank = models.IntegerField(db_column='rank')
+    # id of the movie / actor the board ranks (bigint like their keys), boards are only read by (board, rank)
+    subject_id = models.BigIntegerField(db_column='subject_id', db_index=False)
+    name = models.CharField(max_length=256, db_column='name')
+    score = models.FloatField(db_column='score')
+    refreshed_at = models.DateTimeField(db_column='refreshed_at')
+
+    class Meta:
+        db_table = 'leaderboard_entries'
+        constraints = [
+            # also the index a board page is read from
+            models.UniqueConstraint(fields=['board', 'rank'], name='leaderboard_board_rank'),
+        ]
@@ -0,0 +1,166 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a (sort_key, id) pair.
+    The cursor holds the sort value and id of the last row of the page, so every page is
+    an index range scan and no COUNT(*) / OFFSET is issued no matter how deep the client goes.
+    The sort key is picked with ?ordering=<field> or ?ordering=-<field>, restricted to the
+    view's ordering_fields (non-null columns only).
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    ordering_fields = ['id']
+    default_ordering = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, view)
+
+        queryset = queryset.order_by(*self.order_by())
+        cursor = self.decode_cursor(request, queryset)
+        if cursor is not None:
+            queryset = queryset.filter(self.seek_filter(*cursor))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request, view):
+        allowed = getattr(view, 'ordering_fields', None) or self.ordering_fields
+        ordering = request.query_params.get(self.ordering_param, self.default_ordering)
+        field = ordering.lstrip('-')
+        if field not in allowed and field != 'id':
+            field, ordering = self.default_ordering.lstrip('-'), self.default_ordering
+        return field, ordering.startswith('-')
+
+    def order_by(self):
+        prefix = '-' if self.descending else ''
+        if self.field == 'id':
+            return [prefix + 'id']
+        return [prefix + self.field, prefix + 'id']
+
+    def seek_filter(self, value, last_id):
+        op = 'lt' if self.descending else 'gt'
+        if self.field == 'id':
+            return Q(**{f'id__{op}': last_id})
+        return Q(**{f'{self.field}__{op}': value}) | Q(**{self.field: value, f'id__{op}': last_id})
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, last_id = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            # a cursor is client input, the filter must not reach the database with a wrong type
+            last_id = int(last_id)
+            value = self.sort_field(queryset).to_python(value)
+            if value is None:
+                raise ValueError
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound('Invalid cursor')
+        return value, last_id
+
+    def sort_field(self, queryset):
+        try:
+            return queryset.model._meta.get_field(self.field)
+        except FieldDoesNotExist:
+            # an annotation, e.g. the search rank
+            return queryset.query.annotations[self.field].output_field
+
+    def encode_cursor(self, row):
+        value = getattr(row, self.field) if not isinstance(row, dict) else row[self.field]
+        last_id = row.id if not isinstance(row, dict) else row['id']
+        payload = json.dumps([value, last_id], cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+
+class RatingKeysetPagination(KeysetPagination):
+    ordering_fields = ['rating_date']
+
+
+class SearchKeysetPagination(KeysetPagination):
+    # rank is annotated by the search view
+    ordering_fields = ['rank']
+    default_ordering = '-rank'
+
+
+class ListPagination(BasePagination):
+    """
+    Pagination of the movie, actor and Oscar lists. Page numbers (?page=N, with count and
+    previous) by default, the response those lists always had. ?pagination=keyset, or the
+    ?cursor= of a keyset next link, switches to KeysetPagination. Both follow ?ordering=.
+    """
+    mode_query_param = 'pagination'
+    keyset_mode = 'keyset'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        keyset = KeysetPagination()
+        if (request.query_params.get(self.mode_query_param) == self.keyset_mode
+                or keyset.cursor_query_param in request.query_params):
+            self.paginator = keyset
+            return keyset.paginate_queryset(queryset, request, view)
+        keyset.field, keyset.descending = keyset.get_ordering(request, view)
+        self.paginator = PageNumberPagination()
+        self.paginator.page_size_query_param = keyset.page_size_query_param
+        self.paginator.max_page_size = keyset.max_page_size
+        return self.paginator.paginate_queryset(queryset.order_by(*keyset.order_by()), request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return PageNumberPagination().get_paginated_response_schema(schema)
+
+    def validator_state(self):
+        """What the ETag of a page covers besides its rows"""
+        if isinstance(self.paginator, KeysetPagination):
+            return self.paginator.has_next
+        return self.paginator.page.paginator.count
@@ -0,0 +1,50 @@
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+
+from imdb_app import db_pool
+
+# ENGINE 'imdb_app.pooled_postgresql': the stock PostgreSQL backend, with connect / close going
+# through imdb_app.db_pool. Configured by a POOL entry next to ENGINE, e.g.
+#     'POOL': {'MIN_SIZE': 2, 'MAX_SIZE': 20, 'TIMEOUT': 5, 'MAX_LIFETIME': 1800, ...}
+# (see db_pool.DEFAULTS), POOL = None connects per request like the stock backend.
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # idle pooled connections would keep DROP DATABASE waiting
+        db_pool.close_pools(test_database_name)
+        return super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    # the pool the current connection came from
+    _connection_pool = None
+
+    def _pool_for(self, conn_params):
+        options = self.settings_dict.get('POOL')
+        # the test runner's CREATE / DROP DATABASE connections are not pooled
+        if options is None or self.alias == NO_DB_ALIAS:
+            return None
+        return db_pool.pool_for(self.alias, conn_params, options)
+
+    def get_new_connection(self, conn_params):
+        self._connection_pool = self._pool_for(conn_params)
+        if self._connection_pool is None:
+            return super().get_new_connection(conn_params)
+        return self._connection_pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+
+    def _close(self):
+        pool, self._connection_pool = self._connection_pool, None
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.release(self.connection)
+
+    def fill_pool(self):
+        conn_params = self.get_connection_params()
+        pool = self._pool_for(conn_params)
+        if pool is not None:
+            pool.fill(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
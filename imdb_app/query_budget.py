@@ -0,0 +1,128 @@
+from collections import namedtuple
+from contextlib import ExitStack
+
+from django.db import connections
+
+from imdb_app.leaderboards import BOARD_SIZE
+
+
+# Declared SQL cost of every route in imdb_app/urls.py, keyed by (url name, HTTP method).
+# queries counts every statement sent to the database (savepoints included), rows counts the
+# rows returned by SELECTs (None = not bounded, e.g. streamed exports read through a
+# server-side cursor). The test suite fails when a route is missing from this table or goes
+# over its budget, QueryBudgetMiddleware logs requests over budget in staging.
+QueryBudget = namedtuple('QueryBudget', ['queries', 'rows'])
+
+QUERY_BUDGETS = {
+    ('api-root', 'GET'): QueryBudget(queries=0, rows=0),
+    ('login', 'POST'): QueryBudget(queries=1, rows=1),
+    ('token-refresh', 'POST'): QueryBudget(queries=1, rows=1),
+    ('signup', 'POST'): QueryBudget(queries=2, rows=0),
+
+    # the list pages count their rows, ?pagination=keyset reads the page alone
+    ('movie-list', 'GET'): QueryBudget(queries=2, rows=101),
+    # name, actors, then the movie and cast INSERTs in a savepoint, whatever the cast size (5 in the test)
+    ('movie-list', 'POST'): QueryBudget(queries=6, rows=5),
+    ('movie-detail', 'GET'): QueryBudget(queries=1, rows=1),
+    ('movie-detail', 'PUT'): QueryBudget(queries=2, rows=1),
+    ('movie-detail', 'PATCH'): QueryBudget(queries=2, rows=1),
+    ('movie-actors', 'GET'): QueryBudget(queries=2, rows=21),
+    # 10 latest ratings, the Oscars of the movie, its cast and directors
+    ('movie-full', 'GET'): QueryBudget(queries=4, rows=90),
+    ('movie-search', 'GET'): QueryBudget(queries=1, rows=101),
+    # names, actors, then the movie and cast INSERTs, whatever the batch size (100 x 5 in the test)
+    ('movie-bulk', 'POST'): QueryBudget(queries=6, rows=5),
+    ('movie-cast', 'GET'): QueryBudget(queries=2, rows=21),
+    ('movie-actor-add', 'POST'): QueryBudget(queries=3, rows=2),
+    ('movie-actor-add', 'PUT'): QueryBudget(queries=1, rows=1),
+    ('movie-actor-remove', 'DELETE'): QueryBudget(queries=2, rows=1),
+    ('movie-ratings', 'GET'): QueryBudget(queries=2, rows=201),
+    ('movie-rating-avg', 'GET'): QueryBudget(queries=1, rows=1),
+    ('movie-rating-histogram', 'GET'): QueryBudget(queries=1, rows=1),
+    ('movie-rating-add', 'POST'): QueryBudget(queries=6, rows=1),
+    # one row per bucket, a 10 year chart by day
+    ('movie-rating-timeseries', 'GET'): QueryBudget(queries=2, rows=3661),
+
+    ('actor-list', 'GET'): QueryBudget(queries=2, rows=101),
+    ('actor-list', 'POST'): QueryBudget(queries=1, rows=0),
+    ('actor-detail', 'GET'): QueryBudget(queries=1, rows=1),
+    ('actor-detail', 'PUT'): QueryBudget(queries=2, rows=1),
+    ('actor-detail', 'PATCH'): QueryBudget(queries=2, rows=1),
+    ('actor-detail', 'DELETE'): QueryBudget(queries=4, rows=1),
+    # the prefix match, then the fuzzy one when the prefix didn't fill the page
+    ('autocomplete-actors', 'GET'): QueryBudget(queries=2, rows=50),
+    ('autocomplete-movies', 'GET'): QueryBudget(queries=2, rows=50),
+
+    ('oscar-list', 'GET'): QueryBudget(queries=2, rows=101),
+    # one row per group, at most ?limit= (default 100)
+    ('oscar-wins', 'GET'): QueryBudget(queries=1, rows=100),
+    ('oscar-list', 'POST'): QueryBudget(queries=4, rows=3),
+    ('oscar-detail', 'GET'): QueryBudget(queries=1, rows=1),
+    ('oscar-detail', 'PUT'): QueryBudget(queries=5, rows=4),
+    ('oscar-detail', 'PATCH'): QueryBudget(queries=2, rows=1),
+    ('oscar-detail', 'DELETE'): QueryBudget(queries=2, rows=1),
+
+    ('rating-list', 'GET'): QueryBudget(queries=1, rows=101),
+    ('rating-bulk', 'POST'): QueryBudget(queries=6, rows=100),
+    ('rating-delete', 'DELETE'): QueryBudget(queries=10, rows=2),
+    ('export-ratings', 'GET'): QueryBudget(queries=1, rows=None),
+    ('export-movies', 'GET'): QueryBudget(queries=1, rows=None),
+    ('export-movie-actors', 'GET'): QueryBudget(queries=1, rows=None),
+
+    ('movie-page', 'GET'): QueryBudget(queries=4, rows=90),
+    ('async-movie-detail', 'GET'): QueryBudget(queries=1, rows=1),
+    ('async-movie-cast', 'GET'): QueryBudget(queries=2, rows=21),
+    ('async-movie-rating-avg', 'GET'): QueryBudget(queries=1, rows=1),
+    ('async-movie-oscars', 'GET'): QueryBudget(queries=2, rows=2),
+
+    ('leaderboard-list', 'GET'): QueryBudget(queries=0, rows=0),
+    # read from the materialized rows, at most LEADERBOARD_SIZE
+    ('leaderboard', 'GET'): QueryBudget(queries=1, rows=BOARD_SIZE),
+
+    ('cache-stats', 'GET'): QueryBudget(queries=0, rows=0),
+    ('password-hashing-stats', 'GET'): QueryBudget(queries=0, rows=0),
+    ('db-pool-stats', 'GET'): QueryBudget(queries=0, rows=0),
+    ('db-routing-stats', 'GET'): QueryBudget(queries=0, rows=0),
+}
+
+
+def get_budget(url_name, method):
+    return QUERY_BUDGETS.get((url_name, method))
+
+
+class QueryCounter:
+    """
+    Counts the statements and SELECTed rows that go through a connection (default: every
+    database alias, GET reads go to the replicas of imdb_app.db_routers), e.g.
+        with QueryCounter() as counter:
+            ...
+        counter.queries, counter.rows
+    """
+
+    def __init__(self, using=None):
+        # a TestCase mirror alias can share the default connection object, wrap each one once
+        self.connections = [using] if using is not None else list({id(c): c for c in connections.all()}.values())
+        self.queries = 0
+        self.rows = 0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries += 1
+        self.statements.append(sql)
+        rowcount = context['cursor'].rowcount
+        if sql.lstrip()[:6].upper() == 'SELECT' and rowcount and rowcount > 0:
+            self.rows += rowcount
+        return result
+
+    def __enter__(self):
+        self._wrappers = ExitStack()
+        for wrapped in self.connections:
+            self._wrappers.enter_context(wrapped.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrappers.__exit__(*exc_info)
+
+    def over_budget(self, budget):
+        return self.queries > budget.queries or (budget.rows is not None and self.rows > budget.rows)
@@ -0,0 +1,62 @@
+import json
+import threading
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+# Sampled SQL of real requests, appended as one JSON line per request to QUERY_LOG_PATH by
+# QueryLogMiddleware and read back by `manage.py advise_indexes`, which replays the SELECTs
+# with EXPLAIN. Parameters are stored next to the SQL (dates as ISO strings, PostgreSQL casts
+# them back) so a statement can be replayed exactly as it ran.
+
+QUERY_LOG_PATH = getattr(settings, 'QUERY_LOG_PATH', settings.BASE_DIR / 'query_log.ndjson')
+QUERY_LOG_SAMPLE_RATE = getattr(settings, 'QUERY_LOG_SAMPLE_RATE', 0.01)
+
+_write_lock = threading.Lock()
+
+
+class QueryRecorder:
+    """Collects (sql, params) of every statement run on a connection (default: every database
+    alias, replica reads included), e.g.
+        with QueryRecorder() as recorder:
+            ...
+        recorder.statements
+    """
+
+    def __init__(self, using=None):
+        # a TestCase mirror alias can share the default connection object, wrap each one once
+        self.connections = [using] if using is not None else list({id(c): c for c in connections.all()}.values())
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many:
+            self.statements.append((sql, list(params or ())))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrappers = ExitStack()
+        for wrapped in self.connections:
+            self._wrappers.enter_context(wrapped.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrappers.__exit__(*exc_info)
+
+
+def append(route, method, statements, path=None):
+    line = json.dumps({
+        'route': route,
+        'method': method,
+        'statements': [{'sql': sql, 'params': params} for sql, params in statements],
+    }, cls=DjangoJSONEncoder)
+    with _write_lock, open(path or QUERY_LOG_PATH, 'a') as log:
+        log.write(line + '\n')
+
+
+def read(path=None):
+    with open(path or QUERY_LOG_PATH) as log:
+        for line in log:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,74 @@
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast, Trunc
+
+from imdb_app.models import Rating, RatingDaily
+
+# Per movie and day (count, sum) of ratings in rating_daily, so trend charts read a few
+# thousand pre-aggregated rows instead of every rating. New ratings are folded in with an
+# INSERT ... ON CONFLICT DO UPDATE that adds to the row, so concurrent writers to the same
+# (movie, day) never lose increments. series() re-buckets the days with date_trunc.
+
+BUCKETS = ['day', 'week', 'month', 'year']
+
+_TABLE = RatingDaily._meta.db_table
+
+UPSERT = f"""
+INSERT INTO {_TABLE} (movie_id, day, rating_count, rating_sum) VALUES {{values}}
+ON CONFLICT (movie_id, day) DO UPDATE SET
+    rating_count = {_TABLE}.rating_count + EXCLUDED.rating_count,
+    rating_sum = {_TABLE}.rating_sum + EXCLUDED.rating_sum
+"""
+
+
+def add_ratings(ratings, chunk_size=1000):
+    """Fold new (movie_id, rating_date, rating) triples into the rollups."""
+    grouped = {}
+    for movie_id, day, rating in ratings:
+        count, total = grouped.get((movie_id, day), (0, 0))
+        grouped[(movie_id, day)] = (count + 1, total + rating)
+
+    # in key order, so concurrent upserts lock the rollup rows in the same order and can't deadlock
+    rows = [(movie_id, day, count, total) for (movie_id, day), (count, total) in sorted(grouped.items())]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            cursor.execute(UPSERT.format(values=', '.join(['(%s, %s, %s, %s)'] * len(chunk))),
+                           [value for row in chunk for value in row])
+
+
+def add_rating(movie_id, day, rating):
+    add_ratings([(movie_id, day, rating)])
+
+
+def remove_rating(movie_id, day, rating):
+    days = RatingDaily.objects.filter(movie_id=movie_id, day=day)
+    days.update(rating_count=F('rating_count') - 1, rating_sum=F('rating_sum') - rating)
+    days.filter(rating_count__lte=0).delete()
+
+
+def rebuild(movie_ids=None):
+    """Recompute the rollups from the ratings table. Returns the number of (movie, day) rows."""
+    ratings = Rating.objects.all()
+    days = RatingDaily.objects.all()
+    if movie_ids is not None:
+        ratings = ratings.filter(movie_id__in=movie_ids)
+        days = days.filter(movie_id__in=movie_ids)
+    sql, params = ratings.order_by().values('movie_id', 'rating_date').annotate(
+        count=Count('id'), total=Sum('rating')).query.sql_with_params()
+    with transaction.atomic(), connection.cursor() as cursor:
+        days.delete()
+        cursor.execute(f'INSERT INTO {_TABLE} (movie_id, day, rating_count, rating_sum) {sql}', params)
+        return cursor.rowcount
+
+
+def series(movie_id, bucket, from_date=None, to_date=None):
+    days = RatingDaily.objects.filter(movie_id=movie_id)
+    if from_date:
+        days = days.filter(day__gte=from_date)
+    if to_date:
+        days = days.filter(day__lte=to_date)
+    return days.annotate(period=Trunc('day', bucket)).order_by('period').values('period').annotate(
+        count=Sum('rating_count'),
+        avg=Cast(Sum('rating_sum'), FloatField()) / Sum('rating_count'),
+    )
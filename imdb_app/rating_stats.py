@@ -0,0 +1,126 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Max, Min, OuterRef, Q, Subquery, Sum, \
+    Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Least
+from django.utils import timezone
+
+from imdb_app import response_cache
+from imdb_app.models import HISTOGRAM_FIELDS, Movie, Rating
+
+
+# Keeps the rating_* / avg_rating / votes_<n> columns of Movie in sync with the ratings table.
+# Every update is a single UPDATE statement built from F() expressions, so concurrent
+# writers never lose increments. update() skips auto_now, so updated_at is bumped explicitly.
+
+
+def _avg(total, count):
+    return Cast(total, FloatField()) / count
+
+
+def apply_rating(movie_id, rating):
+    Movie.objects.filter(id=movie_id).update(
+        rating_count=F('rating_count') + 1,
+        rating_sum=F('rating_sum') + rating,
+        rating_min=Least(Coalesce(F('rating_min'), Value(rating)), Value(rating)),
+        rating_max=Greatest(Coalesce(F('rating_max'), Value(rating)), Value(rating)),
+        avg_rating=_avg(F('rating_sum') + rating, F('rating_count') + 1),
+        **{HISTOGRAM_FIELDS[rating]: F(HISTOGRAM_FIELDS[rating]) + 1},
+        updated_at=timezone.now(),
+    )
+    response_cache.invalidate_movies(movie_id)
+
+
+def apply_ratings(ratings, chunk_size=500):
+    """
+    Fold many new (movie_id, rating) pairs into the stats, grouped per movie.
+    Each chunk of movies is updated with a single UPDATE ... CASE statement.
+    """
+    grouped = {}
+    votes = {}
+    for movie_id, rating in ratings:
+        count, total, low, high = grouped.get(movie_id, (0, 0, rating, rating))
+        grouped[movie_id] = (count + 1, total + rating, min(low, rating), max(high, rating))
+        votes[movie_id, rating] = votes.get((movie_id, rating), 0) + 1
+
+    # in id order, so concurrent batches lock the movie rows in the same order and can't deadlock
+    movie_ids = sorted(grouped)
+    for start in range(0, len(movie_ids), chunk_size):
+        chunk = movie_ids[start:start + chunk_size]
+
+        def per_movie(position):
+            return Case(*[When(id=movie_id, then=Value(grouped[movie_id][position])) for movie_id in chunk],
+                        output_field=IntegerField())
+
+        def votes_for(rating):
+            return Case(*[When(id=movie_id, then=Value(votes[movie_id, rating])) for movie_id in chunk
+                          if (movie_id, rating) in votes], default=Value(0), output_field=IntegerField())
+
+        # only the histogram columns this chunk has votes for
+        in_chunk = set(chunk)
+        ratings_in_chunk = {rating for movie_id, rating in votes if movie_id in in_chunk}
+        count, total, low, high = per_movie(0), per_movie(1), per_movie(2), per_movie(3)
+        Movie.objects.filter(id__in=chunk).update(
+            rating_count=F('rating_count') + count,
+            rating_sum=F('rating_sum') + total,
+            rating_min=Least(Coalesce(F('rating_min'), low), low),
+            rating_max=Greatest(Coalesce(F('rating_max'), high), high),
+            avg_rating=_avg(F('rating_sum') + total, F('rating_count') + count),
+            **{HISTOGRAM_FIELDS[rating]: F(HISTOGRAM_FIELDS[rating]) + votes_for(rating)
+               for rating in ratings_in_chunk},
+            updated_at=timezone.now(),
+        )
+    response_cache.invalidate_movies(*movie_ids)
+
+
+def remove_rating(movie_id, rating):
+    response_cache.invalidate_movies(movie_id)
+    with transaction.atomic():
+        movie = Movie.objects.select_for_update().only('rating_count', 'rating_min', 'rating_max').get(id=movie_id)
+        if movie.rating_count <= 1:
+            # last rating is gone, reset to the empty state
+            Movie.objects.filter(id=movie_id).update(rating_count=0, rating_sum=0, rating_min=None,
+                                                     rating_max=None, avg_rating=0, updated_at=timezone.now(),
+                                                     **{field: 0 for field in HISTOGRAM_FIELDS.values()})
+            return
+        Movie.objects.filter(id=movie_id).update(
+            rating_count=F('rating_count') - 1,
+            rating_sum=F('rating_sum') - rating,
+            avg_rating=_avg(F('rating_sum') - rating, F('rating_count') - 1),
+            **{HISTOGRAM_FIELDS[rating]: F(HISTOGRAM_FIELDS[rating]) - 1},
+            updated_at=timezone.now(),
+        )
+        if rating in (movie.rating_min, movie.rating_max):
+            # the removed value may have been the only min/max, the rating row is already deleted
+            extremes = Rating.objects.filter(movie_id=movie_id).aggregate(Min('rating'), Max('rating'))
+            Movie.objects.filter(id=movie_id).update(rating_min=extremes['rating__min'],
+                                                     rating_max=extremes['rating__max'])
+
+
+def rebuild(movie_ids=None):
+    """
+    Recompute the rating state from the ratings table with one correlated UPDATE.
+    Returns the number of movies updated.
+    """
+    ratings = Rating.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+
+    def stat(aggregate):
+        return Subquery(ratings.annotate(value=aggregate).values('value'))
+
+    count = Coalesce(stat(Count('id')), 0)
+    total = Coalesce(stat(Sum('rating')), 0)
+    movies = Movie.objects.all()
+    if movie_ids is not None:
+        movies = movies.filter(id__in=movie_ids)
+        response_cache.invalidate_movies(*movie_ids)
+    else:
+        response_cache.invalidate('all')
+    return movies.update(
+        rating_count=count,
+        rating_sum=total,
+        rating_min=stat(Min('rating')),
+        rating_max=stat(Max('rating')),
+        avg_rating=Coalesce(stat(_avg(Sum('rating'), Count('id'))), Value(0.0)),
+        **{field: Coalesce(stat(Count('id', filter=Q(rating=rating))), 0)
+           for rating, field in HISTOGRAM_FIELDS.items()},
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,84 @@
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.utils import encoders
+
+# Faster wire formats (orjson, msgpack in requirements.txt, both optional at runtime):
+#   OrjsonRenderer / OrjsonParser  DRF's JSON encoded by orjson, stdlib json without it
+#   MsgPackRenderer / MsgPackParser  application/msgpack, picked with the Accept header
+# Types orjson / msgpack don't know natively (Decimal, lazy strings, ...) go through DRF's
+# own JSONEncoder.default, so the values are the ones the stdlib renderer would produce.
+# Where the orjson output still differs from DRF's JSONRenderer:
+#   NaN / Infinity  rendered as null, DRF's renderer (STRICT_JSON) raises ValueError
+# U+2028 / U+2029 are escaped like DRF does, they end a line in JavaScript.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_default = encoders.JSONEncoder().default
+
+
+class OrjsonRenderer(renderers.JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # ?indent= / the browsable API ask for pretty printing, leave that to stdlib
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=_default,
+                           option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class OrjsonParser(parsers.JSONParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MsgPackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    available = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+class MsgPackParser(parsers.BaseParser):
+    media_type = 'application/msgpack'
+    available = msgpack is not None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
+
+
+class OptionalFormatNegotiation(DefaultContentNegotiation):
+    """Skips renderers / parsers whose library is not installed."""
+
+    def select_parser(self, request, parsers):
+        return super().select_parser(request, [parser for parser in parsers if getattr(parser, 'available', True)])
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [renderer for renderer in renderers if getattr(renderer, 'available', True)]
+        return super().select_renderer(request, renderers, format_suffix)
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import Counter
+from functools import partial
+
+from django.core.cache import caches
+from django.db import transaction
+
+from imdb_app import db_routers
+
+# Cache of serialized read payloads (movie detail, cast, rating summary).
+# Entries are keyed by version counters instead of being deleted: a write bumps the version
+# of the movie it touched and every entry built from the old version simply stops being
+# looked up, then ages out of the cache. No key scans are needed to invalidate.
+# The versions live in CACHES['responses'], which must be shared by every server process and
+# the management commands (the default FileBasedCache is, per host): with a per-process cache a
+# bump only reaches the process that made it.
+#
+# Scopes:
+#   'all'           every movie, bumped by bulk jobs (rebuild_rating_stats, import_imdb)
+#   'movie:<id>'    one movie: ratings, cast, detail and Oscar writes
+#   'actors'        any actor change, the cast payloads embed actor rows
+
+CACHE_ALIAS = 'responses'
+
+_stats_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(scope):
+    return f'v:{scope}'
+
+
+def _versions(scopes):
+    cache = _cache()
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # a missing (new or evicted) version restarts from the clock so it never
+            # collides with a version an old entry was built with
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    cache = _cache()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def invalidate(*scopes):
+    # readers must not re-cache the old rows before the write is visible
+    transaction.on_commit(partial(bump, *scopes))
+
+
+def invalidate_movies(*movie_ids):
+    invalidate(*[f'movie:{movie_id}' for movie_id in set(movie_ids)])
+
+
+def get_or_build(kind, movie_id, build, scopes=()):
+    """
+    Return the cached payload of `kind` for a movie, building and storing it on a miss.
+    build() should return plain data (serializer.data), not a Response. It reads from the primary,
+    the version was bumped after the write committed there, a replica may not have replayed it yet.
+    """
+    versions = _versions(['all', f'movie:{movie_id}', *scopes])
+    key = f'{kind}:{movie_id}:' + ':'.join(str(version) for version in versions)
+    cache = _cache()
+    data = cache.get(key)
+    if data is not None:
+        with _stats_lock:
+            _hits[kind] += 1
+        return data
+    with _stats_lock:
+        _misses[kind] += 1
+    with db_routers.primary_reads():
+        data = build()
+    cache.set(key, data)
+    return data
+
+
+def stats():
+    with _stats_lock:
+        return {
+            'hits': dict(_hits),
+            'misses': dict(_misses),
+        }
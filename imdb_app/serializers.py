@@ -6,7 +6,7 @@ from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from imdb_app.models import Movie, Actor, MovieActor, Rating, Oscar
+from imdb_app.models import HISTOGRAM_FIELDS, Movie, Actor, MovieActor, Rating, Oscar
 
 
 # class MovieSerializer(serializers.Serializer):
@@ -27,13 +27,36 @@ class MovieSerializer(serializers.ModelSerializer):
 class DetailedMovieSerializer(serializers.ModelSerializer):
     class Meta:
         model = Movie
-        exclude = 'actors'
+        # the votes_<n> columns are served as one object by RatingHistogramField
+        exclude = ['actors', 'search_vector', *HISTOGRAM_FIELDS.values()]
+        # maintained by imdb_app.rating_stats and import_imdb, imdb_id is the import's upsert key
+        read_only_fields = ['rating_count', 'rating_sum', 'rating_min', 'rating_max', 'avg_rating', 'imdb_id',
+                            'imdb_rating', 'imdb_votes']
+
+
+class RatingHistogramField(serializers.Field):
+    # {"1": <ratings of 1>, ..., "10": <ratings of 10>} from the denormalized votes_<n> columns
+
+    def __init__(self, **kwargs):
+        super().__init__(source='*', read_only=True, **kwargs)
+
+    def to_representation(self, movie):
+        return {str(rating): getattr(movie, field) for rating, field in HISTOGRAM_FIELDS.items()}
+
+
+class HistogramMovieSerializer(DetailedMovieSerializer):
+    rating_histogram = RatingHistogramField()
+
+    class Meta(DetailedMovieSerializer.Meta):
+        pass
 
 
 class ActorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Actor
         fields = '__all__'
+        # the upsert key of import_imdb
+        read_only_fields = ['imdb_id']
         extra_kwargs = {
             'birth_year': {
                 # for optional field
@@ -63,6 +86,14 @@ class RatingMovieSerializers(serializers.ModelSerializer):
         exclude = ['id', 'movie', 'rating_date']
 
 
+class BulkRatingSerializer(serializers.ModelSerializer):
+    # plain id, existence is checked for the whole batch with one query
+    movie_id = serializers.IntegerField()
+
+    class Meta:
+        model = Rating
+        fields = ['movie_id', 'rating', 'rating_date']
+
 
 class CreateActor(serializers.ModelSerializer):
     class Meta:
@@ -86,6 +117,9 @@ class MovieRating(serializers.ModelSerializer):
 
 
 class CastForMovieSerializer(serializers.ModelSerializer):
+    # plain id, CreateMovieSerializer checks the whole cast with one query instead of one per member
+    actor = serializers.IntegerField(source='actor_id')
+
     class Meta:
         model = MovieActor
         fields = ['actor', 'salary', 'main_role']
@@ -93,6 +127,8 @@ class CastForMovieSerializer(serializers.ModelSerializer):
 
 class CreateMovieSerializer(serializers.ModelSerializer):
     cast = CastForMovieSerializer(required=False, many=True)
+    # the cast's actors must exist, checked with one query
+    check_actors = True
 
     class Meta:
         model = Movie
@@ -111,17 +147,49 @@ class CreateMovieSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # יריץ פקודות עד שהקוד יסתיים ואז יעדכן שינויים , בזמן הריצה אף אחד לא רואה את השינויים
         with transaction.atomic():
-            cast_data = validated_data.pop('cast')
+            cast_data = validated_data.pop('cast', [])
             movie = Movie.objects.create(**validated_data)
-            for cast in cast_data:
-                MovieActor.objects.create(**cast, movie_id=movie.id)
+            MovieActor.objects.bulk_create([MovieActor(**cast, movie_id=movie.id) for cast in cast_data])
             return movie
 
     def validate(self, attrs):
         if attrs['release_year'] <= 1920 and attrs['duration_in_min'] >= 60:
             raise ValidationError('Old movies supposed to me short')
+        if self.check_actors:
+            self._check_cast_actors(attrs.get('cast', []))
         return attrs
 
+    def _check_cast_actors(self, cast):
+        actor_ids = {member['actor_id'] for member in cast}
+        if not actor_ids:
+            return
+        missing = actor_ids - set(Actor.objects.filter(id__in=actor_ids).values_list('id', flat=True))
+        if missing:
+            # the errors PrimaryKeyRelatedField gives, one entry per cast member
+            raise serializers.ValidationError({'cast': [
+                {'actor': [f'Invalid pk "{member["actor_id"]}" - object does not exist.']}
+                if member['actor_id'] in missing else {} for member in cast]})
+
+
+class BulkCastSerializer(serializers.ModelSerializer):
+    # plain id, existence is checked for the whole batch with one query
+    actor_id = serializers.IntegerField()
+
+    class Meta:
+        model = MovieActor
+        fields = ['actor_id', 'salary', 'main_role']
+
+
+class BulkMovieSerializer(CreateMovieSerializer):
+    # validation only, add_movies_bulk checks names and actors set-based and inserts with bulk_create
+    cast = BulkCastSerializer(required=False, many=True)
+    # add_movies_bulk checks the actors of the whole batch with one query
+    check_actors = False
+
+    class Meta(CreateMovieSerializer.Meta):
+        # name uniqueness is checked for the whole batch with one query
+        validators = []
+
 
 class OscarSerializer(serializers.ModelSerializer):
     class Meta:
@@ -138,7 +206,7 @@ class OscarSerializer(serializers.ModelSerializer):
 
 class SignupSerializer(serializers.ModelSerializer):
 
-    password = serializers.CharField(max_length=128, validators=validate_password, write_only=True)
+    password = serializers.CharField(max_length=128, validators=[validate_password], write_only=True)
 
     class Meta:
         model = User
@@ -153,12 +221,13 @@ class SignupSerializer(serializers.ModelSerializer):
         ]
 
     def create(self, validated_data):
-        user = User.objects.create(username=validated_data['email'],
-                                   email=validated_data['email'],
-                                   first_name=validated_data.get(['first_name', '']),
-                                   last_name=validated_data.get(['last_name', '']))
+        user = User(username=validated_data['email'],
+                    email=validated_data['email'],
+                    first_name=validated_data.get('first_name', ''),
+                    last_name=validated_data.get('last_name', ''))
 
         # set_password - מריץ את ההאש מחזיר את הסטרינג הארוך ובודק את תקינות הססמא
+        # hashed before the INSERT, a refused hash (503) leaves no half created user
         user.set_password(validated_data['password'])
         user.save()
         return user
@@ -1,3 +1,1354 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from imdb_app import authentication, db_pool, db_routers, fast_serializers, hashers, imdb_import, index_advisor, \
+    leaderboards, query_log, rating_rollups, rating_stats, renderers, response_cache, urls
+from imdb_app.middleware import ReplicaRoutingMiddleware
+from imdb_app.models import HISTOGRAM_FIELDS, Actor, Director, Movie, MovieActor, Oscar, Rating, RatingDaily
+from imdb_app.pooled_postgresql.base import DatabaseWrapper as PooledDatabaseWrapper
+from imdb_app.query_budget import QUERY_BUDGETS, QueryCounter
+from imdb_app.serializers import ActorSerializer, DetailedActorSerializer, MovieSerializer, OscarSerializer, \
+    RatingsSerializer
+
+HTTP_METHODS = ['get', 'post', 'put', 'patch', 'delete']
+
+
+def route_methods():
+    """(url name, METHOD) for every route registered in imdb_app/urls.py"""
+    routes = set()
+    for pattern in urls.urlpatterns:
+        callback = pattern.callback
+        actions = getattr(callback, 'actions', None)
+        if actions:
+            methods = [method for method in HTTP_METHODS if method in actions]
+        elif not hasattr(callback, 'cls'):
+            # plain Django views (async_views) only answer GET
+            methods = ['get']
+        else:
+            methods = [method for method in HTTP_METHODS if hasattr(callback.cls, method)]
+        routes.update((pattern.name, method.upper()) for method in methods)
+    return routes
+
+
+class QueryBudgetTests(APITestCase):
+    CAST_SIZE = 20
+    RATINGS_PER_MOVIE = 200
+    PAGE = {'page_size': 100}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', 'budget@example.com', 'Budget-pass-1')
+        cls.directors = Director.objects.bulk_create([Director(name=f'Director {i}') for i in range(5)])
+        cls.actors = Actor.objects.bulk_create([Actor(name=f'Actor {i}', birth_year=1950 + i % 40)
+                                                for i in range(60)])
+        cls.movies = Movie.objects.bulk_create([
+            Movie(name=f'Movie {i}', description=f'space drama number {i}', duration_in_min=90 + i % 60,
+                  release_year=1930 + i % 90)
+            for i in range(120)
+        ])
+        cls.movie = cls.movies[0]
+        casts = []
+        for movie in cls.movies[:20]:
+            casts.extend(MovieActor(movie=movie, actor=actor, salary=1000, main_role=index < 3)
+                         for index, actor in enumerate(cls.actors[:cls.CAST_SIZE]))
+        MovieActor.objects.bulk_create(casts)
+        Rating.objects.bulk_create([Rating(movie=movie, rating=1 + i % 10)
+                                    for movie in cls.movies[:5] for i in range(cls.RATINGS_PER_MOVIE)])
+        rating_rollups.rebuild()
+        Oscar.objects.bulk_create([
+            Oscar(year=1950 + i % 70, nomination='Best Actor', movie=movie, actor=cls.actors[i % 60],
+                  director=cls.directors[i % 5])
+            for i, movie in enumerate(cls.movies)
+        ])
+        cls.rating = Rating.objects.filter(movie=cls.movie).first()
+        cls.oscar = Oscar.objects.first()
+
+    def cases(self):
+        movie, actor, oscar = self.movie, self.actors[0], self.oscar
+        movie_data = {'name': 'New movie', 'description': 'd', 'duration_in_min': 100, 'release_year': 2000}
+        oscar_data = {'year': 2000, 'nomination': 'Best Picture', 'movie': movie.id, 'actor': actor.id,
+                      'director': self.directors[0].id}
+        return [
+            ('api-root', 'GET', {}, None),
+            ('login', 'POST', {}, {'username': 'budget', 'password': 'Budget-pass-1'}),
+            ('token-refresh', 'POST', {}, {'refresh': str(RefreshToken.for_user(self.user))}),
+            ('signup', 'POST', {}, {'email': 'new@example.com', 'password': 'Signup-pass-1'}),
+
+            ('movie-list', 'GET', {}, self.PAGE),
+            ('movie-list', 'POST', {}, {**movie_data, 'cast': [{'actor': a.id, 'salary': 1, 'main_role': True}
+                                                            for a in self.actors[:5]]}),
+            ('movie-detail', 'GET', {'pk': movie.id}, None),
+            ('movie-detail', 'PUT', {'pk': movie.id}, movie_data),
+            ('movie-detail', 'PATCH', {'pk': movie.id}, {'description': 'patched'}),
+            ('movie-actors', 'GET', {'pk': movie.id}, None),
+            ('movie-full', 'GET', {'pk': movie.id}, None),
+            ('movie-search', 'GET', {}, {'q': 'space', **self.PAGE}),
+            ('movie-bulk', 'POST', {}, [{**movie_data, 'name': f'Bulk {i}',
+                                         'cast': [{'actor_id': a.id, 'salary': 1, 'main_role': False}
+                                                  for a in self.actors[:5]]} for i in range(100)]),
+            ('movie-cast', 'GET', {'movie_id': movie.id}, None),
+            ('movie-actor-add', 'POST', {'movie_id': self.movies[50].id},
+             {'actor_name': actor.name, 'salary': 10, 'main_role': False}),
+            # PUT is routed but always answered with 400
+            ('movie-actor-add', 'PUT', {'movie_id': movie.id}, {}, 400),
+            ('movie-actor-remove', 'DELETE', {'movie_id': movie.id, 'actor_id': actor.id}, None),
+            ('movie-ratings', 'GET', {'movie_id': movie.id}, None),
+            ('movie-rating-avg', 'GET', {'movie_id': movie.id}, None),
+            ('movie-rating-histogram', 'GET', {'movie_id': movie.id}, None),
+            ('movie-rating-add', 'POST', {'movie_id': movie.id}, {'rating': 7}),
+            ('movie-rating-timeseries', 'GET', {'movie_id': movie.id}, {'bucket': 'day'}),
+
+            ('actor-list', 'GET', {}, self.PAGE),
+            ('actor-list', 'POST', {}, {'name': 'New actor', 'birth_year': 1980}),
+            ('actor-detail', 'GET', {'pk': actor.id}, None),
+            ('actor-detail', 'PUT', {'pk': actor.id}, {'name': 'Renamed', 'birth_year': 1970}),
+            ('actor-detail', 'PATCH', {'pk': actor.id}, {'name': 'Renamed'}),
+            ('actor-detail', 'DELETE', {'pk': actor.id}, None),
+            ('autocomplete-actors', 'GET', {}, {'prefix': 'acto', 'limit': 50}),
+            ('autocomplete-movies', 'GET', {}, {'prefix': 'movi', 'limit': 50}),
+
+            ('oscar-list', 'GET', {}, self.PAGE),
+            ('oscar-wins', 'GET', {'group': 'actor'}, {'from_year': 1960}),
+            ('oscar-list', 'POST', {}, oscar_data),
+            ('oscar-detail', 'GET', {'pk': oscar.id}, None),
+            ('oscar-detail', 'PUT', {'pk': oscar.id}, oscar_data),
+            ('oscar-detail', 'PATCH', {'pk': oscar.id}, {'nomination': 'Best Director'}),
+            ('oscar-detail', 'DELETE', {'pk': oscar.id}, None),
+
+            ('rating-list', 'GET', {}, self.PAGE),
+            ('rating-bulk', 'POST', {}, [{'movie_id': m.id, 'rating': 1 + i % 10}
+                                         for i, m in enumerate(self.movies[:100])]),
+            ('rating-delete', 'DELETE', {'movie_id': self.rating.id}, None),
+            ('export-ratings', 'GET', {}, None),
+            ('export-movies', 'GET', {}, {'output': 'csv'}),
+            ('export-movie-actors', 'GET', {}, None),
+
+            ('movie-page', 'GET', {'movie_id': movie.id}, None),
+            ('async-movie-detail', 'GET', {'movie_id': movie.id}, None),
+            ('async-movie-cast', 'GET', {'movie_id': movie.id}, None),
+            ('async-movie-rating-avg', 'GET', {'movie_id': movie.id}, None),
+            ('async-movie-oscars', 'GET', {'movie_id': movie.id}, None),
+
+            ('leaderboard-list', 'GET', {}, None),
+            ('leaderboard', 'GET', {'name': 'highest-paid-actors'}, None),
+
+            ('cache-stats', 'GET', {}, None),
+            ('password-hashing-stats', 'GET', {}, None),
+            ('db-pool-stats', 'GET', {}, None),
+            ('db-routing-stats', 'GET', {}, None),
+        ]
+
+    def request(self, method, url, data):
+        if method == 'GET':
+            return self.client.get(url, data)
+        return getattr(self.client, method.lower())(url, data, format='json')
+
+    def test_every_route_declares_a_budget(self):
+        self.assertEqual(set(), route_methods() - set(QUERY_BUDGETS))
+        self.assertEqual(set(), set(QUERY_BUDGETS) - route_methods())
+
+    def test_every_budget_is_exercised(self):
+        self.assertEqual(set(QUERY_BUDGETS), {(case[0], case[1]) for case in self.cases()})
+
+    def test_routes_stay_within_budget(self):
+        for name, method, kwargs, data, *expected_status in self.cases():
+            with self.subTest(route=name, method=method):
+                # every case starts from the seeded data
+                with transaction.atomic():
+                    with QueryCounter() as counter:
+                        response = self.request(method, reverse(name, kwargs=kwargs), data)
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                    transaction.set_rollback(True)
+                if expected_status:
+                    self.assertEqual(response.status_code, expected_status[0])
+                else:
+                    self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+                budget = QUERY_BUDGETS[(name, method)]
+                self.assertLessEqual(counter.queries, budget.queries, '\n'.join(counter.statements))
+                if budget.rows is not None:
+                    self.assertLessEqual(counter.rows, budget.rows)
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Movie.objects.bulk_create([Movie(name=f'Movie {i}', description='d', duration_in_min=90,
+                                         release_year=2000 + i % 3) for i in range(7)])
+
+    def test_pages_follow_the_ordering(self):
+        for mode in ['pagination=keyset&', '']:
+            with self.subTest(mode=mode):
+                url, years = reverse('movie-list') + f'?{mode}ordering=-release_year&page_size=3', []
+                while url:
+                    response = self.client.get(url).json()
+                    years += [movie['release_year'] for movie in response['results']]
+                    url = response['next']
+                self.assertEqual([2002, 2002, 2001, 2001, 2000, 2000, 2000], years)
+
+    def test_page_numbers_by_default(self):
+        response = self.client.get(reverse('movie-list'), {'page': 2}).json()
+        self.assertEqual(7, response['count'])
+        self.assertIsNotNone(response['previous'])
+        self.assertEqual(['Movie 3', 'Movie 4', 'Movie 5'], [movie['name'] for movie in response['results']])
+        response = self.client.get(reverse('movie-list'), {'pagination': 'keyset'}).json()
+        self.assertEqual(['next', 'results'], sorted(response))
+
+    def test_invalid_cursor(self):
+        def cursor(payload):
+            return base64.urlsafe_b64encode(payload.encode()).decode()
+
+        for ordering, encoded in [('id', 'not base64!'), ('id', cursor('{"a": 1}')), ('id', cursor('[1, "x"]')),
+                                  ('release_year', cursor('["x", 1]')), ('release_year', cursor('[null, 1]')),
+                                  ('release_year', cursor('[2000, [1]]'))]:
+            with self.subTest(ordering=ordering, cursor=encoded):
+                response = self.client.get(reverse('movie-list'), {'ordering': ordering, 'cursor': encoded})
+                self.assertEqual(404, response.status_code)
+
+
+class AutocompleteTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Actor.objects.bulk_create([Actor(name=name, birth_year=1970)
+                                   for name in ['Marlon Brando', 'marla Maples', 'Mark Hamill', 'Tom Hanks',
+                                                'Hank Azaria']])
+
+    def complete(self, prefix, limit=10):
+        with QueryCounter() as counter:
+            response = self.client.get(reverse('autocomplete-actors'), {'prefix': prefix, 'limit': limit})
+        return [actor['name'] for actor in response.json()], counter.queries
+
+    def test_prefix_matches_in_name_order(self):
+        self.assertEqual((['marla Maples', 'Marlon Brando'], 1), self.complete('mArl', limit=2))
+        # under 3 characters there is no fuzzy match to fill the page with
+        self.assertEqual((['Mark Hamill', 'marla Maples', 'Marlon Brando'], 1), self.complete('ma'))
+
+    def test_fuzzy_matches_follow_the_prefix_matches(self):
+        self.assertEqual((['Hank Azaria', 'Tom Hanks'], 2), self.complete('hank'))
+        self.assertEqual((['Marlon Brando'], 2), self.complete('marlon brandi'))
+
+
+class SearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        movies = [('Harbor Lights', 'A quiet drama'), ('Night Train', 'Lights of the harbor at night'),
+                  ('Desert Wind', 'Nothing to see')]
+        cls.movies = {name: Movie.objects.create(name=name, description=description, duration_in_min=90,
+                                                 release_year=2000)
+                      for name, description in movies}
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('movie-search'), {'q': q, **params})
+        self.assertEqual(200, response.status_code)
+        return [movie['name'] for movie in response.json()['results']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(['Harbor Lights', 'Night Train'], self.search('harbor'))
+        self.assertEqual(['Night Train'], self.search('harbor -quiet'))
+        self.assertEqual([], self.search('submarine'))
+
+    def test_search_vector_follows_writes(self):
+        movie = self.movies['Desert Wind']
+        response = self.client.patch(reverse('movie-detail', kwargs={'pk': movie.id}), {'name': 'Harbor Wind'},
+                                     format='json')
+        self.assertEqual(200, response.status_code)
+        self.assertIn('Harbor Wind', self.search('harbor'))
+        self.assertEqual([], self.search('desert'))
+        Movie.objects.filter(id=movie.id).update(description='A lonely lighthouse')
+        self.assertEqual(['Harbor Wind'], self.search('lighthouse'))
+
+    def test_missing_or_empty_query(self):
+        for params in [{}, {'q': ''}, {'q': '   '}]:
+            self.assertEqual(400, self.client.get(reverse('movie-search'), params).status_code, params)
+
+    def test_cursor_pages_are_stable(self):
+        # equal ranks, the pages are cut on the id tie breaker
+        Movie.objects.bulk_create([Movie(name=f'Echo {i}', description='d', duration_in_min=90, release_year=2000)
+                                   for i in range(7)])
+        expected = self.search('echo', page_size=100)
+        self.assertEqual(7, len(expected))
+        names, url = [], reverse('movie-search') + '?q=echo&page_size=3'
+        while url:
+            body = self.client.get(url).json()
+            names += [movie['name'] for movie in body['results']]
+            url = body['next']
+        self.assertEqual(expected, names)
+
+
+class ResponseCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(name='Cached', description='d', duration_in_min=90, release_year=2000)
+        cls.actor = Actor.objects.create(name='Cast member', birth_year=1970)
+        MovieActor.objects.create(movie=cls.movie, actor=cls.actor, salary=1, main_role=True)
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+
+    def get(self, name, **kwargs):
+        with QueryCounter() as counter:
+            response = self.client.get(reverse(name, kwargs=kwargs))
+        return response, counter.queries
+
+    def test_second_read_is_served_from_cache(self):
+        for name, kwargs in [('movie-detail', {'pk': self.movie.id}), ('movie-cast', {'movie_id': self.movie.id}),
+                             ('movie-rating-avg', {'movie_id': self.movie.id})]:
+            with self.subTest(route=name):
+                first, _ = self.get(name, **kwargs)
+                second, queries = self.get(name, **kwargs)
+                self.assertEqual(0, queries)
+                self.assertEqual(first.data, second.data)
+
+    def test_rating_invalidates_movie_reads(self):
+        self.get('movie-rating-avg', movie_id=self.movie.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('movie-rating-add', kwargs={'movie_id': self.movie.id}), {'rating': 8},
+                             format='json')
+        response, queries = self.get('movie-rating-avg', movie_id=self.movie.id)
+        self.assertEqual(1, queries)
+        self.assertEqual(8, response.data['rating__avg'])
+
+    def test_padded_id_shares_the_movie_cache(self):
+        padded = f'/movies/0{self.movie.id}/'
+        detail = reverse('movie-detail', kwargs={'pk': self.movie.id}).replace(f'/movies/{self.movie.id}/', padded)
+        cast = reverse('movie-actors', kwargs={'pk': self.movie.id}).replace(f'/movies/{self.movie.id}/', padded)
+        self.client.get(detail)
+        self.client.get(cast)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('movie-detail', kwargs={'pk': self.movie.id}), {'name': 'new'},
+                              format='json')
+        self.assertEqual('new', self.client.get(detail).data['name'])
+        with QueryCounter() as counter:
+            self.assertEqual(200, self.client.get(cast).status_code)
+        self.assertGreater(counter.queries, 0)
+        self.assertEqual(404, self.client.get(detail.replace(padded, '/movies/abc/')).status_code)
+
+    def test_actor_rename_invalidates_cast(self):
+        self.get('movie-cast', movie_id=self.movie.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('actor-detail', kwargs={'pk': self.actor.id}), {'name': 'Renamed'},
+                              format='json')
+        response, _ = self.get('movie-cast', movie_id=self.movie.id)
+        self.assertEqual('Renamed', response.data[0]['actor']['name'])
+
+
+class ExportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(name='Exported, "quoted"', description='d', duration_in_min=90,
+                                         release_year=2000)
+        cls.ratings = [Rating.objects.create(movie=cls.movie, rating=rating, rating_date=datetime.date(2020, 1, day))
+                       for rating, day in [(7, 1), (3, 2), (9, 3)]]
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(200, response.status_code)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        lines = self.export('export-ratings').splitlines()
+        self.assertEqual({'id': self.ratings[0].id, 'movie_id': self.movie.id, 'rating': 7,
+                          'rating_date': '2020-01-01'}, json.loads(lines[0]))
+        self.assertEqual([rating.id for rating in self.ratings], [json.loads(line)['id'] for line in lines])
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export('export-movies', output='csv'))))
+        self.assertEqual(['id', 'name'], rows[0][:2])
+        self.assertEqual([str(self.movie.id), 'Exported, "quoted"'], rows[1][:2])
+        self.assertEqual(2, len(rows))
+
+    def test_date_filters_and_resume(self):
+        def ids(**params):
+            return [json.loads(line)['id'] for line in self.export('export-ratings', **params).splitlines()]
+        first, second, third = [rating.id for rating in self.ratings]
+        self.assertEqual([second, third], ids(from_date='2020-01-02'))
+        self.assertEqual([first, second], ids(to_date='2020-01-02'))
+        self.assertEqual([second], ids(from_date='2020-01-02', to_date='2020-01-02'))
+        self.assertEqual([third], ids(from_date='2020-01-02', after_id=second))
+
+    def test_bad_parameters(self):
+        for params in [{'from_date': 'garbage'}, {'to_date': '2020-02-30'}, {'after_id': 'x'}, {'output': 'xml'}]:
+            self.assertEqual(400, self.client.get(reverse('export-ratings'), params).status_code, params)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_data', 'ratings', '--from-date', '2020-01-03', stdout=out)
+        self.assertEqual([self.ratings[2].id], [json.loads(line)['id'] for line in out.getvalue().splitlines()])
+        for date in ['garbage', '2020-02-30']:
+            with self.assertRaisesMessage(CommandError, 'is not a YYYY-MM-DD date'):
+                call_command('export_data', 'ratings', '--to-date', date, stdout=io.StringIO())
+
+
+class ConditionalRequestTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(name='Polled', description='d', duration_in_min=90, release_year=2000)
+        cls.actor = Actor.objects.create(name='Cast member', birth_year=1970)
+        MovieActor.objects.create(movie=cls.movie, actor=cls.actor, salary=1, main_role=True)
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+
+    def test_unchanged_payloads_answer_304(self):
+        for name, kwargs in [('movie-detail', {'pk': self.movie.id}), ('movie-cast', {'movie_id': self.movie.id}),
+                             ('movie-actors', {'pk': self.movie.id}), ('movie-list', {}),
+                             ('actor-detail', {'pk': self.actor.id}), ('actor-list', {})]:
+            with self.subTest(route=name):
+                url = reverse(name, kwargs=kwargs)
+                first = self.client.get(url)
+                self.assertIn('ETag', first)
+                again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(304, again.status_code)
+
+    def test_if_modified_since(self):
+        url = reverse('movie-detail', kwargs={'pk': self.movie.id})
+        first = self.client.get(url)
+        self.assertEqual(304, self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code)
+
+    def test_writes_change_the_etag(self):
+        detail = reverse('movie-detail', kwargs={'pk': self.movie.id})
+        cast = reverse('movie-cast', kwargs={'movie_id': self.movie.id})
+        etags = [self.client.get(detail)['ETag'], self.client.get(cast)['ETag']]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('movie-rating-add', kwargs={'movie_id': self.movie.id}), {'rating': 8},
+                             format='json')
+            self.client.patch(reverse('actor-detail', kwargs={'pk': self.actor.id}), {'name': 'Renamed'},
+                              format='json')
+        self.assertEqual(200, self.client.get(detail, HTTP_IF_NONE_MATCH=etags[0]).status_code)
+        self.assertEqual(200, self.client.get(cast, HTTP_IF_NONE_MATCH=etags[1]).status_code)
+
+
+class RowPlanTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        movie = Movie.objects.create(name='Plan', description='d', duration_in_min=90.5, release_year=2000,
+                                     pic_url='https://img.example.com/plan.jpg')
+        Movie.objects.create(name='No picture', description='d', duration_in_min=80, release_year=1990)
+        actor = Actor.objects.create(name='Planned', birth_year=1970, imdb_id='nm0000001')
+        Actor.objects.create(name='Unplanned', birth_year=1980)
+        Rating.objects.create(movie=movie, rating=7)
+        Oscar.objects.create(year=2001, nomination='Best Actor', movie=movie, actor=actor)
+
+    def test_output_matches_the_serializer(self):
+        renderer = JSONRenderer()
+        for serializer_class, queryset in [(MovieSerializer, Movie.objects.order_by('id')),
+                                           (ActorSerializer, Actor.objects.order_by('id')),
+                                           (RatingsSerializer, Rating.objects.order_by('id')),
+                                           (OscarSerializer, Oscar.objects.order_by('id'))]:
+            with self.subTest(serializer=serializer_class.__name__):
+                plan = fast_serializers.plan_for(serializer_class)
+                self.assertEqual(renderer.render(serializer_class(queryset, many=True).data),
+                                 renderer.render(plan.serialize(plan.values(queryset))))
+
+    def test_nested_serializers_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            fast_serializers.RowPlan(DetailedActorSerializer)
+
+
+class RendererTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(name='Rendered \u05e1\u05e8\u05d8', description='d', duration_in_min=90.5,
+                                         release_year=2000)
+        Rating.objects.create(movie=cls.movie, rating=7)
+
+    def test_json_matches_the_stdlib_renderer(self):
+        data = {'results': fast_serializers.plan_for(MovieSerializer).serialize(Movie.objects.values()),
+                'next': None, 'ids': {1: 'int keys'}, 'separators': 'line\u2028paragraph\u2029', 'score': 7.25}
+        expected = JSONRenderer().render({**data, 'ids': {'1': 'int keys'}})
+        self.assertEqual(expected, renderers.OrjsonRenderer().render(data))
+
+    @skipUnless(renderers.orjson, 'orjson is not installed')
+    def test_json_differences_from_the_stdlib_renderer(self):
+        # see the top of imdb_app/renderers.py
+        self.assertEqual(b'[null]', renderers.OrjsonRenderer().render([float('nan')]))
+        with self.assertRaises(ValueError):
+            JSONRenderer().render([float('nan')])
+
+    @skipUnless(renderers.msgpack, 'msgpack is not installed')
+    def test_msgpack_is_picked_with_accept(self):
+        response = self.client.get(reverse('rating-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual('application/msgpack', response['Content-Type'])
+        self.assertEqual(7, renderers.msgpack.unpackb(response.content)['results'][0]['rating'])
+
+    @skipUnless(renderers.msgpack, 'msgpack is not installed')
+    def test_msgpack_request_body(self):
+        response = self.client.post(reverse('movie-rating-add', kwargs={'movie_id': self.movie.id}),
+                                    renderers.msgpack.packb({'rating': 9}), content_type='application/msgpack')
+        self.assertEqual(9, response.data['rating'])
+
+
+class AuthenticationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('auth', 'auth@example.com', 'Auth-pass-1')
+
+    def setUp(self):
+        authentication.token_cache.clear()
+        self.token = AccessToken.for_user(self.user)
+        self.request = self.client.get(reverse('api-root'), HTTP_AUTHORIZATION=f'Bearer {self.token}').wsgi_request
+
+    def test_verified_token_is_served_from_cache(self):
+        authenticator = authentication.CachedJWTAuthentication()
+        user, _ = authenticator.authenticate(self.request)
+        with QueryCounter() as counter:
+            cached_user, token = authenticator.authenticate(self.request)
+        self.assertEqual(0, counter.queries)
+        self.assertEqual(user.id, cached_user.id)
+        self.assertIsNot(user, cached_user)
+        self.assertEqual(self.token['jti'], token['jti'])
+
+    def test_stateless_setting_is_read_per_call(self):
+        authenticator = authentication.CachedJWTAuthentication()
+        with override_settings(JWT_STATELESS_USER=True), QueryCounter() as counter:
+            user, _ = authenticator.authenticate(self.request)
+        self.assertEqual(0, counter.queries)
+        self.assertIsInstance(user, TokenUser)
+        with override_settings(JWT_STATELESS_USER=False):
+            user, _ = authenticator.authenticate(self.request)
+        self.assertEqual(self.user, user)
+
+    def test_cache_entry_ends_at_token_expiry(self):
+        # expires before the cache TTL
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=datetime.timedelta(seconds=5))
+        request = self.client.get(reverse('api-root'), HTTP_AUTHORIZATION=f'Bearer {token}').wsgi_request
+        authentication.CachedJWTAuthentication().authenticate(request)
+        raw_token = str(token).encode()
+        with mock.patch('imdb_app.authentication.time.time', return_value=token['exp'] - 1):
+            self.assertIsNotNone(authentication.token_cache.get(raw_token))
+        with mock.patch('imdb_app.authentication.time.time', return_value=token['exp']):
+            self.assertIsNone(authentication.token_cache.get(raw_token))
+
+    def test_cache_is_bounded(self):
+        cache = authentication.TokenCache(max_entries=2, ttl=60)
+        for i in range(3):
+            cache.set(f'token {i}', self.user, self.token)
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('token 0'))
+
+    def test_basic_auth_only_on_listed_routes(self):
+        basic = 'Basic ' + base64.b64encode(b'auth:Auth-pass-1').decode()
+        request = self.client.get(reverse('api-root'), HTTP_AUTHORIZATION=basic).wsgi_request
+        authenticator = authentication.LoginBasicAuthentication()
+        with override_settings(BASIC_AUTH_PER_REQUEST=False):
+            self.assertIsNone(authenticator.authenticate(request))
+        with override_settings(BASIC_AUTH_PER_REQUEST=False, BASIC_AUTH_URL_NAMES=['api-root']):
+            self.assertEqual(self.user, authenticator.authenticate(request)[0])
+        with override_settings(BASIC_AUTH_PER_REQUEST=True):
+            self.assertEqual(self.user, authenticator.authenticate(request)[0])
+
+    def test_login_takes_basic_credentials(self):
+        basic = 'Basic ' + base64.b64encode(b'auth:Auth-pass-1').decode()
+        response = self.client.post(reverse('login'), HTTP_AUTHORIZATION=basic)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(str(self.user.id), str(AccessToken(response.data['access'])['user_id']))
+        wrong = 'Basic ' + base64.b64encode(b'auth:wrong').decode()
+        response = self.client.post(reverse('login'), HTTP_AUTHORIZATION=wrong)
+        self.assertEqual(401, response.status_code)
+        response = self.client.post(reverse('login'), {'username': 'auth', 'password': 'Auth-pass-1'})
+        self.assertEqual(200, response.status_code)
+
+
+class AdminTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'Admin-pass-1'))
+        self.movie = Movie.objects.create(name='Admin', description='Admin', duration_in_min=90, release_year=2000)
+        self.rating = Rating.objects.create(movie=self.movie, rating=5)
+
+    def test_movie_form_leaves_out_the_maintained_columns(self):
+        response = self.client.get(reverse('admin:imdb_app_movie_change', args=[self.movie.id]))
+        fields = response.context['adminform'].form.fields
+        self.assertIn('name', fields)
+        for field in ['avg_rating', 'votes_1', 'votes_10', 'imdb_rating', 'imdb_votes']:
+            self.assertNotIn(field, fields)
+
+    def test_ratings_are_deleted_with_their_movie_only(self):
+        response = self.client.get(reverse('admin:imdb_app_rating_delete', args=[self.rating.id]))
+        self.assertEqual(403, response.status_code)
+        response = self.client.post(reverse('admin:imdb_app_movie_delete', args=[self.movie.id]), {'post': 'yes'})
+        self.assertEqual(302, response.status_code)
+        self.assertFalse(Rating.objects.filter(id=self.rating.id).exists())
+
+
+class PasswordHashingTests(APITestCase):
+
+    def test_hashes_run_on_the_pool(self):
+        before = hashers.pool.stats()['hashes']
+        User.objects.create_user('pooled', password='Pooled-pass-1')
+        self.assertTrue(self.client.login(username='pooled', password='Pooled-pass-1'))
+        self.assertGreaterEqual(hashers.pool.stats()['hashes'], before + 2)
+
+    def test_saturated_pool_answers_503(self):
+        User.objects.create_user('waiting', password='Waiting-pass-1')
+        pool = hashers.HashingPool(workers=1, queue_limit=0)
+        release = threading.Event()
+        busy = threading.Thread(target=pool.run, args=(release.wait,))
+        busy.start()
+        try:
+            while not pool.stats()['running']:
+                release.wait(0.01)
+            with mock.patch.object(hashers, 'pool', pool):
+                response = self.client.post(reverse('signup'), {'email': 'storm@example.com',
+                                                                'password': 'Storm-pass-1'}, format='json')
+                login = self.client.post(reverse('login'), {'username': 'waiting',
+                                                            'password': 'Waiting-pass-1'}, format='json')
+                # outside DRF the hasher raises a plain exception
+                with self.assertRaises(hashers.PoolFull):
+                    User.objects.get(username='waiting').check_password('Waiting-pass-1')
+        finally:
+            release.set()
+            busy.join()
+        self.assertEqual(503, response.status_code)
+        self.assertEqual(503, login.status_code)
+        self.assertEqual(3, pool.stats()['rejected'])
+        self.assertFalse(User.objects.filter(username='storm@example.com').exists())
+
+
+class AsyncViewTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(name='Paged', description='d', duration_in_min=90, release_year=2000)
+        actor = Actor.objects.create(name='Cast member', birth_year=1970)
+        MovieActor.objects.create(movie=cls.movie, actor=actor, salary=1, main_role=True)
+        Oscar.objects.create(year=2001, nomination='Best Actor', movie=cls.movie, actor=actor)
+        Rating.objects.create(movie=cls.movie, rating=6)
+        rating_stats.rebuild([cls.movie.id])
+
+    def get(self, name):
+        return self.client.get(reverse(name, kwargs={'movie_id': self.movie.id}), HTTP_ACCEPT='application/json')
+
+    def test_payloads_match_the_sync_endpoints(self):
+        self.assertEqual(self.client.get(reverse('movie-detail', kwargs={'pk': self.movie.id})).json(),
+                         self.get('async-movie-detail').json())
+        self.assertEqual(self.get('movie-cast').json(), self.get('async-movie-cast').json())
+        self.assertEqual(self.get('movie-rating-avg').json(), self.get('async-movie-rating-avg').json())
+
+    def test_movie_page(self):
+        full = reverse('movie-full', kwargs={'pk': self.movie.id})
+        for params in [{}, {'ratings': 0}]:
+            with QueryCounter() as counter:
+                page = self.client.get(reverse('movie-page', kwargs={'movie_id': self.movie.id}), params)
+            self.assertLessEqual(counter.queries, 4)
+            self.assertEqual(self.client.get(full, params, HTTP_ACCEPT='application/json').json(), page.json())
+        self.assertEqual(400, self.client.get(reverse('movie-page', kwargs={'movie_id': self.movie.id}),
+                                              {'ratings': 'many'}).status_code)
+
+    def test_unknown_movie(self):
+        response = self.client.get(reverse('movie-page', kwargs={'movie_id': 0}))
+        self.assertEqual(404, response.status_code)
+
+
+class MovieFullTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie, other = Movie.objects.bulk_create([
+            Movie(name=name, description='d', duration_in_min=90, release_year=2000) for name in ['Full', 'Other']])
+        cast, outsider = Actor.objects.bulk_create([Actor(name=name, birth_year=1970) for name in ['Cast', 'Out']])
+        director, stranger = Director.objects.bulk_create([Director(name=name) for name in ['Dir', 'Stranger']])
+        MovieActor.objects.create(movie=cls.movie, actor=cast, salary=1, main_role=True)
+        cls.oscars = Oscar.objects.bulk_create([
+            Oscar(year=2001, nomination='Best Picture', movie=cls.movie, director=director),
+            Oscar(year=1990, nomination='Best Actor', movie=other, actor=cast),
+            Oscar(year=1995, nomination='Best Director', movie=other, director=director),
+        ])
+        Oscar.objects.create(year=1999, nomination='Best Actor', movie=other, actor=outsider, director=stranger)
+        Rating.objects.bulk_create([Rating(movie=cls.movie, rating=rating, rating_date=datetime.date(2020, 1, day))
+                                    for day, rating in enumerate([3, 8, 8, 10], start=1)])
+        rating_stats.rebuild([cls.movie.id])
+
+    def get(self, **params):
+        return self.client.get(reverse('movie-full', kwargs={'pk': self.movie.id}), params,
+                               HTTP_ACCEPT='application/json')
+
+    def test_document(self):
+        with QueryCounter() as counter:
+            document = self.get().json()
+        self.assertEqual(4, counter.queries)
+        self.assertEqual(self.client.get(reverse('movie-detail', kwargs={'pk': self.movie.id}),
+                                         HTTP_ACCEPT='application/json').json(), document['movie'])
+        self.assertEqual(self.client.get(reverse('movie-cast', kwargs={'movie_id': self.movie.id}),
+                                         HTTP_ACCEPT='application/json').json(), document['cast'])
+        rating = document['rating']
+        self.assertEqual((4, 7.25, 3, 10), (rating['count'], rating['avg'], rating['min'], rating['max']))
+        self.assertEqual({'3': 1, '8': 2, '10': 1}, {k: v for k, v in rating['histogram'].items() if v})
+        self.assertEqual(['2020-01-04', '2020-01-03', '2020-01-02', '2020-01-01'],
+                         [row['rating_date'] for row in document['latest_ratings']])
+        # the movie's own, its cast member's and its director's, not the unrelated one
+        self.assertEqual([1990, 1995, 2001], [oscar['year'] for oscar in document['oscars']])
+
+    def test_latest_ratings_count(self):
+        self.assertEqual([10, 8], [row['rating'] for row in self.get(ratings=2).json()['latest_ratings']])
+        self.assertEqual(400, self.get(ratings='many').status_code)
+
+
+class OscarQueryTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = Movie.objects.bulk_create([
+            Movie(name=f'Movie {i}', description='d', duration_in_min=90, release_year=1990) for i in range(2)])
+        cls.actors = Actor.objects.bulk_create([Actor(name=f'Actor {i}', birth_year=1960) for i in range(2)])
+        director = Director.objects.create(name='Director')
+        Oscar.objects.bulk_create([
+            Oscar(year=1991, nomination='Best Actor', movie=cls.movies[0], actor=cls.actors[0]),
+            Oscar(year=1995, nomination='Best Actor', movie=cls.movies[1], actor=cls.actors[0]),
+            Oscar(year=1995, nomination='Best Director', movie=cls.movies[1], director=director),
+            Oscar(year=2001, nomination='Best Actor', movie=cls.movies[1], actor=cls.actors[1]),
+        ])
+
+    def years(self, **params):
+        response = self.client.get(reverse('oscar-list'), params, HTTP_ACCEPT='application/json')
+        self.assertEqual(200, response.status_code)
+        return sorted(oscar['year'] for oscar in response.json()['results'])
+
+    def test_filters(self):
+        self.assertEqual([1995, 1995], self.years(year=1995))
+        self.assertEqual([1995, 1995, 2001], self.years(from_year=1992, to_year=2001))
+        self.assertEqual([1991, 1995, 2001], self.years(nomination='Best Actor'))
+        self.assertEqual([1991, 1995], self.years(actor=self.actors[0].id))
+        self.assertEqual([1995, 1995, 2001], self.years(movie=self.movies[1].id, page_size=10))
+        self.assertEqual(400, self.client.get(reverse('oscar-list'), {'year': 'soon'}).status_code)
+
+    def wins(self, group, **params):
+        return self.client.get(reverse('oscar-wins', kwargs={'group': group}), params,
+                               HTTP_ACCEPT='application/json').json()
+
+    def test_wins(self):
+        first, second = self.actors
+        self.assertEqual([
+            {'actor_id': first.id, 'name': first.name, 'wins': 2, 'first_year': 1991, 'last_year': 1995},
+            {'actor_id': second.id, 'name': second.name, 'wins': 1, 'first_year': 2001, 'last_year': 2001},
+        ], self.wins('actor'))
+        self.assertEqual([(self.movies[1].id, 3), (self.movies[0].id, 1)],
+                         [(row['movie_id'], row['wins']) for row in self.wins('movie')])
+        self.assertEqual([('Director', 1)], [(row['name'], row['wins']) for row in self.wins('director')])
+        self.assertEqual([(1995, 2), (1991, 1)], [(row['year'], row['wins']) for row in self.wins('year', limit=2)])
+        # filters narrow the grouped rows
+        self.assertEqual([(first.id, 1)],
+                         [(row['actor_id'], row['wins']) for row in self.wins('actor', to_year=1992)])
+
+
+class LeaderboardTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = Movie.objects.bulk_create([
+            Movie(name=f'Movie {i}', description='d', duration_in_min=90, release_year=2000) for i in range(3)])
+        # 2 x 10 (few votes), 6 x 9, 4 x 1
+        Rating.objects.bulk_create([Rating(movie=movie, rating=rating)
+                                    for movie, ratings in zip(cls.movies, [[10, 10], [9] * 6, [1] * 4])
+                                    for rating in ratings])
+        rating_stats.rebuild()
+        cls.actors = Actor.objects.bulk_create([Actor(name=f'Actor {i}', birth_year=1960) for i in range(3)])
+        MovieActor.objects.bulk_create([
+            MovieActor(movie=cls.movies[0], actor=cls.actors[0], salary=100, main_role=True),
+            MovieActor(movie=cls.movies[1], actor=cls.actors[0], salary=100, main_role=True),
+            MovieActor(movie=cls.movies[1], actor=cls.actors[1], salary=150, main_role=False),
+        ])
+        Oscar.objects.create(year=2001, nomination='Best Actor', movie=cls.movies[1], actor=cls.actors[1])
+
+    def board(self, name, **params):
+        return self.client.get(reverse('leaderboard', kwargs={'name': name}), params,
+                               HTTP_ACCEPT='application/json').json()
+
+    @mock.patch.object(leaderboards, 'MIN_VOTES', 2)
+    def test_top_movies_weighted_by_votes(self):
+        self.assertEqual(3, leaderboards.refresh('top-movies'))
+        results = self.board('top-movies')['results']
+        # mean 6.5, (6 * 9 + 2 * 6.5) / 8 beats (2 * 10 + 2 * 6.5) / 4
+        self.assertEqual([self.movies[1].id, self.movies[0].id, self.movies[2].id],
+                         [row['subject_id'] for row in results])
+        self.assertAlmostEqual(8.375, results[0]['score'])
+        self.assertEqual([1, 2, 3], [row['rank'] for row in results])
+
+    def test_actor_boards(self):
+        leaderboards.refresh('highest-paid-actors')
+        leaderboards.refresh('most-awarded-actors')
+        self.assertEqual([(self.actors[0].id, 200), (self.actors[1].id, 150)],
+                         [(row['subject_id'], row['score']) for row in self.board('highest-paid-actors')['results']])
+        self.assertEqual([(self.actors[1].name, 1)],
+                         [(row['name'], row['score']) for row in self.board('most-awarded-actors')['results']])
+
+    def test_refresh_replaces_the_board(self):
+        self.assertIsNone(self.board('highest-paid-actors')['refreshed_at'])
+        leaderboards.refresh('highest-paid-actors')
+        MovieActor.objects.filter(actor=self.actors[0]).delete()
+        self.assertEqual(1, leaderboards.refresh('highest-paid-actors'))
+        board = self.board('highest-paid-actors', limit=1)
+        self.assertIsNotNone(board['refreshed_at'])
+        self.assertEqual([self.actors[1].id], [row['subject_id'] for row in board['results']])
+
+    def test_unknown_board(self):
+        self.assertEqual(404, self.client.get(reverse('leaderboard', kwargs={'name': 'nope'})).status_code)
+        self.assertEqual(set(leaderboards.LEADERBOARDS),
+                         {board['name'] for board in self.client.get(reverse('leaderboard-list'),
+                                                                     HTTP_ACCEPT='application/json').json()})
+
+
+class RatingRollupTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(name='Trend', description='d', duration_in_min=90, release_year=2000)
+        Rating.objects.bulk_create([Rating(movie=cls.movie, rating=rating, rating_date=day) for day, rating in [
+            (datetime.date(2020, 1, 1), 4), (datetime.date(2020, 1, 1), 6), (datetime.date(2020, 1, 20), 8),
+            (datetime.date(2020, 3, 5), 10),
+        ]])
+        rating_rollups.rebuild()
+
+    def series(self, **params):
+        response = self.client.get(reverse('movie-rating-timeseries', kwargs={'movie_id': self.movie.id}), params,
+                                   HTTP_ACCEPT='application/json')
+        return response.json()['results'] if response.status_code == 200 else response.status_code
+
+    def test_buckets(self):
+        self.assertEqual([{'period': '2020-01-01', 'count': 2, 'avg': 5.0},
+                          {'period': '2020-01-20', 'count': 1, 'avg': 8.0},
+                          {'period': '2020-03-05', 'count': 1, 'avg': 10.0}], self.series(bucket='day'))
+        self.assertEqual([('2020-01-01', 3), ('2020-03-01', 1)],
+                         [(row['period'], row['count']) for row in self.series()])
+        self.assertEqual([('2020-01-01', 4, 7.0)],
+                         [(row['period'], row['count'], row['avg']) for row in self.series(bucket='year')])
+        self.assertEqual([('2020-01-20', 1)], [(row['period'], row['count'])
+                                               for row in self.series(bucket='day', from_date='2020-01-02',
+                                                                      to_date='2020-02-01')])
+
+    def test_bad_parameters(self):
+        self.assertEqual(400, self.series(bucket='hour'))
+        self.assertEqual(400, self.series(from_date='2020-02-30'))
+        self.assertEqual(400, self.series(to_date='soon'))
+
+    def test_rating_writes_maintain_the_rollups(self):
+        today = datetime.date.today()
+        self.client.post(reverse('movie-rating-add', kwargs={'movie_id': self.movie.id}), {'rating': 3},
+                         format='json')
+        self.client.post(reverse('rating-bulk'), [{'movie_id': self.movie.id, 'rating': 5},
+                                                  {'movie_id': self.movie.id, 'rating': 1,
+                                                   'rating_date': '2020-03-05'}], format='json')
+        self.assertEqual({today: (2, 8), datetime.date(2020, 3, 5): (2, 11)}, self.days(today, '2020-03-05'))
+        self.client.delete(reverse('rating-delete', kwargs={'movie_id': Rating.objects.get(rating=10).id}))
+        self.assertEqual({today: (2, 8), datetime.date(2020, 3, 5): (1, 1)}, self.days(today, '2020-03-05'))
+        self.client.delete(reverse('rating-delete', kwargs={'movie_id': Rating.objects.get(rating=1).id}))
+        self.assertEqual({today: (2, 8)}, self.days(today, '2020-03-05'))
+        # the incremental path agrees with a rebuild
+        incremental = set(RatingDaily.objects.values_list('day', 'rating_count', 'rating_sum'))
+        rating_rollups.rebuild([self.movie.id])
+        self.assertEqual(incremental, set(RatingDaily.objects.values_list('day', 'rating_count', 'rating_sum')))
+
+    def days(self, *days):
+        return {day: (count, total) for day, count, total in RatingDaily.objects.filter(day__in=days)
+                .values_list('day', 'rating_count', 'rating_sum')}
+
+
+class RatingHistogramTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = Movie.objects.bulk_create([
+            Movie(name=f'Movie {i}', description='d', duration_in_min=90, release_year=2000) for i in range(2)])
+        cls.movie = cls.movies[0]
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+
+    def histogram(self):
+        response = self.client.get(reverse('movie-rating-histogram', kwargs={'movie_id': self.movie.id}),
+                                   HTTP_ACCEPT='application/json')
+        return {rating: count for rating, count in response.json()['histogram'].items() if count}
+
+    def test_rating_writes_maintain_the_histogram(self):
+        self.assertEqual({}, self.histogram())
+        with self.captureOnCommitCallbacks(execute=True):
+            for rating in [7, 7, 2]:
+                self.client.post(reverse('movie-rating-add', kwargs={'movie_id': self.movie.id}),
+                                 {'rating': rating}, format='json')
+            self.client.post(reverse('rating-bulk'), [{'movie_id': movie.id, 'rating': rating}
+                                                      for movie in self.movies for rating in [10, 2, 2]],
+                             format='json')
+        self.assertEqual({'2': 3, '7': 2, '10': 1}, self.histogram())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('rating-delete', kwargs={'movie_id': Rating.objects.filter(
+                movie=self.movie, rating=7).first().id}))
+        self.assertEqual({'2': 3, '7': 1, '10': 1}, self.histogram())
+        # the incremental path agrees with a rebuild
+        incremental = list(Movie.objects.order_by('id').values(*HISTOGRAM_FIELDS.values()))
+        rating_stats.rebuild()
+        self.assertEqual(incremental, list(Movie.objects.order_by('id').values(*HISTOGRAM_FIELDS.values())))
+        self.assertEqual({'2': 2, '10': 1}, {rating: count for rating, count in self.client.get(
+            reverse('movie-rating-histogram', kwargs={'movie_id': self.movies[1].id}),
+            HTTP_ACCEPT='application/json').json()['histogram'].items() if count})
+
+    def test_bulk_integrity_error_is_a_conflict(self):
+        # e.g. a movie deleted after the existence check fails the deferred foreign key at commit
+        with mock.patch.object(Rating.objects, 'bulk_create', side_effect=IntegrityError('movie_id')):
+            response = self.client.post(reverse('rating-bulk'), [{'movie_id': self.movie.id, 'rating': 3}],
+                                        format='json')
+        self.assertEqual(409, response.status_code)
+        self.assertEqual({}, self.histogram())
+
+    def test_concurrent_deletes_adjust_the_aggregates_once(self):
+        ratings = [Rating.objects.create(movie=self.movie, rating=7) for _ in range(2)]
+        rating_stats.rebuild([self.movie.id])
+        url = reverse('rating-delete', kwargs={'movie_id': ratings[0].id})
+        self.assertEqual(204, self.client.delete(url).status_code)
+        # the second request looked the row up before the first one deleted it
+        with mock.patch('imdb_app.views.get_object_or_404', return_value=ratings[0]):
+            self.assertEqual(404, self.client.delete(url).status_code)
+        self.assertEqual({'7': 1}, self.histogram())
+        self.assertEqual(1, Movie.objects.get(id=self.movie.id).rating_count)
+
+    def test_embedded_in_the_movie_detail(self):
+        Rating.objects.create(movie=self.movie, rating=4)
+        rating_stats.rebuild([self.movie.id])
+        url = reverse('movie-detail', kwargs={'pk': self.movie.id})
+        self.assertNotIn('rating_histogram', self.client.get(url, HTTP_ACCEPT='application/json').json())
+        detail = self.client.get(url, {'histogram': 'true'}, HTTP_ACCEPT='application/json').json()
+        self.assertEqual(1, detail['rating_histogram']['4'])
+        self.assertEqual(10, len(detail['rating_histogram']))
+
+
+class BulkMovieTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.actors = Actor.objects.bulk_create([Actor(name=f'Actor {i}', birth_year=1960) for i in range(2)])
+        Movie.objects.create(name='Taken', description='d', duration_in_min=90, release_year=2000)
+
+    def movie(self, name, *actors, **fields):
+        return {'name': name, 'description': 'd', 'duration_in_min': 90, 'release_year': 2000, **fields,
+                'cast': [{'actor_id': actor_id, 'salary': 5, 'main_role': True} for actor_id in actors]}
+
+    def test_per_item_errors(self):
+        first, second = [actor.id for actor in self.actors]
+        response = self.client.post(reverse('movie-bulk'), [
+            self.movie('One', first, second),
+            self.movie('Taken', first),
+            self.movie('Two', first, 0),
+            self.movie('One'),
+            self.movie('Old', release_year=1900),
+            self.movie('Three'),
+        ], format='json')
+        self.assertEqual(201, response.status_code)
+        body = response.json()
+        self.assertEqual([0, 5], [created['index'] for created in body['created']])
+        self.assertEqual([1, 2, 3, 4], [error['index'] for error in body['errors']])
+        self.assertEqual({'cast': ['Actor with id 0 does not exist']}, body['errors'][1]['errors'])
+        one = Movie.objects.get(id=body['created'][0]['id'])
+        self.assertEqual('One', one.name)
+        self.assertEqual({first, second}, set(one.movieactor_set.values_list('actor_id', flat=True)))
+        self.assertFalse(Movie.objects.filter(name__in=['Two', 'Old']).exists())
+
+    def test_nothing_valid(self):
+        response = self.client.post(reverse('movie-bulk'), [self.movie('Taken')], format='json')
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(400, self.client.post(reverse('movie-bulk'), {'name': 'x'}, format='json').status_code)
+
+    def test_single_movie_cast_is_checked_with_one_query(self):
+        first, second = [actor.id for actor in self.actors]
+        data = self.movie('Single', first, 0, second, 0)
+        data['cast'] = [{'actor': cast['actor_id'], 'salary': 5, 'main_role': True} for cast in data['cast']]
+        with QueryCounter() as counter:
+            response = self.client.post(reverse('movie-list'), data, format='json')
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(2, counter.queries)
+        self.assertEqual({'cast': [{}, {'actor': ['Invalid pk "0" - object does not exist.']}, {},
+                                   {'actor': ['Invalid pk "0" - object does not exist.']}]}, response.json())
+        data['cast'] = data['cast'][::2]
+        response = self.client.post(reverse('movie-list'), data, format='json')
+        self.assertEqual(201, response.status_code)
+        self.assertEqual([first, second], sorted(MovieActor.objects.filter(movie__name='Single')
+                                                 .values_list('actor_id', flat=True)))
+
+    def test_integrity_error_is_a_conflict(self):
+        # e.g. an actor deleted after the existence check fails the deferred foreign key at commit
+        with mock.patch.object(MovieActor.objects, 'bulk_create', side_effect=IntegrityError('actor_id')):
+            response = self.client.post(reverse('movie-bulk'), [self.movie('New', self.actors[0].id)],
+                                        format='json')
+        self.assertEqual(409, response.status_code)
+        self.assertFalse(Movie.objects.filter(name='New').exists())
+
+
+class ImdbImportTests(APITestCase):
+    FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'imdb')
+
+    def run_import(self, *args):
+        # batches of 2 rows, every file takes more than one
+        call_command('import_imdb', self.FIXTURES, '--batch-size', '2', *args, stdout=io.StringIO())
+
+    def assert_imported(self):
+        self.assertEqual({
+            'tt0000001': ('Fixture One', 'Crime, Drama', 142, 1994),
+            'tt0000002': ('Fixture \\ Two', '', 0, 2001),
+        }, {row[0]: row[1:] for row in Movie.objects.values_list(
+            'imdb_id', 'name', 'description', 'duration_in_min', 'release_year')})
+        self.assertEqual({'nm0000001': 1950, 'nm0000002': 1962, 'nm0000004': 1940},
+                         dict(Actor.objects.values_list('imdb_id', 'birth_year')))
+        self.assertEqual({('tt0000001', 'nm0000001', True), ('tt0000001', 'nm0000002', True),
+                          ('tt0000002', 'nm0000001', False)},
+                         set(MovieActor.objects.values_list('movie__imdb_id', 'actor__imdb_id', 'main_role')))
+        self.assertEqual({'tt0000001': (8.5, 1200), 'tt0000002': (6.1, 35)},
+                         {row[0]: row[1:] for row in Movie.objects.values_list(
+                             'imdb_id', 'imdb_rating', 'imdb_votes')})
+        # the rating stats only count the ratings made here
+        self.assertEqual({0}, set(Movie.objects.values_list('rating_count', flat=True)))
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+    def test_copy_loader(self):
+        self.assertIsInstance(imdb_import.get_loader(), imdb_import.CopyLoader)
+        self.run_import()
+        self.assert_imported()
+        # keyed on imdb_id, a second run changes nothing
+        self.run_import()
+        self.assert_imported()
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+    def test_deferred_indexes_are_rebuilt(self):
+        def indexes():
+            return {table: {name for name, info in connection.introspection.get_constraints(cursor, table).items()
+                            if info['index']} for table in ['movies', 'actors', 'movie_actors']}
+
+        with connection.cursor() as cursor:
+            before = indexes()
+            with CaptureQueriesContext(connection) as queries:
+                self.run_import('--defer-indexes')
+            self.assertEqual(before, indexes())
+        self.assertTrue(any(query['sql'].startswith('DROP INDEX "movies_name_trgm"') for query in queries))
+        self.assert_imported()
+
+    def test_bulk_loader(self):
+        with mock.patch.object(imdb_import, 'get_loader', lambda defer_indexes: imdb_import.BulkLoader()):
+            self.run_import()
+            self.assert_imported()
+            self.run_import()
+        self.assert_imported()
+
+    def test_only_follows_the_file_order(self):
+        with mock.patch.object(imdb_import, 'get_loader', lambda defer_indexes: imdb_import.BulkLoader()):
+            self.run_import('--only', 'ratings', 'principals', 'names', 'titles')
+        self.assert_imported()
+
+
+class QueryLogTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Movie.objects.bulk_create([Movie(name=f'Movie {i}', description=f'd{i % 3}', duration_in_min=90,
+                                         release_year=1990 + i % 2) for i in range(20)])
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'query_log.ndjson')
+        patcher = mock.patch.object(query_log, 'QUERY_LOG_PATH', self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(MIDDLEWARE=['imdb_app.middleware.QueryLogMiddleware'])
+    def test_middleware_samples_requests(self):
+        with mock.patch.object(query_log, 'QUERY_LOG_SAMPLE_RATE', 0):
+            self.client.get(reverse('movie-list'))
+        self.assertFalse(os.path.exists(self.path))
+
+        with mock.patch.object(query_log, 'QUERY_LOG_SAMPLE_RATE', 1):
+            response = self.client.get(reverse('movie-list'), {'release_year': 1991, 'page_size': 100,
+                                                               'pagination': 'keyset'})
+        self.assertEqual({1991}, {movie['release_year'] for movie in response.json()['results']})
+        [entry] = query_log.read()
+        self.assertEqual(('movie-list', 'GET'), (entry['route'], entry['method']))
+        [statement] = entry['statements']
+        self.assertIn('"movies"."year" = %s', statement['sql'])
+        self.assertIn(1991, statement['params'])
+
+    def test_advise_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE movies')
+        query_log.append('movie-list', 'GET', [
+            ('SELECT id FROM movies WHERE description = %s AND year >= %s ORDER BY name', ['d1', 1990]),
+            ('SELECT id FROM movies WHERE description = %s OR duration > %s', ['d1', 60]),
+            ('UPDATE movies SET description = %s', ['x']),
+        ])
+        statements = index_advisor.captured_statements(query_log.read())
+        self.assertEqual(2, len(statements))
+
+        [advice] = index_advisor.advise(statements, min_rows=0)
+        self.assertEqual(('movies', ['description', 'year', 'name']), (advice.table, advice.columns))
+        self.assertIn('Seq Scan on movies', advice.reason)
+        source = index_advisor.migration_source([advice])
+        self.assertIn("fields=['description', 'release_year', 'name']", source)
+        self.assertIn('movies_description_year_nam_ix', source)
+        # the trial index was rolled back
+        with connection.cursor() as cursor:
+            self.assertNotIn('advisor_trial', connection.introspection.get_constraints(cursor, 'movies'))
+
+
+class ConnectionPoolTests(APITestCase):
+
+    def pool(self, **options):
+        pool = db_pool.ConnectionPool(lambda: connection.get_new_connection(connection.get_connection_params()),
+                                      **{'min_size': 0, 'max_size': 2, 'timeout': 0.05, **options})
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_reuse_and_acquire_timeout(self):
+        pool = self.pool()
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(first, pool.acquire())
+        second = pool.acquire()
+        with self.assertRaises(db_pool.PoolTimeout):
+            pool.acquire()
+        stats = pool.stats()
+        self.assertEqual((2, 2, 0, 1), (stats['opened'], stats['in_use'], stats['idle'], stats['timeouts']))
+        pool.release(first)
+        pool.release(second)
+        self.assertEqual(2, pool.stats()['idle'])
+
+    def test_session_state_is_reset_on_release(self):
+        pool = self.pool()
+        conn = pool.acquire()
+        # as Django uses it, nothing is left for a rollback to undo
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SET statement_timeout = '1234ms'")
+            cursor.execute('CREATE TEMP TABLE pooled_scratch (id int)')
+            cursor.execute('SELECT pg_advisory_lock(4321)')
+        pool.release(conn)
+        self.assertIs(conn, pool.acquire())
+        with conn.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            self.assertNotEqual('1234ms', cursor.fetchone()[0])
+            cursor.execute("SELECT to_regclass('pooled_scratch')")
+            self.assertIsNone(cursor.fetchone()[0])
+            cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()")
+            self.assertEqual(0, cursor.fetchone()[0])
+        pool.release(conn)
+
+    def test_dead_and_old_connections_are_replaced(self):
+        pool = self.pool(check_after=0)
+        dead = pool.acquire()
+        pool.release(dead)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [dead.get_backend_pid()])
+        live = pool.acquire()
+        self.assertIsNot(dead, live)
+        self.assertEqual((1, 2), (pool.stats()['failed_checks'], pool.stats()['opened']))
+
+        pool.max_lifetime = 0
+        pool.release(live)
+        self.assertTrue(live.closed)
+        self.assertEqual(0, pool.stats()['size'])
+
+    @skipUnless(hasattr(os, 'fork'), 'needs fork()')
+    def test_forked_child_starts_without_pools(self):
+        params = {'dbname': 'forked'}
+        self.addCleanup(db_pool.close_pools, 'forked')
+        inherited = db_pool.pool_for('forked', params, {})
+        pid = os.fork()
+        if pid == 0:
+            # child: whatever happens, leave through os._exit, no cleanups and no interpreter shutdown
+            code = 1
+            try:
+                fresh = db_pool.pool_for('forked', params, {})
+                code = 0 if fresh is not inherited and inherited in db_pool._inherited else 1
+            finally:
+                os._exit(code)
+        self.assertEqual(0, os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]))
+        self.assertIs(inherited, db_pool.pool_for('forked', params, {}))
+
+    def test_warm_up_does_not_wait_for_the_database(self):
+        release = threading.Event()
+
+        def fill_pool():
+            release.wait(5)
+            raise OperationalError('connection refused')
+
+        down = mock.Mock(alias='down', fill_pool=fill_pool)
+        with mock.patch.object(db_pool.connections, 'all', return_value=[down]), \
+                self.assertLogs('imdb_app.db_pool', 'WARNING') as logs:
+            thread = db_pool.warm_up()
+            self.assertTrue(thread.is_alive())
+            release.set()
+            thread.join(5)
+        self.assertIn('down: connection refused', logs.output[0])
+
+    def test_pooled_backend(self):
+        pooled = {**connection.settings_dict, 'ENGINE': 'imdb_app.pooled_postgresql', 'POOL': {'MIN_SIZE': 1}}
+        with mock.patch.dict(connections.settings, {'pooled': pooled}):
+            wrapper = connections['pooled']
+        self.addCleanup(db_pool.close_pools, connection.settings_dict['NAME'])
+        self.addCleanup(connections.__delitem__, 'pooled')
+        self.assertIsInstance(wrapper, PooledDatabaseWrapper)
+        wrapper.fill_pool()
+        self.assertEqual(1, db_pool.stats()['pooled']['idle'])
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        raw = wrapper.connection
+        self.assertEqual(1, self.client.get(reverse('db-pool-stats')).json()['pooled']['in_use'])
+        wrapper.close()
+        wrapper.ensure_connection()
+        self.assertIs(raw, wrapper.connection)
+        wrapper.close()
+        stats = db_pool.stats()['pooled']
+        self.assertEqual((1, 0, 2), (stats['opened'], stats['in_use'], stats['checkouts']))
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    # the replica alias mirrors the test database, TestCase's transaction would keep every read on default
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        self.movie = Movie.objects.create(name='Routed', description='d', duration_in_min=90, release_year=2000)
+        self.client = APIClient()
+
+    def reads(self, method, name, client=None, **kwargs):
+        """(queries on default, queries on replica) of one request"""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(client or self.client, method)(reverse(name, **kwargs), format='json')
+        self.assertLess(response.status_code, 300)
+        return len(primary), len(replica)
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual((0, 2), self.reads('get', 'movie-ratings', kwargs={'movie_id': self.movie.id}))
+        self.assertEqual(0, self.reads('get', 'movie-list')[0])
+        self.assertGreater(db_routers.stats()['reads']['replica'], 0)
+
+    def test_asgi_chain_stays_async(self):
+        async def view(request):
+            return HttpResponse()
+        self.assertTrue(iscoroutinefunction(ReplicaRoutingMiddleware(view)))
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = async_to_sync(AsyncClient().get)(reverse('async-movie-detail',
+                                                                kwargs={'movie_id': self.movie.id}))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual((0, 1), (len(primary), len(replica)))
+
+    @override_settings(MIDDLEWARE=['imdb_app.middleware.ReplicaRoutingMiddleware',
+                                   'imdb_app.middleware.QueryLogMiddleware'])
+    def test_replica_reads_are_counted_and_logged(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'query_log.ndjson')
+        with QueryCounter() as counter, mock.patch.object(query_log, 'QUERY_LOG_PATH', path), \
+                mock.patch.object(query_log, 'QUERY_LOG_SAMPLE_RATE', 1):
+            self.assertEqual((0, 2), self.reads('get', 'movie-ratings', kwargs={'movie_id': self.movie.id}))
+            [entry] = query_log.read()
+        self.assertEqual(2, counter.queries)
+        self.assertEqual(2, len(entry['statements']))
+
+    def test_unreachable_replica_falls_back_to_the_primary(self):
+        replica = connections['replica']
+        replica.close()
+        url = reverse('movie-ratings', kwargs={'movie_id': self.movie.id})
+        with mock.patch.object(replica, 'ensure_connection', side_effect=OperationalError('refused')) as connect, \
+                mock.patch.dict(db_routers._unhealthy, clear=True):
+            for _ in range(2):
+                with CaptureQueriesContext(connections['default']) as primary:
+                    self.assertEqual(200, self.client.get(url).status_code)
+                self.assertEqual(2, len(primary))
+            # left out after the first refusal
+            self.assertEqual(1, connect.call_count)
+            self.assertEqual(['replica'], db_routers.stats()['unhealthy'])
+        self.assertEqual(0, db_routers._in_flight['replica'])
+        self.assertEqual((0, 2), self.reads('get', 'movie-ratings', kwargs={'movie_id': self.movie.id}))
+
+    def test_streamed_exports_read_from_the_replica(self):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(reverse('export-movies'))
+            b''.join(response.streaming_content)
+        self.assertEqual(0, len(primary))
+        self.assertEqual(1, len(replica))
+
+    def test_cache_entries_are_built_from_the_primary(self):
+        url = {'kwargs': {'movie_id': self.movie.id}}
+        self.assertEqual((1, 0), self.reads('get', 'movie-rating-avg', **url))
+        # another client's write bumps the version, this client isn't pinned to the primary
+        APIClient().post(reverse('movie-rating-add', **url), {'rating': 8}, format='json')
+        self.assertEqual((1, 0), self.reads('get', 'movie-rating-avg', **url))
+        # served from the cache
+        self.assertEqual((0, 0), self.reads('get', 'movie-rating-avg', **url))
+        self.assertEqual((0, 2), self.reads('get', 'movie-ratings', **url))
+
+    def test_client_reads_its_writes(self):
+        self.client.post(reverse('movie-rating-add', kwargs={'movie_id': self.movie.id}), {'rating': 8}, format='json')
+        self.assertIn(db_routers.PIN_COOKIE, self.client.cookies)
+        self.assertEqual((2, 0), self.reads('get', 'movie-ratings', kwargs={'movie_id': self.movie.id}))
+
+        del self.client.cookies[db_routers.PIN_COOKIE]
+        self.assertEqual((0, 2), self.reads('get', 'movie-ratings', kwargs={'movie_id': self.movie.id}))
+
+    def test_api_clients_are_pinned_by_authorization(self):
+        token = str(AccessToken.for_user(User.objects.create_user('writer', password='Writer-pass-1')))
+        writer = APIClient(HTTP_AUTHORIZATION=f'Bearer {token}')
+        writer.post(reverse('movie-rating-add', kwargs={'movie_id': self.movie.id}), {'rating': 8}, format='json')
+        writer.cookies.clear()
+        self.assertEqual(0, self.reads('get', 'movie-ratings', writer, kwargs={'movie_id': self.movie.id})[1])
+        self.assertEqual(0, self.reads('get', 'movie-ratings', kwargs={'movie_id': self.movie.id})[0])
+
+    def test_api_client_pins_hold_across_processes(self):
+        token = str(AccessToken.for_user(User.objects.create_user('writer', password='Writer-pass-1')))
+        writer = APIClient(HTTP_AUTHORIZATION=f'Bearer {token}')
+        writer.post(reverse('movie-rating-add', kwargs={'movie_id': self.movie.id}), {'rating': 8}, format='json')
+        writer.cookies.clear()
+        # the next read reaches a worker with its own cache instance
+        other_process = caches.create_connection(db_routers.PIN_CACHE_ALIAS)
+        with mock.patch.object(db_routers, '_pin_cache', return_value=other_process):
+            self.assertEqual(0, self.reads('get', 'movie-ratings', writer, kwargs={'movie_id': self.movie.id})[1])
+
+    def test_writes_and_transactions_use_the_primary(self):
+        actor = Actor.objects.create(name='Cast', birth_year=1970)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.post(reverse('movie-list'), {
+                'name': 'Created', 'description': 'd', 'duration_in_min': 90, 'release_year': 2001,
+                'cast': [{'actor': actor.id, 'salary': 5, 'main_role': True}]}, format='json')
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(0, len(replica))
+
+    def test_least_loaded_selection(self):
+        with mock.patch.multiple(db_routers, REPLICAS={'a': 1, 'b': 2}, SELECTION='least-loaded',
+                                 _connects=mock.Mock(return_value=True)), \
+                mock.patch.dict(db_routers._in_flight, {'a': 2, 'b': 1}):
+            # in flight per unit of weight, a: 2 / 1, b: 1 / 2
+            self.assertEqual('b', db_routers._pick_replica())
+            self.assertEqual('b', db_routers._pick_replica())
+            self.assertEqual(3, db_routers._in_flight['b'])
+            db_routers._in_flight['a'] = 0
+            self.assertEqual('a', db_routers._pick_replica())
@@ -17,9 +17,9 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from imdb_app import views
+from imdb_app import async_views, views
 from imdb_app.view_set import MovieViewSet, ActorViewSet, OscarViewSet
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 
 from imdb_app.views import signup
 
@@ -48,19 +48,48 @@ urlpatterns = [
     # path('actors', views.get_actors),
     # path('actors/<int:actor_id>', views.get_actor),
 
-    path('auth/login', TokenObtainPairView.as_view()),
-    path('auth/refresh', TokenRefreshView.as_view()),
-    path('auth/signup', signup),
-
-    path('movie_actors/<int:movie_id>/<int:actor_id', views.remove_actor_from_movie),
-    path('movies/<int:movie_id>/ratings', views.get_movie_ratings),
-    path('movies/<int:movie_id>/ratings/avg', views.get_avg_movie_rating),
-    path('movies/<int:movie_id>/actor', views.add_actor_to_movie),
-    path('movies/<int:movie_id>/ratings/', views.add_rating_to_movie),
-    path('movies/<int:movie_id>/actors', views.get_movie_actors),
-
-    path('ratings', views.get_all_ratings),
-    path('ratings/delete/<int:movie_id>/', views.delete_specific_movie_rating)
+    path('auth/login', views.LoginView.as_view(), name='login'),
+    path('auth/refresh', TokenRefreshView.as_view(), name='token-refresh'),
+    path('auth/signup', signup, name='signup'),
+
+    path('movies/search', views.search_movies, name='movie-search'),
+    path('movies/bulk', views.add_movies_bulk, name='movie-bulk'),
+    path('autocomplete/actors', views.autocomplete_actors, name='autocomplete-actors'),
+    path('autocomplete/movies', views.autocomplete_movies, name='autocomplete-movies'),
+
+    path('movie_actors/<int:movie_id>/<int:actor_id>', views.remove_actor_from_movie, name='movie-actor-remove'),
+    path('movies/<int:movie_id>/ratings', views.get_movie_ratings, name='movie-ratings'),
+    path('movies/<int:movie_id>/ratings/avg', views.get_avg_movie_rating, name='movie-rating-avg'),
+    path('movies/<int:movie_id>/ratings/histogram', views.get_movie_rating_histogram,
+         name='movie-rating-histogram'),
+    path('movies/<int:movie_id>/ratings/timeseries', views.get_movie_rating_timeseries,
+         name='movie-rating-timeseries'),
+    path('movies/<int:movie_id>/actor', views.add_actor_to_movie, name='movie-actor-add'),
+    path('movies/<int:movie_id>/ratings/', views.add_rating_to_movie, name='movie-rating-add'),
+    path('movies/<int:movie_id>/actors', views.get_movie_actors, name='movie-cast'),
+
+    path('ratings', views.get_all_ratings, name='rating-list'),
+    path('ratings/bulk', views.add_ratings_bulk, name='rating-bulk'),
+    path('ratings/delete/<int:movie_id>/', views.delete_specific_movie_rating, name='rating-delete'),
+
+    path('export/ratings', views.export_table, {'table': 'ratings'}, name='export-ratings'),
+    path('export/movies', views.export_table, {'table': 'movies'}, name='export-movies'),
+    path('export/movie_actors', views.export_table, {'table': 'movie_actors'}, name='export-movie-actors'),
+
+    # async, served by imdb_rest/asgi.py
+    path('movies/<int:movie_id>/page', async_views.movie_page, name='movie-page'),
+    path('async/movies/<int:movie_id>', async_views.movie_detail, name='async-movie-detail'),
+    path('async/movies/<int:movie_id>/actors', async_views.movie_cast, name='async-movie-cast'),
+    path('async/movies/<int:movie_id>/ratings/avg', async_views.movie_rating_avg, name='async-movie-rating-avg'),
+    path('async/movies/<int:movie_id>/oscars', async_views.movie_oscars, name='async-movie-oscars'),
+
+    path('leaderboards', views.get_leaderboards, name='leaderboard-list'),
+    path('leaderboards/<str:name>', views.get_leaderboard, name='leaderboard'),
+
+    path('cache/stats', views.cache_stats, name='cache-stats'),
+    path('auth/hashing/stats', views.password_hashing_stats, name='password-hashing-stats'),
+    path('db/pool/stats', views.database_pool_stats, name='db-pool-stats'),
+    path('db/routing/stats', views.database_routing_stats, name='db-routing-stats'),
 
 ]
 
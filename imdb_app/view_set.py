@@ -1,13 +1,81 @@
 import django_filters
+from django.db.models import Count, F, Max, Min, Prefetch
+from django.http import Http404
 from django_filters import FilterSet
 from rest_framework import mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 
-from imdb_app.models import Movie, Actor, Oscar
+from imdb_app import conditional, fast_serializers, response_cache
+from imdb_app.conditional import ConditionalMixin
+from imdb_app.models import Movie, Actor, MovieActor, Oscar, Rating
+from imdb_app.pagination import ListPagination
 from imdb_app.serializers import MovieSerializer, ActorSerializer, DetailedMovieSerializer, CreateMovieSerializer, \
-    CastForMovieSerializer, OscarSerializer
+    CastForMovieSerializer, OscarSerializer, DetailedActorSerializer, MovieRating, HistogramMovieSerializer, \
+    RatingHistogramField
+
+# ?ratings=N of movies/<id>/full
+FULL_LATEST_RATINGS = 10
+FULL_MAX_LATEST_RATINGS = 100
+
+# ?limit=N of oscar/wins/<group>
+WINS_LIMIT = 100
+WINS_MAX_LIMIT = 1000
+# group -> grouped column, name of the row it points to
+WINS_GROUPS = {
+    'actor': ('actor_id', {'name': F('actor__name')}),
+    'director': ('director_id', {'name': F('director__name')}),
+    'movie': ('movie_id', {'name': F('movie__name')}),
+    'year': ('year', {}),
+}
+
+
+def latest_ratings_count(query_params):
+    """?ratings=N of the movie page, capped at FULL_MAX_LATEST_RATINGS"""
+    value = query_params.get('ratings', str(FULL_LATEST_RATINGS))
+    if not value.isdigit():
+        raise ValidationError({'ratings': 'must be a non negative integer'})
+    return min(int(value), FULL_MAX_LATEST_RATINGS)
+
+
+def full_queryset(latest_ratings=FULL_LATEST_RATINGS):
+    """Movies with what full_data() reads prefetched: the cast and the latest ratings"""
+    # prefetching a sliced queryset needs Django 4.2 (requirements.txt)
+    latest = Rating.objects.order_by('-rating_date', '-id')[:latest_ratings]
+    return Movie.objects.defer('search_vector').prefetch_related(
+        Prefetch('movieactor_set', queryset=MovieActor.objects.select_related('actor').order_by('id')),
+        Prefetch('rating_set', queryset=latest, to_attr='latest_ratings'),
+    )
+
+
+def full_data(movie):
+    """The whole movie page of a movie of full_queryset(), one more query for the Oscars"""
+    casts = movie.movieactor_set.all()
+    # this movie's, its cast's (in any movie) and its directors' (the ones nominated for it). One
+    # branch per index: ORed together, the director subquery made it a sequential scan of oscar.
+    oscar_plan = fast_serializers.plan_for(OscarSerializer)
+    branches = [oscar_plan.values(oscars) for oscars in [
+        Oscar.objects.filter(movie_id=movie.id),
+        Oscar.objects.filter(actor_id__in=[cast.actor_id for cast in casts]),
+        Oscar.objects.filter(director_id__in=Oscar.objects.filter(movie_id=movie.id, director__isnull=False)
+                             .values('director_id')),
+    ]]
+    oscars = branches[0].union(*branches[1:]).order_by('year', 'id')
+    return {
+        'movie': DetailedMovieSerializer(movie).data,
+        'cast': DetailedActorSerializer(casts, many=True).data,
+        'rating': {
+            'count': movie.rating_count,
+            'avg': movie.avg_rating if movie.rating_count else None,
+            'min': movie.rating_min,
+            'max': movie.rating_max,
+            'histogram': RatingHistogramField().to_representation(movie),
+        },
+        'latest_ratings': MovieRating(movie.latest_ratings, many=True).data,
+        'oscars': oscar_plan.serialize(oscars),
+    }
 
 
 class MovieFilterSet(FilterSet):
@@ -18,28 +86,73 @@ class MovieFilterSet(FilterSet):
     # description = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
 
     class Meta:
-        model: Movie
+        model = Movie
         fields = ['release_year']
 
 
-class MovieViewSet(mixins.CreateModelMixin,
+class MovieViewSet(ConditionalMixin,
+                   mixins.CreateModelMixin,
                    mixins.RetrieveModelMixin,
                    mixins.UpdateModelMixin,
                    mixins.ListModelMixin,
                    GenericViewSet):
     serializer_class = MovieSerializer
     queryset = Movie.objects.all()
+    pagination_class = ListPagination
+    filterset_class = MovieFilterSet
+    # ?ordering=-avg_rating reads the indexed denormalized column
+    ordering_fields = ['avg_rating', 'rating_count', 'release_year', 'name']
+    fast_list = True
 
     @action(methods=['GET'], detail=True, url_path='actors')
-    def actors(self):
-        movie = self.get_object()
-        all_casts = movie.movieactor_set.all()
-        serializer = CastForMovieSerializer(instance=all_casts, many=True)
-        return Response(data=serializer.data)
+    def actors(self, request, pk=None):
+        def build():
+            movie = self.get_object()
+            all_casts = list(movie.movieactor_set.select_related('actor'))
+            return conditional.for_rows(all_casts), CastForMovieSerializer(instance=all_casts, many=True).data
+
+        validators, data = response_cache.get_or_build('cast_ids', self.movie_id(), build, scopes=['actors'])
+        return conditional.respond(request, validators, lambda: Response(data=data))
+
+    @action(methods=['GET'], detail=True, url_path='full')
+    def full(self, request, pk=None):
+        # the whole movie page in 4 queries: movie, cast, latest ratings, Oscars
+        return Response(full_data(self.get_object()))
+
+    def retrieve(self, request, *args, **kwargs):
+        def build():
+            movie = self.get_object()
+            return conditional.for_instance(movie), self.get_serializer(movie).data
+
+        kind = 'detail_histogram' if self.with_histogram() else 'detail'
+        validators, data = response_cache.get_or_build(kind, self.movie_id(), build)
+        return conditional.respond(request, validators, lambda: Response(data=data))
+
+    def perform_update(self, serializer):
+        movie = serializer.save()
+        response_cache.invalidate_movies(movie.id)
+
+    def movie_id(self):
+        # the cache is keyed and invalidated by the movie id, /movies/05/ must hit movie:5
+        try:
+            return int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404
+
+    def get_queryset(self):
+        if self.action == 'full':
+            return full_queryset(latest_ratings_count(self.request.query_params))
+        return super().get_queryset()
 
     # לנתב לאיזה סיריאלייזר לגשת
+    def with_histogram(self):
+        # ?histogram=true embeds rating_histogram in the movie detail
+        return self.request.query_params.get('histogram', '').lower() in ('1', 'true')
+
     def get_serializer_class(self):
-        if self.action == 'retrieve':
+        if self.action == 'retrieve' and self.with_histogram():
+            return HistogramMovieSerializer
+        elif self.action in ('retrieve', 'full'):
             return DetailedMovieSerializer
         elif self.action == 'create':
             return CreateMovieSerializer
@@ -55,32 +168,72 @@ class MovieViewSet(mixins.CreateModelMixin,
     #     return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
-class ActorViewSet(ModelViewSet):
+class ActorViewSet(ConditionalMixin, ModelViewSet):
     serializer_class = ActorSerializer
     queryset = Actor.objects.all()
+    pagination_class = ListPagination
+    ordering_fields = ['name', 'birth_year']
+    fast_list = True
+
+    # cast payloads embed actor rows
+    def perform_update(self, serializer):
+        serializer.save()
+        response_cache.invalidate('actors')
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        response_cache.invalidate('actors')
+
+
+class OscarFilterSet(FilterSet):
+    # every filter is served by one of the Oscar composite indexes
+    from_year = django_filters.NumberFilter('year', lookup_expr='gte')
+    to_year = django_filters.NumberFilter('year', lookup_expr='lte')
+    # plain ids, no lookup query to validate them
+    movie = django_filters.NumberFilter('movie_id')
+    actor = django_filters.NumberFilter('actor_id')
+    director = django_filters.NumberFilter('director_id')
+
+    class Meta:
+        model = Oscar
+        # nomination is matched exactly, UPPER() would not use the index
+        fields = ['year', 'nomination']
 
 
-class OscarViewSet(ModelViewSet):
+class OscarViewSet(ConditionalMixin, ModelViewSet):
     serializer_class = OscarSerializer
     queryset = Oscar.objects.all()
+    pagination_class = ListPagination
+    filterset_class = OscarFilterSet
+    ordering_fields = ['year']
+    fast_list = True
 
-    def get_queryset(self):
-        queryset = Oscar.objects.all()
-        year = self.request.query_params.get('year')
-        from_year = self.request.query_params.get('from_year')
-        to_year = self.request.query_params.get('to_year')
-        nomination = self.request.query_params.get('nomination')
-
-        if year:
-            queryset = queryset.filter(year__iexact='year').values()
-        if from_year:
-            queryset = queryset.filter(year__gte__iexact='from_year').values()
-        if to_year:
-            queryset = queryset.filter(year__lte__iexact='to_year').values()
-        if nomination:
-            queryset = queryset.filter(nomination__iexact='nomination').values()
-
-        return queryset
+    def perform_create(self, serializer):
+        oscar = serializer.save()
+        response_cache.invalidate_movies(oscar.movie_id)
+
+    def perform_update(self, serializer):
+        old_movie_id = serializer.instance.movie_id
+        oscar = serializer.save()
+        response_cache.invalidate_movies(old_movie_id, oscar.movie_id)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        response_cache.invalidate_movies(instance.movie_id)
+
+    @action(methods=['GET'], detail=False, url_path=r'wins/(?P<group>actor|director|movie|year)')
+    def wins(self, request, group=None):
+        # one GROUP BY over the filtered rows, ?from_year=2000&nomination=Best Actor etc. apply
+        try:
+            limit = min(int(request.query_params.get('limit', WINS_LIMIT)), WINS_MAX_LIMIT)
+        except ValueError:
+            return Response("limit must be an integer", status=status.HTTP_400_BAD_REQUEST)
+        column, name = WINS_GROUPS[group]
+        rows = self.filter_queryset(self.get_queryset()).filter(**{f'{column}__isnull': False})
+        rows = rows.values(column, **name).annotate(
+            wins=Count('id'), first_year=Min('year'), last_year=Max('year'),
+        ).order_by('-wins', column)
+        return Response(list(rows[:max(limit, 1)]))
 
     def create_new_oscar(self, request):
         year = request.data.get('year')
@@ -1,14 +1,26 @@
 from datetime import date
 
+from django.contrib.auth.models import update_last_login
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast, Collate, Upper
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
+from django.utils.dateparse import parse_date
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.request import Request
-from django.db.models import Avg
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.views import TokenObtainPairView
+from django.db import IntegrityError, transaction
 
+from imdb_app import conditional, db_pool, db_routers, export, fast_serializers, hashers, leaderboards, \
+    rating_rollups, rating_stats, response_cache
+from imdb_app.authentication import LoginBasicAuthentication
 from imdb_app.models import *
+from imdb_app.pagination import RatingKeysetPagination, SearchKeysetPagination
 from imdb_app.serializers import *
 
 
@@ -33,17 +45,16 @@ def get_movies(request: Request):
         serializer = MovieSerializer(instance=all_movies, many=True)
         return Response(data=serializer.data)
     else:
-        cast_data = request.data.pop('cast')
-        for cast in cast_data:
-            actor_id = cast['actor']
-            if not Actor.objects.filter(id=actor_id).exists():
+        actor_ids = [cast['actor'] for cast in request.data.get('cast', [])]
+        # one query for the whole cast
+        existing = set(Actor.objects.filter(id__in=actor_ids).values_list('id', flat=True))
+        for actor_id in actor_ids:
+            if actor_id not in existing:
                 return Response(f"Actor with id {actor_id} does not exist", status=status.HTTP_400_BAD_REQUEST)
         serializer = CreateMovieSerializer(data=request.data) # # data = העברת מילון בבקשה עם כל הפרמטרים
         serializer.is_valid(raise_exception=True) # # חוסך שורה של אם הקוד, וידע להחזיר שגיאה 404 - reaise_exception = True
-        movie = serializer.save()
-        for cast in cast_data:
-            cast['movie'] = movie.id
-            MovieActor.objects.create(**cast)
+        # CreateMovieSerializer.create inserts the cast as well
+        serializer.save()
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
         # else:
         #     return Response(data=serializer.errors, status=status.HTTP_404_NOT_FOUND)
@@ -51,6 +62,60 @@ def get_movies(request: Request):
         #serializer.errors =  is_valid() מחזיר בידיוק על מה השגיאה ומה לא היה תקין. משתמשים בו רק לאחר פונקציית
 
 
+@api_view(['GET'])
+def search_movies(request):
+    q = request.query_params.get('q', '').strip()
+    if not q:
+        return Response("Missing search query q", status=status.HTTP_400_BAD_REQUEST)
+    query = SearchQuery(q, search_type='websearch', config=SEARCH_CONFIG)
+    # @@ against the GIN indexed search_vector column, best matches first
+    # ts_rank is a float4, cast so the rank carried in the cursor compares exactly
+    movies = Movie.objects.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+    paginator = SearchKeysetPagination()
+    page = paginator.paginate_queryset(movies, request)
+    serializer = MovieSerializer(instance=page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+# shorter prefixes have no trigram of their own to match on
+AUTOCOMPLETE_FUZZY_MIN_LENGTH = 3
+
+
+def _autocomplete(request, queryset):
+    prefix = request.query_params.get('prefix', '').strip().upper()
+    if not prefix:
+        return Response([])
+    try:
+        limit = min(int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        return Response("limit must be an integer", status=status.HTTP_400_BAD_REQUEST)
+    limit = max(limit, 1)
+    # exact prefixes first, from the UPPER(name) COLLATE "C" btree (the *_name_prefix indexes):
+    # LIKE 'PREFIX%' is a range of it read in order, the scan stops after `limit` rows however
+    # many names match
+    names = queryset.annotate(name_key=Collate(Upper('name'), 'C'))
+    matches = list(names.filter(name_key__startswith=prefix).order_by('name_key', 'id').values('id', 'name')[:limit])
+    if len(matches) < limit and len(prefix) >= AUTOCOMPLETE_FUZZY_MIN_LENGTH:
+        # then typos, %> (word similarity) over the gin_trgm_ops indexes, closest first
+        fuzzy = names.annotate(name_upper=Upper('name')).filter(name_upper__trigram_word_similar=prefix).exclude(
+            name_key__startswith=prefix).annotate(similarity=TrigramWordSimilarity(prefix, 'name_upper'))
+        matches += fuzzy.order_by('-similarity', 'name').values('id', 'name')[:limit - len(matches)]
+    return Response(matches)
+
+
+@api_view(['GET'])
+def autocomplete_actors(request):
+    return _autocomplete(request, Actor.objects.all())
+
+
+@api_view(['GET'])
+def autocomplete_movies(request):
+    return _autocomplete(request, Movie.objects.all())
+
+
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 def get_movie(request, movie_id):
     # try:
@@ -76,18 +141,22 @@ def get_movie(request, movie_id):
 
 @api_view(['GET'])
 def get_movie_actors(request, movie_id):
-    movie = get_object_or_404(Movie, id=movie_id)
-    all_casts = movie.movieactor_set.all()
-    serializer = DetailedActorSerializer(instance=all_casts, many=True)
-    return Response(data=serializer.data)
+    def build():
+        movie = get_object_or_404(Movie, id=movie_id)
+        # depth = 1 nests the actor, join it instead of one query per cast member
+        all_casts = list(movie.movieactor_set.select_related('actor'))
+        validators = conditional.for_rows(all_casts + [cast.actor for cast in all_casts])
+        return validators, DetailedActorSerializer(instance=all_casts, many=True).data
+
+    validators, data = response_cache.get_or_build('cast', movie_id, build, scopes=['actors'])
+    return conditional.respond(request, validators, lambda: Response(data=data))
 
 
 @api_view(['GET', 'POST'])
 def get_actors(request):
     if request.method == 'GET':
-        all_actors = Actor.objects.all()
-        serializer = ActorSerializer(instance=all_actors, many=True)
-        return Response(data=serializer.data)
+        plan = fast_serializers.plan_for(ActorSerializer)
+        return Response(data=plan.serialize(plan.values(Actor.objects.all())))
     else:
         serializer = CreateActor(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -113,15 +182,21 @@ def get_actor(request, actor_id):
 @api_view(['DELETE'])
 def delete_specific_movie_rating(request, movie_id):
     rating = get_object_or_404(Rating, id=movie_id)
-    rating.delete()
+    with transaction.atomic():
+        # only the request that deleted the row adjusts the aggregates, a concurrent delete of
+        # the same rating finds nothing left
+        if not Rating.objects.filter(id=rating.id).delete()[0]:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        rating_stats.remove_rating(rating.movie_id, rating.rating)
+        rating_rollups.remove_rating(rating.movie_id, rating.rating_date, rating.rating)
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 @api_view(['DELETE'])
 def remove_actor_from_movie(request, movie_id, actor_id):
     movie = get_object_or_404(Movie, id=movie_id)
-    movie.actors.remove(id=actor_id)
-    movie.save()
+    movie.movieactor_set.filter(actor_id=actor_id).delete()
+    response_cache.invalidate_movies(movie.id)
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -134,15 +209,45 @@ def get_all_ratings(request):
             all_ratings = Rating.objects.filter(rating_date__gte=from_date, rating_date__lte=to_date)
         else:
             all_ratings = Rating.objects.all()
-        serializer = RatingsSerializer(instance=all_ratings, many=True)
-        return Response(data=serializer.data)
+        plan = fast_serializers.plan_for(RatingsSerializer)
+        paginator = RatingKeysetPagination()
+        page = paginator.paginate_queryset(plan.values(all_ratings, 'id', 'rating_date'), request)
+        return paginator.get_paginated_response(plan.serialize(page))
     else:
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+def _date_params(request):
+    """The from_date / to_date given in the query string as dates, None when one isn't a YYYY-MM-DD date"""
+    params = [param for param in ('from_date', 'to_date') if request.query_params.get(param)]
+    try:
+        dates = {param: parse_date(request.query_params[param]) for param in params}
+    except ValueError:
+        # well formed but not a calendar date
+        return None
+    return None if None in dates.values() else dates
+
+
+@api_view(['GET'])
+def export_table(request, table):
+    # ?output=ndjson|csv (DRF reserves ?format= for renderer selection)
+    output_format = request.query_params.get('output', 'ndjson')
+    if output_format not in export.FORMATS:
+        return Response(f"Unknown output format {output_format}", status=status.HTTP_400_BAD_REQUEST)
+    after_id = request.query_params.get('after_id')
+    if after_id is not None and not after_id.isdigit():
+        return Response("after_id must be an integer", status=status.HTTP_400_BAD_REQUEST)
+    dates = _date_params(request)
+    if dates is None:
+        return Response("from_date and to_date must be YYYY-MM-DD dates", status=status.HTTP_400_BAD_REQUEST)
+    fields, rows = export.export_rows(table, after_id=int(after_id) if after_id is not None else None, **dates)
+    return StreamingHttpResponse(export.render(output_format, fields, rows),
+                                 content_type=export.CONTENT_TYPES[output_format])
+
+
 @api_view(['GET'])
 def get_movie_ratings(request, movie_id):
-    movie = Movie.objects.get(id=movie_id)
+    movie = get_object_or_404(Movie.objects.only('id'), id=movie_id)
     serializer = RatingsSerializer(
         instance=movie.rating_set.all(), many=True)
     return Response(data=serializer.data)
@@ -150,25 +255,63 @@ def get_movie_ratings(request, movie_id):
 
 @api_view(['GET'])
 def get_avg_movie_rating(request, movie_id):
-    movie = get_object_or_404(Movie, id=movie_id)
-    avg_rating = movie.rating_set.aggregate(Avg('rating'))
-    return Response(avg_rating)
+    def build():
+        # served from the denormalized columns, no scan over the ratings table
+        movie = get_object_or_404(Movie.objects.only('rating_count', 'avg_rating', 'updated_at'), id=movie_id)
+        return conditional.for_instance(movie), {'rating__avg': movie.avg_rating if movie.rating_count else None}
+
+    validators, data = response_cache.get_or_build('rating_avg', movie_id, build)
+    return conditional.respond(request, validators, lambda: Response(data))
 
 
 from django.http import JsonResponse, HttpResponseRedirect, HttpResponseBadRequest
 import json
 
 
+@api_view(['GET'])
+def get_movie_rating_histogram(request, movie_id):
+    def build():
+        # one row: the denormalized votes_<n> columns, the ratings are never scanned
+        movie = get_object_or_404(Movie.objects.only('rating_count', 'updated_at', *HISTOGRAM_FIELDS.values()),
+                                  id=movie_id)
+        return conditional.for_instance(movie), {
+            'count': movie.rating_count,
+            'histogram': RatingHistogramField().to_representation(movie),
+        }
+
+    validators, data = response_cache.get_or_build('rating_histogram', movie_id, build)
+    return conditional.respond(request, validators, lambda: Response(data))
+
+
+@api_view(['GET'])
+def get_movie_rating_timeseries(request, movie_id):
+    bucket = request.query_params.get('bucket', 'month')
+    if bucket not in rating_rollups.BUCKETS:
+        return Response(f"bucket must be one of {', '.join(rating_rollups.BUCKETS)}",
+                        status=status.HTTP_400_BAD_REQUEST)
+    dates = _date_params(request)
+    if dates is None:
+        return Response("from_date and to_date must be YYYY-MM-DD dates", status=status.HTTP_400_BAD_REQUEST)
+    movie = get_object_or_404(Movie.objects.only('id'), id=movie_id)
+    # re-buckets the per day rollups, never reads the ratings table
+    return Response({
+        'bucket': bucket,
+        'results': list(rating_rollups.series(movie.id, bucket, **dates)),
+    })
+
+
 @api_view(['PUT', 'POST'])
 def add_actor_to_movie(request, movie_id):
     movie = get_object_or_404(Movie, id=movie_id)
     if request.method == 'POST':
         actor_name = request.data.get('actor_name')
-        if Actor.objects.get(name=actor_name):
+        # single lookup on the indexed actors.name column
+        actor = Actor.objects.filter(name=actor_name).first()
+        if actor is not None:
             salary = request.data.get('salary')
             main_role = request.data.get('main_role')
-            actor_id = Actor.objects.get(name=actor_name)
-            movie_actor = MovieActor.objects.create(movie=movie, actor=actor_id, salary=salary, main_role=main_role)
+            movie_actor = MovieActor.objects.create(movie=movie, actor=actor, salary=salary, main_role=main_role)
+            response_cache.invalidate_movies(movie.id)
 
             serializer = MovieActorSerializer(movie_actor)
             return Response(serializer.data)
@@ -184,12 +327,118 @@ def add_rating_to_movie(request, movie_id):
     rating_date = date.today()
     serializer = MovieRating(data=request.data)
     if serializer.is_valid():
-        serializer.save(movie=movie, rating_date=rating_date, rating=request.data['rating'])
+        with transaction.atomic():
+            rating = serializer.save(movie=movie, rating_date=rating_date)
+            rating_stats.apply_rating(movie.id, rating.rating)
+            rating_rollups.add_rating(movie.id, rating.rating_date, rating.rating)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     else:
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+MAX_BULK_RATINGS = 50000
+
+
+@api_view(['POST'])
+def add_ratings_bulk(request):
+    items = request.data
+    if not isinstance(items, list):
+        return Response("Expected a list of ratings", status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_BULK_RATINGS:
+        return Response(f"At most {MAX_BULK_RATINGS} ratings per request", status=status.HTTP_400_BAD_REQUEST)
+
+    errors = []
+    valid = []
+    for index, item in enumerate(items):
+        serializer = BulkRatingSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    # one query for all referenced movies
+    existing = set(Movie.objects.filter(id__in={data['movie_id'] for _, data in valid})
+                   .values_list('id', flat=True))
+    ratings = []
+    for index, data in valid:
+        if data['movie_id'] in existing:
+            ratings.append(Rating(**data))
+        else:
+            errors.append({'index': index, 'errors': {'movie_id': [f"Movie with id {data['movie_id']} does not exist"]}})
+
+    if not ratings:
+        return Response({'created': 0, 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        with transaction.atomic():
+            Rating.objects.bulk_create(ratings, batch_size=1000)
+            rating_stats.apply_ratings((rating.movie_id, rating.rating) for rating in ratings)
+            rating_rollups.add_ratings((rating.movie_id, rating.rating_date, rating.rating) for rating in ratings)
+    except IntegrityError:
+        # a movie deleted since the check above fails the deferred foreign key at commit
+        return Response("The ratings conflict with a concurrent change, nothing was created",
+                        status=status.HTTP_409_CONFLICT)
+    errors.sort(key=lambda error: error['index'])
+    return Response({'created': len(ratings), 'errors': errors}, status=status.HTTP_201_CREATED)
+
+
+MAX_BULK_MOVIES = 1000
+
+
+@api_view(['POST'])
+def add_movies_bulk(request):
+    items = request.data
+    if not isinstance(items, list):
+        return Response("Expected a list of movies", status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_BULK_MOVIES:
+        return Response(f"At most {MAX_BULK_MOVIES} movies per request", status=status.HTTP_400_BAD_REQUEST)
+
+    errors = []
+    valid = []
+    for index, item in enumerate(items):
+        serializer = BulkMovieSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    # one query for all names and one for all referenced actors
+    taken = set(Movie.objects.filter(name__in={data['name'] for _, data in valid}).values_list('name', flat=True))
+    existing = set(Actor.objects.filter(id__in={cast['actor_id'] for _, data in valid
+                                                for cast in data.get('cast', [])})
+                   .values_list('id', flat=True))
+    accepted = []
+    for index, data in valid:
+        missing = sorted({cast['actor_id'] for cast in data.get('cast', [])} - existing)
+        if data['name'] in taken:
+            errors.append({'index': index, 'errors': {'name': [f"Movie {data['name']} already exists"]}})
+        elif missing:
+            errors.append({'index': index, 'errors': {'cast': [f"Actor with id {actor_id} does not exist"
+                                                               for actor_id in missing]}})
+        else:
+            # the first of two items with the same name wins
+            taken.add(data['name'])
+            accepted.append((index, data))
+
+    if not accepted:
+        return Response({'created': [], 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        with transaction.atomic():
+            movies = Movie.objects.bulk_create([Movie(**{key: value for key, value in data.items() if key != 'cast'})
+                                                for _, data in accepted], batch_size=500)
+            MovieActor.objects.bulk_create([MovieActor(movie_id=movie.id, **cast)
+                                            for movie, (_, data) in zip(movies, accepted)
+                                            for cast in data.get('cast', [])], batch_size=1000)
+    except IntegrityError:
+        # an actor deleted since the check above fails the deferred foreign key at commit
+        return Response("The movies conflict with a concurrent change, nothing was created",
+                        status=status.HTTP_409_CONFLICT)
+    errors.sort(key=lambda error: error['index'])
+    return Response({
+        'created': [{'index': index, 'id': movie.id} for movie, (index, _) in zip(movies, accepted)],
+        'errors': errors,
+    }, status=status.HTTP_201_CREATED)
+
+
 @api_view(['POST', 'GET'])
 def create_new_actor(request):
     if request.method == 'POST':
@@ -202,9 +451,79 @@ def create_new_actor(request):
         pass
 
 
+@api_view(['GET'])
+def get_leaderboards(request):
+    return Response([{'name': name, 'title': board.title,
+                      'url': request.build_absolute_uri(reverse('leaderboard', kwargs={'name': name}))}
+                     for name, board in leaderboards.LEADERBOARDS.items()])
+
+
+@api_view(['GET'])
+def get_leaderboard(request, name):
+    board = leaderboards.LEADERBOARDS.get(name)
+    if board is None:
+        return Response(f"Unknown leaderboard {name}", status=status.HTTP_404_NOT_FOUND)
+    try:
+        limit = min(int(request.query_params.get('limit', leaderboards.BOARD_SIZE)), leaderboards.BOARD_SIZE)
+    except ValueError:
+        return Response("limit must be an integer", status=status.HTTP_400_BAD_REQUEST)
+    # materialized by refresh_leaderboards, empty until its first run
+    rows = list(leaderboards.entries(name, max(limit, 1)).values('rank', 'subject_id', 'name', 'score',
+                                                                  'refreshed_at'))
+    return Response({
+        'name': name,
+        'title': board.title,
+        'refreshed_at': rows[0].pop('refreshed_at') if rows else None,
+        'results': [{key: value for key, value in row.items() if key != 'refreshed_at'} for row in rows],
+    })
+
+
+@api_view(['GET'])
+def cache_stats(request):
+    return Response(response_cache.stats())
+
+
+@api_view(['GET'])
+def password_hashing_stats(request):
+    return Response(hashers.pool.stats())
+
+
+@api_view(['GET'])
+def database_pool_stats(request):
+    # per database alias, empty when the pooled backend is not configured
+    return Response(db_pool.stats())
+
+
+@api_view(['GET'])
+def database_routing_stats(request):
+    return Response(db_routers.stats())
+
+
 @api_view(['POST'])
 def signup(request):
     s = SignupSerializer(data=request.data)
     s.is_valid(raise_exception=True)
-    s.save()
-    return Response(s.data)
\ No newline at end of file
+    try:
+        s.save()
+    except hashers.PoolFull:
+        raise hashers.HashingUnavailable()
+    return Response(s.data)
+
+
+class LoginView(TokenObtainPairView):
+    """
+    TokenObtainPairView that also takes the username and password as Basic credentials
+    (the route of settings.BASIC_AUTH_URL_NAMES), e.g. curl -u user:password -X POST.
+    """
+    authentication_classes = (LoginBasicAuthentication,)
+
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.successful_authenticator, LoginBasicAuthentication):
+            try:
+                return super().post(request, *args, **kwargs)
+            except hashers.PoolFull:
+                raise hashers.HashingUnavailable()
+        refresh = self.get_serializer_class().get_token(request.user)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, request.user)
+        return Response({'refresh': str(refresh), 'access': str(refresh.access_token)})
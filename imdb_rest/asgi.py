@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'imdb_rest.settings')
 
 application = get_asgi_application()
+
+# start opening the connection pool's MIN_SIZE connections in the background. Under gunicorn
+# --preload this runs in the master, whose pools the workers don't inherit: call
+# db_pool.warm_up() from a post_fork hook instead.
+from imdb_app import db_pool  # noqa: E402
+
+db_pool.warm_up()
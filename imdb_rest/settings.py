@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -36,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'django_filters',
     'rest_framework_simplejwt',
@@ -44,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # reads of GET requests go to the replicas of DATABASE_REPLICAS (imdb_app/db_routers.py)
+    'imdb_app.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +56,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # staging: log requests that go over their SQL budget (imdb_app/query_budget.py)
+    # 'imdb_app.middleware.QueryBudgetMiddleware',
+    # staging: sample request SQL for `manage.py advise_indexes` (imdb_app/query_log.py)
+    # 'imdb_app.middleware.QueryLogMiddleware',
 ]
 
 ROOT_URLCONF = 'imdb_rest.urls'
@@ -80,15 +88,98 @@ WSGI_APPLICATION = 'imdb_rest.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # django.db.backends.postgresql with pooled connections (imdb_app/db_pool.py)
+        'ENGINE': 'imdb_app.pooled_postgresql',
         'NAME': 'imdb_rest',
         'USER': 'postgres',
         'PASSWORD': '1341',
         'HOST': '127.0.0.1',
         'PORT': '5432',
-    }
+        # close() hands the connection back to the pool at the end of every request
+        'CONN_MAX_AGE': 0,
+        # per process, None to connect per request
+        'POOL': {
+            'MIN_SIZE': 2,
+            'MAX_SIZE': 20,
+            # seconds a request waits for a free connection
+            'TIMEOUT': 5,
+            'MAX_LIFETIME': 1800,
+            'MAX_IDLE': 300,
+            # connections idle longer than this are pinged before being handed out
+            'CHECK_AFTER': 1,
+        },
+    },
+    # streaming replica of default, point HOST at the standby
+    'replica': {
+        'ENGINE': 'imdb_app.pooled_postgresql',
+        'NAME': 'imdb_rest',
+        'USER': 'postgres',
+        'PASSWORD': '1341',
+        'HOST': '127.0.0.1',
+        'PORT': '5432',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MIN_SIZE': 2,
+            'MAX_SIZE': 20,
+            'TIMEOUT': 5,
+            'MAX_LIFETIME': 1800,
+            'MAX_IDLE': 300,
+            'CHECK_AFTER': 1,
+        },
+        # tests read the test database through it
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['imdb_app.db_routers.ReplicaRouter']
+# imdb_app.db_routers: replica alias -> weight
+DATABASE_REPLICAS = {'replica': 1}
+# 'weighted' or 'least-loaded' (fewest requests in flight per unit of weight)
+DATABASE_REPLICA_SELECTION = 'weighted'
+# a replica that refused a connection gets no reads for this long
+DATABASE_REPLICA_RETRY_SECONDS = 10
+# a client that wrote reads from the primary for this long
+READ_YOUR_WRITES_SECONDS = 5
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # versioned read payloads (imdb_app/response_cache.py). Shared by every worker on the host and
+    # the management commands, so their version bumps reach the running servers. Serving from
+    # more than one host takes a networked backend (memcached / redis) here.
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(Path(tempfile.gettempdir()) / 'imdb_rest' / 'responses'),
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    # read-your-writes pins of API clients (imdb_app/db_routers.py), the next request of a client
+    # may reach another worker. Shared per host like 'responses'.
+    'db-routing': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(Path(tempfile.gettempdir()) / 'imdb_rest' / 'db-routing'),
+    },
 }
 
+# PBKDF2 runs on a bounded thread pool (imdb_app/hashers.py), over the limit sign-up and login answer 503.
+# The other hashers stay listed so existing hashes still verify.
+PASSWORD_HASHERS = [
+    'imdb_app.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_QUEUE_LIMIT = 16
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -133,10 +224,26 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'django_filters.rest_framework.DjangoFilterBackend'
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'PAGE_SIZE': 3,
+    # orjson / msgpack are optional, see imdb_app/renderers.py
+    'DEFAULT_RENDERER_CLASSES': [
+        'imdb_app.renderers.OrjsonRenderer',
+        'imdb_app.renderers.MsgPackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'imdb_app.renderers.OrjsonParser',
+        'imdb_app.renderers.MsgPackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'imdb_app.renderers.OptionalFormatNegotiation',
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
+        # checked first, a Bearer token never reaches the Basic password hash
+        'imdb_app.authentication.CachedJWTAuthentication',
+
+        'imdb_app.authentication.LoginBasicAuthentication',
 
         # This means that clients will need to include Authorization header,
         # in their HTTP requests that contains a base64-encoded string of the form,
@@ -149,8 +256,26 @@ REST_FRAMEWORK = {
         # Once a client has been authenticated using this method, subsequent requests will include,
         # session ID that the server can use to identify and authenticate the client.
         # It is problematic to use cookies because it only works if the application is running on a browser.
-
-
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
     ]
-}
\ No newline at end of file
+}
+
+# imdb_app.authentication
+# verified access tokens are kept this long (seconds) or until they expire, whichever is first.
+# It also bounds how long a deactivated user or changed password keeps working with an old token.
+JWT_TOKEN_CACHE_TTL = 60
+JWT_TOKEN_CACHE_MAX_ENTRIES = 10000
+# build request.user from the token claims (TokenUser) instead of reading the users table
+JWT_STATELESS_USER = False
+# Basic credentials are only checked on these routes unless BASIC_AUTH_PER_REQUEST is on.
+# views.LoginView exchanges them for a token pair
+BASIC_AUTH_PER_REQUEST = False
+BASIC_AUTH_URL_NAMES = ['login']
+
+# imdb_app.leaderboards
+LEADERBOARD_SIZE = 100
+# top-movies only ranks movies with at least this many ratings
+LEADERBOARD_MIN_VOTES = 50
+
+# imdb_app.query_log
+QUERY_LOG_PATH = BASE_DIR / 'query_log.ndjson'
+QUERY_LOG_SAMPLE_RATE = 0.01
\ No newline at end of file